@@ -0,0 +1,206 @@
+import os
+import io
+import time
+import argparse
+import numpy as np
+import torch
+import torch.nn as nn
+
+from gesture_utils import (DATA_DIR, EXPECTED_FRAMES, LABELS_FILE, NUM_FEATURES, PREPROCESSING_VERSION, load_labels_map,
+                           parse_take_name, take_files, read_any, fast_resample, zero_start)
+from gesture_backends import PYTORCH_MODEL_PATH, CNNLSTM, load_state_dict_file, backbone_fingerprint
+from model_bundle import BUNDLE_ROOT, find_latest_bundle, load_bundle
+
+# ======================================================
+# 1. Configuration
+# ======================================================
+# python adapt_user.py pon                 -> ฝึกเฉพาะ Head ของ CNN-LSTM จาก Take ของ pon ใน dataset_cf แล้วบันทึก user_heads/pon.pth
+# python adapt_user.py pon --holdout 0.3   -> วัด Accuracy ก่อน/หลังปรับ บน Take ของ pon ที่ไม่ได้ใช้ฝึก
+# Server โหลด Head ของผู้ใช้ตอน Login (--user pon หรือบรรทัด "LOGIN pon" จาก Serial)
+USER_HEADS_DIR = "user_heads"
+EPOCHS = 300             # Full-batch บน Embedding ที่ Cache ไว้ (64 มิติ) จึงเร็วมากแม้บน CPU
+LEARNING_RATE = 1e-2
+ANCHOR = 1e-2            # ดึง Weight ไม่ให้ห่างจาก Head เดิมมาก (ท่าที่ผู้ใช้ไม่ได้ Enroll จะไม่พัง)
+REPLAY_PER_CLASS = 20    # Take ของผู้ใช้อื่นต่อท่าที่ฝึกไปด้วย เพื่อไม่ให้ลืมท่าที่ผู้ใช้คนนี้ไม่มีตัวอย่าง
+REPLAY_WEIGHT = 0.5
+SEED = 42
+
+# ======================================================
+# 2. Takes & Embeddings
+# ======================================================
+def collect_takes(user, labels_map, data_dir=DATA_DIR, replay_per_class=REPLAY_PER_CLASS, seed=SEED):
+    """([(path, label)] of the user's takes, [(path, label)] replay sample of other users' takes)."""
+    rng = np.random.default_rng(seed)
+    own, replay = [], []
+    for label, gesture in labels_map.items():
+        folder = os.path.join(data_dir, gesture)
+        if not os.path.isdir(folder):
+            continue
+        files = take_files(folder)
+        others = []
+        for stem in sorted(files):
+            parsed = parse_take_name(stem + ".csv", gesture)
+            if parsed is None:
+                continue
+            (own if parsed[0] == user else others).append((files[stem], label))
+        if others and replay_per_class:
+            replay += [others[i] for i in rng.permutation(len(others))[:replay_per_class]]
+    return own, replay
+
+def load_batch(takes):
+    X, y = [], []
+    for path, label in takes:
+        resampled = fast_resample(read_any(path))
+        if resampled is not None:
+            X.append(resampled)
+            y.append(label)
+    return np.array(X, dtype=np.float32).reshape(-1, EXPECTED_FRAMES, NUM_FEATURES), np.array(y, dtype=np.int64)
+
+def embed(model, X):
+    """Frozen backbone embeddings (N, 64), computed once and reused by every training step."""
+    with torch.no_grad():
+        return model.embed(torch.tensor(zero_start(X), dtype=torch.float32))
+
+def load_base_model(model_path, num_classes):
+    model = CNNLSTM(num_classes=num_classes)
+    model.load_state_dict(load_state_dict_file(model_path))
+    model.eval()
+    for p in model.parameters():
+        p.requires_grad_(False)
+    return model
+
+# ======================================================
+# 3. Head Training
+# ======================================================
+def train_head(base_fc, emb, y, replay_emb=None, replay_y=None, epochs=EPOCHS, lr=LEARNING_RATE, anchor=ANCHOR,
+               replay_weight=REPLAY_WEIGHT, seed=SEED):
+    """New nn.Linear head started from base_fc, trained full-batch on cached embeddings."""
+    torch.manual_seed(seed)
+    head = nn.Linear(base_fc.in_features, base_fc.out_features)
+    head.load_state_dict(base_fc.state_dict())
+    base_w, base_b = base_fc.weight.detach().clone(), base_fc.bias.detach().clone()
+    y = torch.tensor(y)
+    has_replay = replay_emb is not None and len(replay_emb) > 0
+    if has_replay:
+        replay_y = torch.tensor(replay_y)
+    optimizer = torch.optim.Adam(head.parameters(), lr=lr)
+    criterion = nn.CrossEntropyLoss()
+    for _ in range(epochs):
+        optimizer.zero_grad()
+        loss = criterion(head(emb), y)
+        if has_replay:
+            loss = loss + replay_weight * criterion(head(replay_emb), replay_y)
+        loss = loss + anchor * (((head.weight - base_w) ** 2).sum() + ((head.bias - base_b) ** 2).sum())
+        loss.backward()
+        optimizer.step()
+    return head.eval()
+
+def accuracy(head, emb, y):
+    if len(y) == 0:
+        return float("nan")
+    with torch.no_grad():
+        return float((head(emb).argmax(dim=1).numpy() == y).mean())
+
+def holdout_split(y, fraction, seed=SEED):
+    """Per-class split so every enrolled gesture keeps at least one training take."""
+    rng = np.random.default_rng(seed)
+    test = np.zeros(len(y), dtype=bool)
+    for label in np.unique(y):
+        idx = rng.permutation(np.flatnonzero(y == label))
+        test[idx[:min(int(round(len(idx) * fraction)), len(idx) - 1)]] = True
+    return ~test, test
+
+# ======================================================
+# 4. Per-user Head Files
+# ======================================================
+def head_path(user, heads_dir=USER_HEADS_DIR):
+    return os.path.join(heads_dir, f"{user}.pth")
+
+def save_head(path, head, user, labels_map, fingerprint, takes):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    buffer = io.BytesIO()
+    torch.save({"fc": head.state_dict(), "user": user, "labels": {str(k): v for k, v in labels_map.items()},
+                "backbone": fingerprint, "takes": takes, "preprocessing_version": PREPROCESSING_VERSION,
+                "created": time.strftime("%Y-%m-%d %H:%M:%S")}, buffer)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(buffer.getvalue())
+    os.replace(tmp, path)
+
+def load_head(path, labels_map, fingerprint):
+    """The saved head's fc state dict; ValueError if it was trained for another model or label map."""
+    head = torch.load(path, map_location=torch.device('cpu'), weights_only=True)
+    if {int(k): v for k, v in head["labels"].items()} != labels_map:
+        raise ValueError(f"{path} was trained on a different label map")
+    if head["backbone"] != fingerprint:
+        raise ValueError(f"{path} was trained on another CNN-LSTM (run adapt_user.py {head['user']} again)")
+    if head["preprocessing_version"] != PREPROCESSING_VERSION:
+        raise ValueError(f"{path} uses preprocessing v{head['preprocessing_version']}, code is v{PREPROCESSING_VERSION}")
+    return head["fc"]
+
+# ======================================================
+# 5. CLI
+# ======================================================
+def base_model_source(model_path=None):
+    """(cnnlstm weights path, labels map): explicit file, else the latest bundle, else the loose files."""
+    if model_path:
+        return model_path, load_labels_map(LABELS_FILE)
+    if find_latest_bundle(BUNDLE_ROOT):
+        bundle = load_bundle(root=BUNDLE_ROOT)
+        if "cnnlstm" in bundle.paths:
+            return bundle.paths["cnnlstm"], bundle.labels_map
+    return PYTORCH_MODEL_PATH, load_labels_map(LABELS_FILE)
+
+def main():
+    parser = argparse.ArgumentParser(description="Adapt the CNN-LSTM to one wearer by retraining only its classifier head")
+    parser.add_argument("user", help="name used in the take files ({user}_{gesture}_{date}_{seq}.csv)")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--model", help="base CNN-LSTM weights (default: latest bundle, else the loose file)")
+    parser.add_argument("--out", help=f"output head file (default: {USER_HEADS_DIR}/<user>.pth)")
+    parser.add_argument("--holdout", type=float, default=0.0, help="fraction of the user's takes kept out to measure accuracy")
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--no-replay", action="store_true", help="train on the user's takes only")
+    args = parser.parse_args()
+
+    model_path, labels_map = base_model_source(args.model)
+    if not os.path.exists(model_path):
+        print(f"[!] ไม่พบโมเดล {model_path} ครับ")
+        return
+    if not os.path.isdir(args.data_dir):
+        print(f"[!] ไม่พบโฟลเดอร์ {args.data_dir} ครับ")
+        return
+
+    start = time.perf_counter()
+    own, replay = collect_takes(args.user, labels_map, args.data_dir, 0 if args.no_replay else REPLAY_PER_CLASS)
+    X, y = load_batch(own)
+    if len(X) == 0:
+        print(f"[!] ไม่พบ Take ของ '{args.user}' ใน {args.data_dir} ครับ")
+        return
+    X_replay, y_replay = load_batch(replay)
+    load_s = time.perf_counter() - start
+
+    model = load_base_model(model_path, len(labels_map))
+    start = time.perf_counter()
+    emb, replay_emb = embed(model, X), embed(model, X_replay)
+    embed_s = time.perf_counter() - start
+    gestures = sorted({labels_map[int(label)] for label in y})
+    print(f"--- {args.user}: {len(X)} takes of {len(gestures)}/{len(labels_map)} gestures, "
+          f"{len(X_replay)} replay takes | base {model_path} ---")
+
+    if args.holdout > 0:
+        train, test = holdout_split(y, args.holdout)
+        head = train_head(model.fc, emb[train], y[train], replay_emb, y_replay, epochs=args.epochs)
+        print(f"[HOLDOUT] {test.sum()} takes: base head {accuracy(model.fc, emb[test], y[test]) * 100:.1f}% "
+              f"-> adapted {accuracy(head, emb[test], y[test]) * 100:.1f}% "
+              f"| replay takes {accuracy(model.fc, replay_emb, y_replay) * 100:.1f}% -> {accuracy(head, replay_emb, y_replay) * 100:.1f}%")
+
+    start = time.perf_counter()
+    head = train_head(model.fc, emb, y, replay_emb, y_replay, epochs=args.epochs)
+    train_s = time.perf_counter() - start
+
+    out = args.out or head_path(args.user)
+    save_head(out, head, args.user, labels_map, backbone_fingerprint(model), len(X))
+    print(f"[DONE] '{out}' | load {load_s:.2f} s, embed {embed_s:.2f} s, train head {train_s:.2f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import argparse
+import statistics
+import contextlib
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import torch
+import xgboost as xgb
+from sklearn.ensemble import RandomForestClassifier
+
+from gesture_utils import (COLUMNS, EXPECTED_FRAMES, NUM_FEATURES, parse_frame_line, resample_gesture, fast_resample,
+                           zero_start, trim_idle, extract_advanced_features, read_take, load_dataset, detect_labels)
+from orientation import fuse, OrientationFilter
+from dtw_templates import TemplateStore
+from sentence_decoder import BeamDecoder, build_lm, lm_matrix
+from gesture_backends import (CNNLSTM, GestureStudent, CNNLSTMBackend, XGBBackend, RFBackend, StudentBackend,
+                              EnsembleBackend, load_backend)
+
+# ======================================================
+# 1. Configuration
+# ======================================================
+# python benchmark.py                          -> วัดทุกอย่าง บันทึก benchmark_results.json
+# python benchmark.py --save-baseline          -> บันทึกเป็น Baseline ไว้เทียบครั้งหน้า
+# python benchmark.py --compare                -> เทียบกับ Baseline แล้วแจ้ง Regression (exit code 1)
+RESULTS_FILE = "benchmark_results.json"
+BASELINE_FILE = "benchmark_baseline.json"
+MIN_TIME = 0.2            # วินาทีขั้นต่ำต่อรอบการวัด (ปรับจำนวน loop อัตโนมัติ)
+REPEATS = 5
+TOLERANCE = 0.25          # ช้ากว่า Baseline เกิน 25% (median) = Regression
+DATASET_SIZES = [100, 1000, 5000]
+NUM_CLASSES = 23
+BATCH_SIZES = [1, 64, 1024]
+DTW_TEMPLATES = 2000      # ขนาด Template Store สำหรับวัดการค้น DTW (ท่าละ 1 Query)
+SYNTH_LABELS = [f"gesture_{i:02d}" for i in range(NUM_CLASSES)]
+
+# ======================================================
+# 2. Synthetic Data (ไม่ต้องมีถุงมือหรือ Dataset จริง)
+# ======================================================
+def synth_take(rng, frames=None, label=0):
+    """One take shaped like the firmware output: flex 0-2000, accel in g (±2), gyro in dps (±150)."""
+    frames = frames or int(rng.integers(40, 120))
+    t = np.linspace(0, 1, frames)[:, np.newaxis]
+    phase = rng.uniform(0, 2 * np.pi, NUM_FEATURES) + label
+    take = np.sin(2 * np.pi * (1 + label % 3) * t + phase)
+    scale = np.array(([1000] * 5 + [2] * 3 + [150] * 3) * 2, dtype=np.float64)
+    offset = np.array(([1000] * 5 + [0] * 6) * 2, dtype=np.float64)
+    take = take * scale * 0.5 + offset + rng.normal(0, 1, take.shape) * scale * 0.02
+    take[:, :5] = np.clip(take[:, :5], 0, 2000).round()
+    take[:, 11:16] = np.clip(take[:, 11:16], 0, 2000).round()
+    return take.round(2)
+
+def synth_frame_lines(take):
+    # หน้าตาเหมือนที่ Firmware ส่ง: บรรทัดแรกขึ้นต้นด้วย "S", บรรทัดสุดท้ายลงท้ายด้วย "E"
+    lines = [" ".join(f"{v:g}" for v in row) for row in take]
+    lines[0], lines[-1] = "S " + lines[0], lines[-1] + " E"
+    return lines
+
+def synth_batch(rng, n):
+    return np.array([fast_resample(synth_take(rng, label=i % NUM_CLASSES)) for i in range(n)], dtype=np.float32)
+
+def synth_dataset(root, n_takes, rng):
+    """Writes n_takes CSV takes as root/<gesture>/{user}_{gesture}_010125_{seq}.csv."""
+    for i in range(n_takes):
+        label = SYNTH_LABELS[i % NUM_CLASSES]
+        folder = os.path.join(root, label)
+        os.makedirs(folder, exist_ok=True)
+        pd.DataFrame(synth_take(rng, label=i % NUM_CLASSES), columns=COLUMNS).to_csv(
+            os.path.join(folder, f"user{i % 4}_{label}_010125_{i // NUM_CLASSES + 1:03d}.csv"), index=False)
+
+def synth_models(rng):
+    """Small models with the real architectures / feature layouts, trained on synthetic data in a few seconds."""
+    X = synth_batch(rng, NUM_CLASSES * 8)
+    y = np.arange(len(X)) % NUM_CLASSES
+    xgb_model = xgb.XGBClassifier(n_estimators=100, learning_rate=0.1, max_depth=6, objective='multi:softprob',
+                                  eval_metric='mlogloss', random_state=42)
+    xgb_model.fit(zero_start(X).reshape(len(X), -1), y)
+    rf_model = RandomForestClassifier(n_estimators=200, max_depth=15, min_samples_split=5, min_samples_leaf=2,
+                                      max_features='sqrt', random_state=42)
+    rf_model.fit(extract_advanced_features(X), y)
+    torch.manual_seed(42)
+    cnn = CNNLSTMBackend.from_model(CNNLSTM(NUM_CLASSES))
+    xgb_backend = XGBBackend.from_model(xgb_model)
+    return {
+        "cnnlstm": cnn,
+        "xgb": xgb_backend,
+        "rf": RFBackend.from_model(rf_model, NUM_CLASSES),
+        "student": StudentBackend.from_model(GestureStudent(NUM_CLASSES)),
+        "ensemble": EnsembleBackend([cnn, xgb_backend]),
+    }
+
+def real_models():
+    from gesture_utils import LABELS_FILE, load_labels_map
+    labels_map = load_labels_map(LABELS_FILE)
+    models = {}
+    for name in ("cnnlstm", "xgb", "rf", "student", "ensemble"):
+        try:
+            models[name] = load_backend(name, labels_map)
+        except Exception as e:
+            print(f"   [skip] {name}: {e}")
+    return models
+
+# ======================================================
+# 3. Runner
+# ======================================================
+def measure(func, min_time=MIN_TIME, repeats=REPEATS):
+    """Per-call seconds for `repeats` rounds; each round loops func enough times to last min_time."""
+    func()  # warm-up
+    loops, elapsed = 1, 0.0
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 4 or loops >= 1 << 20:
+            break
+        loops *= 4
+    loops = max(1, int(loops * min_time / max(elapsed, 1e-9)))
+    rounds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        rounds.append((time.perf_counter() - start) / loops)
+    return rounds, loops
+
+def build_benchmarks(rng, models, dataset_dirs):
+    take = synth_take(rng, frames=EXPECTED_FRAMES + 10)
+    lines = synth_frame_lines(take)
+    resampled = fast_resample(take)
+    batch_1024 = synth_batch(rng, 1024)
+
+    benches = {
+        "parse/frame_lines_x80": (lambda: [parse_frame_line(line) for line in lines], 80),
+        "preprocess/resample_gesture": (lambda: resample_gesture(take), 1),
+        "preprocess/fast_resample": (lambda: fast_resample(take), 1),
+        "preprocess/trim_idle": (lambda: trim_idle(take), 1),
+        "preprocess/zero_start_batch1024": (lambda: zero_start(batch_1024), 1024),
+        "features/advanced_single": (lambda: extract_advanced_features(resampled), 1),
+        "features/advanced_batch1024": (lambda: extract_advanced_features(batch_1024), 1024),
+        "orientation/fuse_batch1024": (lambda: fuse(batch_1024), 1024),
+        "orientation/filter_update_x70": (lambda f=OrientationFilter(): [f.update(row) for row in resampled], 70),
+    }
+    for name, backend in models.items():
+        for size in BATCH_SIZES:
+            batch = batch_1024[:size]
+            benches[f"model/{name}/batch{size}"] = ((lambda b=backend, x=batch: b.predict_proba(x)), size)
+    templates = synth_batch(rng, DTW_TEMPLATES)
+    store = TemplateStore(templates, np.arange(DTW_TEMPLATES) % NUM_CLASSES, SYNTH_LABELS,
+                          np.maximum(templates.reshape(-1, NUM_FEATURES).std(axis=0), 1e-3))
+    benches[f"model/dtw/search_{DTW_TEMPLATES}_templates"] = (lambda: store.predict_proba(batch_1024[:1]), 1)
+    decoder = BeamDecoder(lm_matrix(build_lm([]), dict(enumerate(SYNTH_LABELS))))
+    gesture_probs = rng.dirichlet(np.ones(NUM_CLASSES))
+    benches["sentence/beam_step"] = (lambda: decoder.step(gesture_probs) if len(decoder) < decoder.max_words else decoder.reset(), 1)
+    if "cnnlstm" in models and "xgb" in models:
+        p1 = models["cnnlstm"].predict_proba(batch_1024)
+        p2 = models["xgb"].predict_proba(batch_1024)
+        benches["ensemble/soft_vote_batch1024"] = (lambda: ((p1 + p2) / 2).argmax(axis=1), 1024)
+
+    for size, root in dataset_dirs.items():
+        files = [os.path.join(root, g, f) for g in sorted(os.listdir(root)) for f in sorted(os.listdir(os.path.join(root, g)))]
+        labels_map = detect_labels(root)
+        benches[f"io/read_csv_pandas/{size}"] = (lambda f=files: [pd.read_csv(p).values for p in f], size)
+        benches[f"io/read_take/{size}"] = (lambda f=files: [read_take(p) for p in f], size)
+        benches[f"io/load_dataset/{size}"] = (lambda r=root, m=labels_map: quiet(load_dataset, m, r), size)
+    return benches
+
+def quiet(func, *args):
+    # load_dataset พิมพ์จำนวนไฟล์ทุก Label ทุกรอบ ไม่ต้องแสดงตอนวัด
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        return func(*args)
+
+def run(benches, filters=None, min_time=MIN_TIME, repeats=REPEATS):
+    results = {}
+    for name, (func, items) in benches.items():
+        if filters and not any(f in name for f in filters):
+            continue
+        # งาน I/O ใหญ่ๆ วัดรอบเดียวพอ (ไม่งั้นใช้เวลานานเกิน)
+        heavy = name.startswith("io/")
+        rounds, loops = measure(func, 0 if heavy else min_time, 3 if heavy else repeats)
+        median = statistics.median(rounds)
+        results[name] = {
+            "median_s": median, "min_s": min(rounds), "mean_s": statistics.fmean(rounds),
+            "stdev_s": statistics.stdev(rounds) if len(rounds) > 1 else 0.0,
+            "loops": loops, "rounds": len(rounds), "items": items, "items_per_s": items / median,
+        }
+        print(f"   {name:40s} {format_time(median):>10s}  ({items / median:,.0f} items/s)")
+    return results
+
+def format_time(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    regressions = []
+    print(f"\n=== Compare with baseline ({baseline['meta']['timestamp']}) ===")
+    for name, r in results.items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"   {name:40s} (new)")
+            continue
+        ratio = r["median_s"] / base["median_s"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  <-- REGRESSION"
+            regressions.append({"name": name, "ratio": ratio})
+        elif ratio < 1 / (1 + tolerance):
+            flag = "  (faster)"
+        print(f"   {name:40s} {format_time(base['median_s']):>10s} -> {format_time(r['median_s']):>10s}  x{ratio:.2f}{flag}")
+    return regressions
+
+# ======================================================
+# 4. CLI
+# ======================================================
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark preprocessing, models and I/O on synthetic data")
+    parser.add_argument("--filter", nargs="+", help="only benchmarks whose name contains one of these")
+    parser.add_argument("--real-models", action="store_true", help="use the trained model files instead of synthetic models")
+    parser.add_argument("--sizes", nargs="+", type=int, default=DATASET_SIZES, help="synthetic dataset sizes for the I/O benchmarks")
+    parser.add_argument("--quick", action="store_true", help="shorter rounds, no datasets above 1000 takes")
+    parser.add_argument("--output", default=RESULTS_FILE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", nargs="?", const=BASELINE_FILE, help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    torch.set_num_threads(1)  # ให้ผลนิ่งและเทียบกันได้ระหว่างเครื่อง (Inference Server ก็ทีละท่า)
+    min_time = MIN_TIME / 4 if args.quick else MIN_TIME
+    sizes = [s for s in args.sizes if not args.quick or s <= 1000]
+
+    print("--- Preparing models ---")
+    models = real_models() if args.real_models else synth_models(rng)
+
+    tmp_root = tempfile.mkdtemp(prefix="gesture_bench_")
+    try:
+        need_io = not args.filter or any("io" in f for f in args.filter)
+        dataset_dirs = {}
+        if need_io:
+            print(f"--- Generating synthetic datasets {sizes} in {tmp_root} ---")
+            for size in sizes:
+                dataset_dirs[size] = os.path.join(tmp_root, str(size))
+                synth_dataset(dataset_dirs[size], size, rng)
+
+        print("--- Running ---")
+        results = run(build_benchmarks(rng, models, dataset_dirs), args.filter, min_time)
+    finally:
+        shutil.rmtree(tmp_root, ignore_errors=True)
+
+    report = {
+        "meta": {"timestamp": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+                 "platform": platform.platform(), "processor": platform.processor(), "numpy": np.__version__,
+                 "torch": torch.__version__, "xgboost": xgb.__version__, "models": "real" if args.real_models else "synthetic"},
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+    print(f"\n[DONE] Results saved as '{args.output}'")
+
+    if args.save_baseline:
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+        print(f"[DONE] Baseline saved as '{BASELINE_FILE}'")
+
+    if args.compare:
+        if not os.path.exists(args.compare):
+            print(f"[!] ไม่พบไฟล์ Baseline {args.compare} (รันด้วย --save-baseline ก่อนครับ)")
+            sys.exit(2)
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n[!] {len(regressions)} regression(s) over {args.tolerance*100:.0f}%: "
+                  + ", ".join(f"{r['name']} x{r['ratio']:.2f}" for r in regressions))
+            sys.exit(1)
+        print("\n[OK] No regressions")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+import numpy as np
+import os
+import json
+import time
+from scipy.optimize import minimize, minimize_scalar
+from sklearn.base import clone
+from sklearn.model_selection import train_test_split, StratifiedKFold, cross_val_predict
+from sklearn.metrics import accuracy_score
+
+from gesture_utils import (DATA_DIR, EXPECTED_FRAMES, LABELS_FILE, detect_labels, load_labels_map, load_dataset,
+                           extract_advanced_features)
+from gesture_backends import (CNNLSTMBackend, XGBBackend, RFBackend, EnsembleBackend, apply_temperature, thresholds_array,
+                              PYTORCH_MODEL_PATH, XGB_MODEL_PATH, RF_MODEL_PATH, CALIBRATION_PATH)
+
+# ======================================================
+# 1. Configuration
+# ======================================================
+N_FOLDS = 5
+TARGET_PRECISION = 0.95    # Threshold ต่อคลาสสำหรับการพูด
+EXIT_PRECISION = 0.99      # Threshold ต่อคลาสสำหรับ Early Exit (ต้องแม่นกว่าเพราะไม่มีโมเดลที่สองช่วย)
+CASCADE_MODEL = "rf"       # ด่านแรกราคาถูกของ Cascade (None = ไม่ใช้)
+CASCADE_PRECISION = 0.99
+MIN_SUPPORT = 5            # จำนวนตัวอย่างขั้นต่ำก่อนจะเชื่อ Threshold ของคลาสนั้น
+DEFAULT_THRESHOLD = 0.45   # ค่าเดิมของ Inference Server ใช้เมื่อข้อมูลไม่พอ
+MIN_THRESHOLD = 0.30
+MAX_THRESHOLD = 0.95       # กันไม่ให้ Threshold ติดเพดาน 1.0 จนไม่พูดอะไรเลย
+MIN_TEMPERATURE = 0.25
+MAX_TEMPERATURE = 20.0
+LATENCY_RUNS = 100
+
+# ======================================================
+# 2. Labels & Data (Split เดียวกับ train_model_sv_xg_cl.py)
+# ======================================================
+if not os.path.exists(DATA_DIR):
+    print(f"[!] ไม่พบโฟลเดอร์ {DATA_DIR} กรุณาสร้างและใส่ข้อมูลก่อนครับ")
+    exit()
+
+LABELS_MAP = load_labels_map(LABELS_FILE)
+if LABELS_MAP != detect_labels(DATA_DIR):
+    print(f"[!] {LABELS_FILE} ไม่ตรงกับโฟลเดอร์ใน {DATA_DIR} กรุณารัน train_model_sv_xg_cl.py ใหม่ก่อนครับ")
+    exit()
+NUM_CLASSES = len(LABELS_MAP)
+
+print(f"--- Loading raw data and Resampling to {EXPECTED_FRAMES} frames ---")
+X_raw, y = load_dataset(LABELS_MAP)
+if len(X_raw) == 0:
+    print("\n[!] Error: ไม่พบข้อมูลสำหรับการเทรนเลยครับ")
+    exit()
+
+# แบ่งด้วย Index เพื่อจะได้รู้ตำแหน่งของ Held-out Split ใน Dataset ทั้งหมด (Split ได้ผลเหมือนเดิมทุกประการ)
+idx_train, idx_test = train_test_split(np.arange(len(y)), test_size=0.3, random_state=42, stratify=y)
+X_test_raw, y_test = X_raw[idx_test], y[idx_test]
+
+# ======================================================
+# 3. Held-out Probabilities of the Deployed Models
+# ======================================================
+# Calibrate ตัวโมเดลที่ใช้งานจริง (gesture_model_best_*) บน Test Split ที่ไม่ได้ใช้เทรน
+# แล้วแบ่ง Test Split เป็น Fold เพื่อวัดผล Calibration บนข้อมูลที่ไม่ได้ใช้ Fit
+cnn_backend = CNNLSTMBackend(num_classes=NUM_CLASSES, model_path=PYTORCH_MODEL_PATH)
+xgb_backend = XGBBackend(model_path=XGB_MODEL_PATH)
+full_backends = {"cnnlstm": cnn_backend, "xgb": xgb_backend}
+
+held_probs = {name: b.predict_proba(X_test_raw) for name, b in full_backends.items()}
+
+def time_single_gesture(backend, samples):
+    backend.predict_proba(samples[:1]) # warm-up
+    start = time.perf_counter()
+    for i in range(LATENCY_RUNS):
+        backend.predict_proba(samples[i % len(samples)][np.newaxis])
+    return (time.perf_counter() - start) / LATENCY_RUNS * 1000
+
+# โมเดลที่เร็วกว่าเป็นด่านแรกของ Early Exit
+latencies = {name: time_single_gesture(b, X_test_raw) for name, b in full_backends.items()}
+FIRST_MODEL = min(latencies, key=latencies.get)
+
+# ด่านแรกสุดของ Cascade (RF จาก train_model_rf.py)
+# RF ตัวจริงเทรนด้วย Split 85/15 ซึ่งทับกับ Held-out Split นี้ จึงใช้ Out-of-Fold Probability ของ RF
+# (ไม่มีการเลือก Epoch แบบ CNN-LSTM โมเดลแต่ละ Fold จึงใกล้เคียงตัวจริง)
+cascade_probs = None
+if CASCADE_MODEL == "rf" and os.path.exists(RF_MODEL_PATH):
+    rf_backend = RFBackend(RF_MODEL_PATH)
+    rf_oof = cross_val_predict(clone(rf_backend.model).set_params(n_jobs=-1), extract_advanced_features(X_raw), y,
+                               cv=StratifiedKFold(n_splits=N_FOLDS, shuffle=True, random_state=42), method='predict_proba')
+    cascade_probs = rf_oof[idx_test]
+    latencies["rf"] = time_single_gesture(rf_backend, X_test_raw)
+else:
+    print(f"[!] ไม่พบ {RF_MODEL_PATH} -> ไม่มีด่าน RF ใน Cascade (รัน train_model_rf.py ก่อนถ้าต้องการ)")
+
+# ======================================================
+# 4. Temperature Scaling, Stacking Weights & Thresholds
+# ======================================================
+def nll(probs, labels):
+    return -np.mean(np.log(np.clip(probs[np.arange(len(labels)), labels], 1e-12, 1.0)))
+
+def fit_temperature(probs, labels):
+    # ค้นหา log(T) เพื่อให้ T เป็นบวกเสมอ
+    result = minimize_scalar(lambda log_t: nll(apply_temperature(probs, np.exp(log_t)), labels),
+                             bounds=(np.log(MIN_TEMPERATURE), np.log(MAX_TEMPERATURE)), method='bounded')
+    return float(np.exp(result.x))
+
+def fit_weights(calibrated, labels):
+    # Softmax parametrization -> น้ำหนักเป็นบวกและรวมกันได้ 1
+    names = list(calibrated.keys())
+    def objective(z):
+        w = np.exp(z) / np.exp(z).sum()
+        return nll(sum(wi * calibrated[n] for wi, n in zip(w, names)), labels)
+    z = minimize(objective, np.zeros(len(names)), method='Nelder-Mead').x
+    w = np.exp(z) / np.exp(z).sum()
+    return {n: float(wi) for n, wi in zip(names, w)}
+
+def precision_thresholds(probs, labels, target_precision):
+    """
+    For each predicted class, the lowest confidence t such that the takes predicted as
+    that class with confidence >= t reach target_precision. None when unreachable.
+    """
+    preds = probs.argmax(axis=1)
+    conf = probs.max(axis=1)
+    thresholds = []
+    for c in range(NUM_CLASSES):
+        mask = preds == c
+        order = np.argsort(-conf[mask])
+        c_conf = conf[mask][order]
+        c_correct = (labels[mask][order] == c)
+        support = np.arange(1, len(c_correct) + 1)
+        ok = np.nonzero((np.cumsum(c_correct) / support >= target_precision) & (support >= MIN_SUPPORT))[0]
+        thresholds.append(float(c_conf[ok[-1]]) if len(ok) else None)
+    return thresholds
+
+def fit_calibration(probs, labels, first_stage_probs=None):
+    calib = {}
+    calib["temperatures"] = {name: fit_temperature(p, labels) for name, p in probs.items()}
+    calibrated = {name: apply_temperature(p, calib["temperatures"][name]) for name, p in probs.items()}
+    calib["weights"] = fit_weights(calibrated, labels)
+    ensemble = sum(calib["weights"][n] * calibrated[n] for n in calibrated)
+    calib["class_thresholds"] = [DEFAULT_THRESHOLD if t is None else float(np.clip(t, MIN_THRESHOLD, MAX_THRESHOLD))
+                                 for t in precision_thresholds(ensemble, labels, TARGET_PRECISION)]
+    calib["early_exit"] = {"model": FIRST_MODEL,
+                           "thresholds": precision_thresholds(calibrated[FIRST_MODEL], labels, EXIT_PRECISION)}
+    if first_stage_probs is not None:
+        calib["cascade"] = {"model": CASCADE_MODEL,
+                            "thresholds": precision_thresholds(first_stage_probs, labels, CASCADE_PRECISION)}
+    return calib
+
+def simulate_cascade(calib, probs, first_stage_probs=None):
+    """
+    Replays the cascade on precomputed probabilities (same exit rule as CascadeBackend).
+    Returns the final probabilities, the stage index per take and the stage names.
+    """
+    calibrated = {name: apply_temperature(p, calib["temperatures"][name]) for name, p in probs.items()}
+    stage_probs, exit_thresholds, names = [], [], []
+    if first_stage_probs is not None:
+        stage_probs.append(first_stage_probs)
+        exit_thresholds.append(thresholds_array(calib["cascade"]["thresholds"]))
+        names.append(CASCADE_MODEL)
+    stage_probs.append(calibrated[FIRST_MODEL])
+    exit_thresholds.append(thresholds_array(calib["early_exit"]["thresholds"]))
+    names.append(FIRST_MODEL)
+    stage_probs.append(sum(calib["weights"][n] * calibrated[n] for n in calibrated))
+    names.append("ensemble")
+
+    n = len(stage_probs[-1])
+    out = stage_probs[-1].copy()
+    stage_of = np.full(n, len(stage_probs) - 1)
+    pending = np.ones(n, dtype=bool)
+    for i, (p, t) in enumerate(zip(stage_probs[:-1], exit_thresholds)):
+        idx = p.argmax(axis=1)
+        exits = pending & (p[np.arange(n), idx] >= t[idx])
+        out[exits] = p[exits]
+        stage_of[exits] = i
+        pending &= ~exits
+    return out, stage_of, names, stage_probs[-1]
+
+# ======================================================
+# 5. Cross-validated Evaluation (Fit บน Fold อื่น วัดผลบน Fold ที่เหลือ)
+# ======================================================
+def expected_calibration_error(probs, labels, bins=10):
+    conf = probs.max(axis=1)
+    correct = probs.argmax(axis=1) == labels
+    edges = np.linspace(0, 1, bins + 1)
+    bin_idx = np.clip(np.digitize(conf, edges) - 1, 0, bins - 1)
+    ece = 0.0
+    for b in range(bins):
+        mask = bin_idx == b
+        if mask.any():
+            ece += mask.mean() * abs(correct[mask].mean() - conf[mask].mean())
+    return ece
+
+n_folds = max(2, min(N_FOLDS, np.bincount(y_test).min()))
+kfold = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=42)
+stacked_cv = np.zeros((len(y_test), NUM_CLASSES))
+cascade_cv = np.zeros((len(y_test), NUM_CLASSES))
+stage_cv = np.zeros(len(y_test), dtype=int)
+
+print(f"\n--- Cross-validated Calibration ({n_folds} folds of the held-out split) ---")
+for fit_idx, eval_idx in kfold.split(X_test_raw, y_test):
+    fold_calib = fit_calibration({n: p[fit_idx] for n, p in held_probs.items()}, y_test[fit_idx],
+                                 None if cascade_probs is None else cascade_probs[fit_idx])
+    cascade_cv[eval_idx], stage_cv[eval_idx], stage_names, stacked_cv[eval_idx] = simulate_cascade(
+        fold_calib, {n: p[eval_idx] for n, p in held_probs.items()},
+        None if cascade_probs is None else cascade_probs[eval_idx])
+
+# ======================================================
+# 6. Final Fit & Save
+# ======================================================
+calibration = {"version": 2, "labels": LABELS_MAP, "models": list(held_probs.keys())}
+calibration.update(fit_calibration(held_probs, y_test, cascade_probs))
+calibration.update({"target_precision": TARGET_PRECISION, "exit_precision": EXIT_PRECISION,
+                    "cascade_precision": CASCADE_PRECISION})
+
+with open(CALIBRATION_PATH, "w", encoding="utf-8") as f:
+    json.dump(calibration, f, ensure_ascii=False, indent=4)
+
+print("\n--- Calibration ---")
+for name in held_probs:
+    print(f" {name:8s}: T = {calibration['temperatures'][name]:.3f} | weight = {calibration['weights'][name]:.3f}")
+print(f"\n--- Per-Class Thresholds (Cascade: {' -> '.join(stage_names)}) ---")
+for k, v in LABELS_MAP.items():
+    exits = [calibration[key]["thresholds"][k] for key in ("cascade", "early_exit") if key in calibration]
+    exit_str = " | ".join("never" if t is None else f"{t:.3f}" for t in exits)
+    print(f"[{k}] {v:12s} speak >= {calibration['class_thresholds'][k]:.3f} | exit >= {exit_str}")
+
+# ======================================================
+# 7. Report
+# ======================================================
+plain_probs = EnsembleBackend([cnn_backend, xgb_backend]).predict_proba(X_test_raw)
+
+# Latency ของแต่ละด่าน = ผลรวม Latency ของโมเดลที่ต้องรันจนถึงด่านนั้น
+latencies["ensemble"] = sum(latencies[n] for n in held_probs if n != FIRST_MODEL)
+stage_cost = np.cumsum([latencies[name] for name in stage_names])
+stage_fraction = np.bincount(stage_cv, minlength=len(stage_names)) / len(stage_cv)
+
+print("\n" + "="*50)
+print("สรุปผล (Cross-validated บน Held-out Split)")
+print("="*50)
+print(f" Plain 50:50   : Acc {accuracy_score(y_test, plain_probs.argmax(1))*100:.2f}% | ECE {expected_calibration_error(plain_probs, y_test):.4f}")
+print(f" Calibrated    : Acc {accuracy_score(y_test, stacked_cv.argmax(1))*100:.2f}% | ECE {expected_calibration_error(stacked_cv, y_test):.4f}")
+print(f" Cascade       : Acc {accuracy_score(y_test, cascade_cv.argmax(1))*100:.2f}%")
+for name, frac, cost in zip(stage_names, stage_fraction, stage_cost):
+    print(f"   {name:10s}: {frac*100:5.1f}% of gestures | {cost:.2f} ms")
+print(f" Latency/gesture: Full Ensemble {stage_cost[-1]:.2f} ms | Cascade {np.dot(stage_fraction, stage_cost):.2f} ms (avg)")
+print("="*50)
+print(f"[DONE] Calibration saved as '{CALIBRATION_PATH}'")
@@ -0,0 +1,140 @@
+import os
+import sys
+import time
+import argparse
+import threading
+
+from data_collector import (BAUD_RATE, DATA_DIR, PROFILING_PORT, CollectorSession, open_serial, writer, index, quality, catalog,
+                            get_user_seq)
+from profiling_hooks import ProfilingHooks
+
+# ======================================================
+# 1. Configuration
+# ======================================================
+# ใช้เก็บข้อมูลหลายคนพร้อมกัน: 1 Station = 1 ถุงมือ (Serial Port) + ผู้ใช้ + ท่าทาง
+# python collector_server.py --station COM3:iq:hello --station COM4:pon:water
+REFRESH_SEC = 1.0
+REOPEN_DELAY = 3.0   # ถ้าถุงมือหลุด รอเท่านี้แล้วเปิด Port ใหม่
+RATE_WINDOW = 300.0  # takes/min คิดจาก 5 นาทีล่าสุด
+
+# ======================================================
+# 2. Station (1 Thread ต่อ 1 Port)
+# ======================================================
+class Station:
+    def __init__(self, port, name, gesture, baud_rate=BAUD_RATE):
+        self.port = port
+        self.baud_rate = baud_rate
+        self.session = CollectorSession(name, gesture, verbose=False, shared=True)
+        self.status = "connecting"
+        self.started = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"station-{port}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=2.0)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                ser = open_serial(self.port, self.baud_rate)
+            except Exception as e:
+                self.status = f"error: {e}"
+                self._stop.wait(REOPEN_DELAY)
+                continue
+
+            self.status = "online"
+            try:
+                while not self._stop.is_set():
+                    line = ser.readline().decode('utf-8', errors='ignore').strip()
+                    self.session.handle_line(line)
+            except Exception as e:
+                # สายหลุด/Port หาย: Take ที่อัดค้างอยู่ทิ้งไป แล้วลองเชื่อมใหม่
+                self.status = f"lost: {e}"
+                self.session.raw_buffer = []
+                self.session.is_reading_data = False
+                self._stop.wait(REOPEN_DELAY)
+            finally:
+                ser.close()
+
+# ======================================================
+# 3. Terminal Dashboard
+# ======================================================
+def render(stations, started):
+    elapsed = time.monotonic() - started
+    lines = [
+        f"\x1b[1m Gesture Collector \x1b[0m  {len(stations)} stations | up {int(elapsed // 60)}m {int(elapsed % 60):02d}s"
+        f" | written {writer.written} | queued {len(writer.pending())} | errors {writer.errors}",
+        "",
+        f" {'PORT':8s} {'USER':10s} {'GESTURE':12s} {'STATE':16s} {'TAKES':>6s} {'TOTAL':>6s} {'T/MIN':>6s}  LAST",
+        " " + "-" * 100,
+    ]
+    for st in stations:
+        s = st.session
+        if st.status != "online":
+            state = st.status[:16]
+        elif s.is_reading_data:
+            state = f"rec {len(s.raw_buffer)} frames"
+        else:
+            state = "idle"
+        color = "\x1b[32m" if st.status == "online" else "\x1b[31m"
+        lines.append(f" {st.port:8s} {s.name:10s} {s.gesture:12s} {color}{state:16s}\x1b[0m"
+                     f" {s.saved:6d} {get_user_seq(s.name, s.gesture):6d} {s.takes_per_minute(RATE_WINDOW):6.1f}  {s.last_event}")
+    total_rate = sum(st.session.takes_per_minute(RATE_WINDOW) for st in stations)
+    lines += ["", f" Total: {sum(st.session.saved for st in stations)} takes | {total_rate:.1f} takes/min", " Ctrl+C to stop"]
+    # \x1b[H = กลับไปมุมซ้ายบน, \x1b[J = ลบส่วนที่เหลือ (วาดทับแทนการเลื่อนจอ)
+    sys.stdout.write("\x1b[H" + "\n".join(f"{line}\x1b[K" for line in lines) + "\n\x1b[J")
+    sys.stdout.flush()
+
+# ======================================================
+# 4. Main
+# ======================================================
+def parse_station(text):
+    parts = text.split(":")
+    if len(parts) != 3 or not all(parts):
+        raise argparse.ArgumentTypeError(f"'{text}' must be PORT:USER:GESTURE")
+    return parts
+
+def main():
+    parser = argparse.ArgumentParser(description="Record several gloves at once into the shared dataset")
+    parser.add_argument("--station", action="append", type=parse_station, required=True,
+                        metavar="PORT:USER:GESTURE", help="repeat once per glove")
+    parser.add_argument("--baud", type=int, default=BAUD_RATE)
+    args = parser.parse_args()
+
+    ports = [port for port, _, _ in args.station]
+    if len(set(ports)) != len(ports):
+        parser.error("each port can only be used by one station")
+
+    if os.name == "nt":
+        os.system("")  # เปิด ANSI Escape บน Windows Console
+
+    hooks = ProfilingHooks("collector", PROFILING_PORT).install()
+    started = time.monotonic()
+    stations = [Station(port, name, gesture, args.baud).start() for port, name, gesture in args.station]
+    sys.stdout.write("\x1b[2J")
+    try:
+        while True:
+            render(stations, started)
+            time.sleep(REFRESH_SEC)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for st in stations:
+            st.stop()
+        hooks.close()
+        writer.close()
+        index.save()
+        if quality is not None: quality.save()
+        if catalog is not None: catalog.close()
+        print(f"\n[SAVED] {writer.written} takes written to '{DATA_DIR}' ({writer.errors} errors)")
+        for st in stations:
+            s = st.session
+            print(f"   {st.port}: {s.name} - {s.gesture}: {s.saved} saved ({s.flagged} flagged), {s.rejected} rejected")
+
+if __name__ == "__main__":
+    main()
@@ -1,164 +1,272 @@
 import serial
-import pandas as pd
 import numpy as np
 import os, time
+from collections import deque
 from datetime import datetime
-from scipy.interpolate import interp1d
 
-import os
 from dotenv import load_dotenv
 
+from gesture_utils import parse_frame_line, PACK_EXT, TRIM_IDLE, idle_bounds
+from take_writer import TakeWriter
+from take_index import TakeIndex
+from take_quality import QualityGate, describe
+from take_catalog import TakeCatalog
+from profiling_hooks import ProfilingHooks
+
 load_dotenv()
 
 SERIAL_PORT = "COM3"
 BAUD_RATE = 115200
 DATA_DIR = "dataset_cf"
+MIN_FRAMES = 5
+
+# ตรวจคุณภาพ Take ก่อนบันทึก (Threshold ต่อท่าทางอยู่ใน take_quality.json)
+QUALITY_GATE = True
+
+# บันทึก Metadata ของทุก Take ลง SQLite (DATA_DIR/.catalog.sqlite) ให้ Tool อื่น Query ได้โดยไม่ต้องสแกนไฟล์
+CATALOG = True
+
+# Profiler / tracemalloc เปิดได้ระหว่างรัน: python profiling_hooks.py profile start --port 50551 (None = ปิด Control Socket)
+PROFILING_PORT = 50551
+
+# บันทึกไฟล์ใน Thread แยก (temp file + fsync + rename) Serial Loop จะได้รับ START_SIGNAL ถัดไปได้ทันที
+writer = TakeWriter()
+
+# Index (user, gesture) -> Takes สแกนโฟลเดอร์ครั้งเดียวตอนเริ่ม (หรือโหลดจาก Sidecar) ไม่ต้อง listdir ทุกครั้งที่บันทึก/ลบ
+index = TakeIndex(DATA_DIR, pending=writer.pending)
+
+quality = QualityGate(DATA_DIR) if QUALITY_GATE else None
+catalog = TakeCatalog(DATA_DIR) if CATALOG else None
+
+def on_commit(paths):
+    index.committed(paths)
+    if catalog is not None: catalog.committed(paths)
+
+writer.on_commit = on_commit
+
+def delete_last_file(name, gesture, verbose=True, path=None):
+    """Deletes `path` (a take this session saved), or the user's latest take of the gesture when None."""
+    # ให้ Take ที่ยังค้างในคิวลง Disk ก่อน ไม่งั้นจะลบไฟล์ก่อนหน้าแทน
+    writer.flush()
+    latest_file = path if path is not None else index.last_take(name, gesture)
+
+    if latest_file is None:
+        if verbose: print(f" [!] No files to delete for user '{name}' in '{gesture}'")
+        return None
 
-def delete_last_file(name, gesture):
-    path = os.path.join(DATA_DIR, gesture)
-    if not os.path.exists(path): return
-    
-    prefix = f"{name}_{gesture}_"
-    files = [os.path.join(path, f) for f in os.listdir(path) if f.startswith(prefix) and f.endswith('.csv')]
-    
-    if not files:
-        print(f" [!] No files to delete for user '{name}' in '{gesture}'")
-        return
-
-    latest_file = max(files, key=os.path.getctime)
     try:
         os.remove(latest_file)
-        print(f"\n [DELETE] Removed: {os.path.basename(latest_file)}")
-        print(f" [STATUS] Current files for {name}: {get_user_seq(name, gesture)}")
+        packed = os.path.splitext(latest_file)[0] + PACK_EXT
+        if os.path.exists(packed): os.remove(packed)  # ไม่งั้น load_dataset จะโหลด .gpk ที่เหลือแทน
+        index.remove(name, gesture, os.path.basename(latest_file))
+        if catalog is not None: catalog.remove(f"{gesture}/{os.path.basename(latest_file)}")
+        if verbose:
+            print(f"\n [DELETE] Removed: {os.path.basename(latest_file)}")
+            print(f" [STATUS] Current files for {name}: {get_user_seq(name, gesture)}")
+        return latest_file
     except Exception as e:
-        print(f" [ERROR] Could not delete file: {e}")
+        if verbose: print(f" [ERROR] Could not delete file: {e}")
+        return None
 
 def get_user_seq(name, gesture):
-    path = os.path.join(DATA_DIR, gesture)
-    if not os.path.exists(path): 
-        return 0
-    
-    prefix = f"{name}_{gesture}_"
-    
-    count = len([f for f in os.listdir(path) if f.startswith(prefix) and f.endswith('.csv')])
-    return count
+    return index.count(name, gesture)
+
+def open_serial(port, baud_rate=BAUD_RATE):
+    ser = serial.Serial()
+    ser.port = port
+    ser.baudrate = baud_rate
+    ser.timeout = 1
+
+    # Disable hardware flow control/reset signals
+    ser.setDTR(False)
+    ser.setRTS(False)
+
+    # Open the port safely
+    ser.open()
+
+    # Clear any leftover junk data in the buffer
+    ser.reset_input_buffer()
+    return ser
+
+# ======================================================
+# Collector Session (1 ถุงมือ = 1 Session)
+# ======================================================
+class CollectorSession:
+    """
+    Signal/frame state machine for one glove. handle_line() takes one decoded serial line;
+    takes go to the shared writer and index, so several sessions can run side by side
+    (see collector_server.py). With verbose=False nothing is printed and the latest
+    outcome is kept in last_event for a dashboard instead. DELETE_SIGNAL removes the last
+    take this session saved; with shared=False (one glove) it falls back to the user's latest
+    take on disk once the session has none left.
+    """
+    def __init__(self, name, gesture, verbose=True, shared=False):
+        self.name = name
+        self.gesture = gesture
+        self.verbose = verbose
+        self.shared = shared
+        self.saved_paths = []
+        self.raw_buffer = []
+        self.is_reading_data = False
+        self.saved = 0
+        self.rejected = 0
+        self.flagged = 0
+        self.save_times = deque()
+        self.last_event = "ready"
+        if quality is not None:
+            quality.profile(gesture)  # สร้าง Centroid ตอนเริ่ม ไม่ใช่ตอน Take แรกเข้ามา
+
+    def _print(self, *args, **kwargs):
+        if self.verbose:
+            print(*args, **kwargs)
+
+    def _reset(self, event):
+        self.raw_buffer = []
+        self.is_reading_data = False
+        self.last_event = event
+
+    def takes_per_minute(self, window=300.0):
+        # นับเฉพาะ Take ใน window วินาทีล่าสุด
+        now = time.monotonic()
+        while self.save_times and now - self.save_times[0] > window:
+            self.save_times.popleft()
+        if not self.save_times:
+            return 0.0
+        return len(self.save_times) / max(now - self.save_times[0], 60.0) * 60.0
+
+    def handle_line(self, line):
+        if not line: return
+
+        if "DELETE_SIGNAL" in line:
+            # ลบ Take ของ Session นี้เอง: ถุงมืออีกข้างที่ใช้ชื่อ/ท่าเดียวกันอาจบันทึกทีหลัง
+            if self.saved_paths:
+                removed = delete_last_file(self.name, self.gesture, self.verbose, path=self.saved_paths.pop())
+            elif not self.shared:
+                removed = delete_last_file(self.name, self.gesture, self.verbose)
+            else:
+                removed = None
+                self._print(" [!] No takes from this station to delete")
+            self._print("\nReady for next take...")
+            self._reset(f"deleted {os.path.basename(removed)}" if removed else "nothing to delete")
+
+        elif "START_SIGNAL" in line:
+            self._print(f"[*] Recording...", end="", flush=True)
+            self.raw_buffer = []
+            self.is_reading_data = True
+            self.last_event = "recording"
+
+        elif "CANCEL_SIGNAL" in line:
+            self._print(" -> [CANCELLED]")
+            self._reset("cancelled")
+
+        elif "DISCARD_SIGNAL" in line:
+            self._print(" -> [DISCARDED: Too Short]")
+            self._reset("discarded (too short)")
+
+        elif self.is_reading_data and (line.startswith("S ") or (line and line[0].isdigit()) or line.startswith("-")):
+            frame = parse_frame_line(line)
+            if frame is not None:
+                self.raw_buffer.append(frame)
+
+        elif "SUCCESS_SIGNAL" in line:
+            actual_frames = len(self.raw_buffer)
+            self._print(f" [OK] Received {actual_frames} raw frames.")
+
+            if actual_frames >= MIN_FRAMES:
+                self.save_take()
+            else:
+                self._print(" [ERROR] Raw data too short, not saved.")
+                self.rejected += 1
+                self._reset(f"too short ({actual_frames} frames)")
+
+            self.is_reading_data = False
+            self._print("\nReady for next take...")
+
+    def save_take(self):
+        report = None
+        if quality is not None:
+            report = quality.check(self.gesture, self.raw_buffer)
+            if report["reject"]:
+                self._print(f"\n [QUALITY] REJECTED ({describe(report)}) - not saved, please record again.")
+                self.rejected += 1
+                self._reset(f"rejected: {describe(report)}")
+                return
+            if not report["ok"]:
+                self._print(f"\n [QUALITY] Warning: {describe(report)}")
+                self.flagged += 1
+            else:
+                quality.add(self.gesture, self.raw_buffer)
+
+        date_str = datetime.now().strftime("%m%d%y")
+        seq, filename = index.reserve(self.name, self.gesture, date_str)
+        filepath = os.path.join(DATA_DIR, self.gesture, filename)
+
+        writer.submit(filepath, self.raw_buffer)
+        self.saved_paths.append(filepath)
+        if catalog is not None: catalog.add(f"{self.gesture}/{filename}", self.raw_buffer, report)
+        self.saved += 1
+        self.save_times.append(time.monotonic())
+        self.last_event = f"saved {filename} ({len(self.raw_buffer)} frames)"
+        if TRIM_IDLE:
+            # ช่วงที่ขยับจริง (ส่วนที่โมเดลจะเห็น) ไฟล์ยังเก็บทุกเฟรมเหมือนเดิม
+            start, end = idle_bounds(np.asarray(self.raw_buffer, dtype=np.float64))
+            self.last_event += f" [motion {start}-{end}]"
+        if report is not None and not report["ok"]:
+            self.last_event += f" [flag: {describe(report)}]"
+
+        if self.verbose:
+            print("\n" + "="*40)
+            print(f" [FLEX MAX] Gesture: {self.gesture}")
+            print("-" * 40)
+
+            # หาค่า Max (คอลัมน์ 0-4 = L_F1-5, 11-15 = R_F1-5)
+            max_vals = np.max(self.raw_buffer, axis=0)
+
+            # แสดงผลแบบแบ่งฝั่ง ซ้าย | ขวา
+            print("  LEFT HAND (F1-F5)  |  RIGHT HAND (F1-F5)")
+            left_vals = ", ".join([f"{v:4.0f}" for v in max_vals[0:5]])
+            right_vals = ", ".join([f"{v:4.0f}" for v in max_vals[11:16]])
+            print(f"  {left_vals}  |  {right_vals}")
+            print("="*40)
+
+            if TRIM_IDLE:
+                print(f" [MOTION] frames {start}-{end} of {len(self.raw_buffer)} (idle head/tail trimmed before resampling)")
+            print(f" [TOTAL] {self.name} - {self.gesture}: {get_user_seq(self.name, self.gesture)} files")
+        self.raw_buffer = []
 
 def main():
     name = input("Enter User Name: ").strip() or "iq"
     gesture = input("Enter Gesture Label: ").strip() or "hello"
-    
+    hooks = ProfilingHooks("collector", PROFILING_PORT).install()
+
     try:
-        ser = serial.Serial()
-        ser.port = SERIAL_PORT
-        ser.baudrate = BAUD_RATE
-        ser.timeout = 1
-        
-        # Disable hardware flow control/reset signals
-        ser.setDTR(False)
-        ser.setRTS(False)
-        
-        # Open the port safely
-        ser.open()
-        
-        # Clear any leftover junk data in the buffer
-        ser.reset_input_buffer()
+        ser = open_serial(SERIAL_PORT)
         print(f"\n[READY] Collecting '{gesture}' for {name}")
         print(f"[STATUS] Current files: {get_user_seq(name, gesture)}")
         print("--------------------------------------------------")
 
-        raw_buffer = []
-        is_reading_data = False
+        session = CollectorSession(name, gesture)
 
         while True:
             try:
                 line = ser.readline().decode('utf-8', errors='ignore').strip()
             except:
                 continue
-                
-            if not line: continue
-
-            if "DELETE_SIGNAL" in line:
-                delete_last_file(name, gesture)
-                print("\nReady for next take...")
-                raw_buffer = []
-                is_reading_data = False
-
-            elif "START_SIGNAL" in line:
-                print(f"[*] Recording...", end="", flush=True)
-                raw_buffer = []
-                is_reading_data = True
-            
-            elif "CANCEL_SIGNAL" in line:
-                print(" -> [CANCELLED]")
-                is_reading_data = False
-                raw_buffer = []
-
-            elif "DISCARD_SIGNAL" in line:
-                print(" -> [DISCARDED: Too Short]")
-                is_reading_data = False
-                raw_buffer = []
-
-            elif is_reading_data and (line.startswith("S ") or (line and line[0].isdigit()) or line.startswith("-")):
-                parts = [x for x in line.split() if x not in ["S", "E"]]
-                
-                if len(parts) == 22:
-                    try:
-                        raw_buffer.append([float(x) for x in parts])
-                    except ValueError:
-                        pass
-
-            elif "SUCCESS_SIGNAL" in line:
-                actual_frames = len(raw_buffer)
-                print(f" [OK] Received {actual_frames} raw frames.")
-                
-                if actual_frames >= 5:
-                    
-                    if raw_buffer is not None:
-                        date_str = datetime.now().strftime("%m%d%y")
-                        seq = get_user_seq(name, gesture) + 1
-                        gesture_dir = os.path.join(DATA_DIR, gesture)
-                        os.makedirs(gesture_dir, exist_ok=True)
-                        filename = f"{name}_{gesture}_{date_str}_{seq:03d}.csv"
-                        filepath = os.path.join(DATA_DIR, gesture, filename)
-                        
-                        cols = [f'L_F{i}' for i in range(1,6)] + ['L_Ax','L_Ay','L_Az','L_Gx','L_Gy','L_Gz'] + \
-                               [f'R_F{i}' for i in range(1,6)] + ['R_Ax','R_Ay','R_Az','R_Gx','R_Gy','R_Gz']
-                        
-                        df = pd.DataFrame(raw_buffer, columns=cols)
-                        df.to_csv(filepath, index=False)
-
-                        print("\n" + "="*40)
-                        print(f" [FLEX MAX] Gesture: {gesture}")
-                        print("-" * 40)
-                        
-                        # แยก List ของคอลัมน์ที่ต้องการ
-                        left_flex = [f'L_F{i}' for i in range(1, 6)]
-                        right_flex = [f'R_F{i}' for i in range(1, 6)]
-                        
-                        # หาค่า Max
-                        max_df = df.max()
-                        
-                        # แสดงผลแบบแบ่งฝั่ง ซ้าย | ขวา
-                        print("  LEFT HAND (F1-F5)  |  RIGHT HAND (F1-F5)")
-                        left_vals = ", ".join([f"{max_df[c]:4.0f}" for c in left_flex])
-                        right_vals = ", ".join([f"{max_df[c]:4.0f}" for c in right_flex])
-                        print(f"  {left_vals}  |  {right_vals}")
-                        print("="*40)
-                        
-                        print(f" [TOTAL] {name} - {gesture}: {get_user_seq(name, gesture)} files")
-                    else:
-                         print(" [ERROR] Data empty after trimming zeros.")
-                else:
-                    print(" [ERROR] Raw data too short, not saved.")
-                
-                is_reading_data = False
-                print("\nReady for next take...")
+
+            session.handle_line(line)
 
     except KeyboardInterrupt:
         print("\nExit...")
         if 'ser' in locals() and ser.is_open: ser.close()
     except Exception as e:
         print(f"\nError: {e}")
+    finally:
+        hooks.close()
+        writer.close()
+        index.save()
+        if quality is not None: quality.save()
+        if catalog is not None: catalog.close()
+        print(f"[SAVED] {writer.written} takes written ({writer.errors} errors)")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
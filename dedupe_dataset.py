@@ -0,0 +1,275 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from gesture_utils import DATA_DIR, NUM_FEATURES, PREPROCESSING_VERSION, detect_labels, parse_take_name, fast_resample, PACK_EXT
+
+# ======================================================
+# 1. Configuration
+# ======================================================
+EMBED_FRAMES = 20            # Embedding = Take ที่ Resample เหลือ 20 เฟรม (20 * 22 = 440 มิติ)
+NEAR_THRESHOLD = 0.995       # Cosine Similarity ตั้งแต่ค่านี้ถือว่าเป็น Near-duplicate
+BLOCK_ELEMENTS = 2 ** 25     # ขนาด Similarity Block ต่อการคูณ Matrix หนึ่งครั้ง (~128 MB, คุมหน่วยความจำ)
+CACHE_FILE = ".dedupe_cache.npz"
+EMBEDDING_VERSION = 1        # เพิ่มเมื่อแก้วิธีคำนวณใน embed_file() ให้ Cache เดิมถูกคำนวณใหม่
+QUARANTINE_DIR = "_quarantine"  # ขึ้นต้นด้วย "_" จึงไม่ถูก detect_labels นับเป็นท่าทาง
+QUARANTINE_LOG = "quarantine.json"
+REPORT_FILE = "dedupe_report.json"
+
+# ======================================================
+# 2. Embeddings (with cache)
+# ======================================================
+def embed_file(path):
+    """(sha256 of the frame values, embedding) for one CSV take; embedding is None if unusable."""
+    frames = pd.read_csv(path).values.astype(np.float64)
+    digest = hashlib.sha256(np.ascontiguousarray(frames).tobytes()).hexdigest()
+    resampled = fast_resample(frames, EMBED_FRAMES)
+    if resampled is None:
+        return digest, None
+    # ลบค่าเฉลี่ยต่อช่อง: Take เดียวกันที่เริ่มจากท่ามือต่างกันเล็กน้อยยังถือว่าซ้ำ
+    return digest, (resampled - resampled.mean(axis=0)).astype(np.float32)
+
+def embedding_config():
+    # Cache ใช้ได้เฉพาะเมื่อคำนวณด้วยวิธีเดียวกัน (เช่น trim_idle ของ PREPROCESSING_VERSION ใหม่ทำให้ Embedding เปลี่ยน)
+    return json.dumps({"preprocessing_version": PREPROCESSING_VERSION, "embedding_version": EMBEDDING_VERSION,
+                       "embed_frames": EMBED_FRAMES}, sort_keys=True)
+
+def list_takes(data_dir):
+    takes = []
+    for gesture in detect_labels(data_dir).values():
+        folder = os.path.join(data_dir, gesture)
+        with os.scandir(folder) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(".csv"):
+                    st = entry.stat()
+                    takes.append((os.path.join(gesture, entry.name), gesture, st.st_mtime_ns, st.st_size))
+    takes.sort()
+    return takes
+
+def load_embeddings(data_dir, workers=None):
+    """
+    Embeds every take, reusing cached rows whose file size and mtime did not change. The whole
+    cache is dropped when it was built with another preprocessing / embedding config.
+    """
+    takes = list_takes(data_dir)
+    cache_path = os.path.join(data_dir, CACHE_FILE)
+    config = embedding_config()
+    cached = {}
+    if os.path.exists(cache_path):
+        with np.load(cache_path, allow_pickle=False) as c:
+            stale = "config" not in c.files or str(c["config"]) != config
+            for i, rel in enumerate([] if stale else c["paths"]):
+                cached[str(rel)] = (int(c["mtimes"][i]), int(c["sizes"][i]), str(c["hashes"][i]), c["embeddings"][i], bool(c["valid"][i]))
+
+    embeddings = np.zeros((len(takes), EMBED_FRAMES, NUM_FEATURES), dtype=np.float32)
+    hashes = [""] * len(takes)
+    valid = np.zeros(len(takes), dtype=bool)
+    missing = []
+    for i, (rel, _, mtime, size) in enumerate(takes):
+        hit = cached.get(rel)
+        if hit and hit[0] == mtime and hit[1] == size:
+            hashes[i], embeddings[i], valid[i] = hit[2], hit[3], hit[4]
+        else:
+            missing.append(i)
+
+    if missing:
+        paths = [os.path.join(data_dir, takes[i][0]) for i in missing]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(embed_file, paths, chunksize=64)
+            for i, (digest, emb) in zip(missing, results):
+                hashes[i] = digest
+                if emb is not None:
+                    embeddings[i], valid[i] = emb, True
+
+    tmp = cache_path + ".tmp.npz"
+    np.savez(tmp, paths=np.array([t[0] for t in takes]), mtimes=np.array([t[2] for t in takes], dtype=np.int64),
+             sizes=np.array([t[3] for t in takes], dtype=np.int64), hashes=np.array(hashes),
+             embeddings=embeddings, valid=valid, config=np.array(config))
+    os.replace(tmp, cache_path)
+    return takes, embeddings, hashes, valid, len(missing)
+
+def normalize(embeddings):
+    # Scale แต่ละช่องด้วย Std ของทั้ง Dataset (Flex 0-2000 กับ Gyro ±300 จะได้มีน้ำหนักพอๆ กัน) แล้วทำ L2 Norm
+    scale = embeddings.reshape(-1, NUM_FEATURES).std(axis=0) + 1e-6
+    flat = (embeddings / scale).reshape(len(embeddings), -1)
+    return flat / (np.linalg.norm(flat, axis=1, keepdims=True) + 1e-12)
+
+# ======================================================
+# 3. Search
+# ======================================================
+def near_pairs(vectors, threshold):
+    """All pairs (i < j) with cosine >= threshold, one matrix product per block of rows."""
+    pairs, sims = [], []
+    block_size = max(64, BLOCK_ELEMENTS // max(len(vectors), 1))
+    for start in range(0, len(vectors), block_size):
+        block = vectors[start:start + block_size] @ vectors[start:].T
+        rows, cols = np.nonzero(block >= threshold)
+        # เก็บเฉพาะครึ่งบนของ Matrix (j > i) จะได้ไม่นับคู่ซ้ำ/ตัวเอง
+        upper = cols > rows
+        rows, cols = rows[upper], cols[upper]
+        pairs.append(np.stack([rows + start, cols + start], axis=1))
+        sims.append(block[rows, cols])
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int64), np.empty(0, dtype=np.float32)
+    return np.concatenate(pairs), np.concatenate(sims)
+
+def group_duplicates(n, pairs):
+    # Union-Find: กลุ่มของ Take ที่ซ้ำกันเป็นทอดๆ
+    parent = np.arange(n)
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    for a, b in pairs:
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    groups = {}
+    for i in np.unique(pairs):
+        groups.setdefault(find(i), []).append(int(i))
+    return [sorted(g) for g in groups.values() if len(g) > 1]
+
+def take_order(rel, gesture):
+    # เก็บ Take ที่อัดก่อน (seq น้อยสุด) ไว้ ที่เหลือถือเป็นตัวซ้ำ
+    parsed = parse_take_name(os.path.basename(rel), gesture)
+    return (parsed[0], parsed[2], rel) if parsed else ("", 0, rel)
+
+def find_duplicates(takes, embeddings, hashes, valid, threshold=NEAR_THRESHOLD, cross_label=False):
+    exact = {}
+    for i, digest in enumerate(hashes):
+        exact.setdefault(digest, []).append(i)
+    exact_pairs = [(g[0], j) for g in exact.values() if len(g) > 1 for j in g[1:]]
+
+    vectors = normalize(embeddings)
+    gestures = np.array([t[1] for t in takes])
+    near, near_sims = [], []
+    # ค่าเริ่มต้นเทียบเฉพาะในท่าเดียวกัน (ไม่ใช่ O(N^2) ทั้ง Dataset); --cross-label เทียบทุกคู่
+    scopes = [np.flatnonzero(valid)] if cross_label else [np.flatnonzero(valid & (gestures == g)) for g in np.unique(gestures)]
+    for idx in scopes:
+        pairs, sims = near_pairs(vectors[idx], threshold)
+        near.append(idx[pairs])
+        near_sims.append(sims)
+    near = np.concatenate(near) if near else np.empty((0, 2), dtype=np.int64)
+    near_sims = np.concatenate(near_sims) if near_sims else np.empty(0)
+
+    all_pairs = np.concatenate([np.array(exact_pairs, dtype=np.int64).reshape(-1, 2), near])
+    groups = group_duplicates(len(takes), all_pairs)
+    for g in groups:
+        g.sort(key=lambda i: take_order(takes[i][0], takes[i][1]))
+    return groups, len(exact_pairs), near, near_sims
+
+# ======================================================
+# 4. Quarantine / Restore
+# ======================================================
+def move_packed(source, target):
+    """Moves the take's .gpk copy along with its CSV, so the loader cannot pick it up on its own."""
+    source, target = os.path.splitext(source)[0] + PACK_EXT, os.path.splitext(target)[0] + PACK_EXT
+    if os.path.exists(source):
+        shutil.move(source, target)
+
+def quarantine(data_dir, takes, groups):
+    qdir = os.path.join(data_dir, QUARANTINE_DIR)
+    log_path = os.path.join(qdir, QUARANTINE_LOG)
+    log = []
+    if os.path.exists(log_path):
+        with open(log_path, "r", encoding="utf-8") as f:
+            log = json.load(f)
+    moved = 0
+    for group in groups:
+        keep = takes[group[0]][0]
+        for i in group[1:]:
+            rel = takes[i][0]
+            target = os.path.join(qdir, rel)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(os.path.join(data_dir, rel), target)
+            move_packed(os.path.join(data_dir, rel), target)
+            log.append({"file": rel, "duplicate_of": keep, "time": time.strftime("%Y-%m-%d %H:%M:%S")})
+            moved += 1
+    os.makedirs(qdir, exist_ok=True)
+    with open(log_path, "w", encoding="utf-8") as f:
+        json.dump(log, f, ensure_ascii=False, indent=4)
+    return moved
+
+def restore(data_dir):
+    qdir = os.path.join(data_dir, QUARANTINE_DIR)
+    log_path = os.path.join(qdir, QUARANTINE_LOG)
+    if not os.path.exists(log_path):
+        return 0
+    with open(log_path, "r", encoding="utf-8") as f:
+        log = json.load(f)
+    restored, remaining = 0, []
+    for entry in log:
+        source, target = os.path.join(qdir, entry["file"]), os.path.join(data_dir, entry["file"])
+        if os.path.exists(source) and not os.path.exists(target):
+            shutil.move(source, target)
+            move_packed(source, target)
+            restored += 1
+        else:
+            remaining.append(entry)
+    with open(log_path, "w", encoding="utf-8") as f:
+        json.dump(remaining, f, ensure_ascii=False, indent=4)
+    return restored
+
+# ======================================================
+# 5. CLI
+# ======================================================
+def main():
+    parser = argparse.ArgumentParser(description="Find exact and near-duplicate takes in the dataset")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--threshold", type=float, default=NEAR_THRESHOLD, help="cosine similarity for near duplicates")
+    parser.add_argument("--cross-label", action="store_true", help="also compare takes across gestures (O(N^2))")
+    parser.add_argument("--quarantine", action="store_true", help=f"move duplicates to {QUARANTINE_DIR}/ (keeps the earliest take)")
+    parser.add_argument("--restore", action="store_true", help=f"move everything in {QUARANTINE_DIR}/ back")
+    parser.add_argument("--report", default=REPORT_FILE)
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.data_dir):
+        print(f"[!] ไม่พบโฟลเดอร์ {args.data_dir} ครับ")
+        return
+
+    if args.restore:
+        print(f"[DONE] Restored {restore(args.data_dir)} takes from {QUARANTINE_DIR}/")
+        return
+
+    start = time.perf_counter()
+    takes, embeddings, hashes, valid, embedded = load_embeddings(args.data_dir, args.workers)
+    embed_time = time.perf_counter() - start
+    print(f"--- Embedded {embedded} new takes ({len(takes) - embedded} cached) in {embed_time:.2f} s ---")
+
+    start = time.perf_counter()
+    groups, n_exact, near, near_sims = find_duplicates(takes, embeddings, hashes, valid, args.threshold, args.cross_label)
+    search_time = time.perf_counter() - start
+    n_dupes = sum(len(g) - 1 for g in groups)
+    print(f"--- Searched {len(takes)} takes in {search_time:.2f} s: {n_exact} exact, {len(near)} near pairs "
+          f"-> {len(groups)} groups, {n_dupes} duplicates ---")
+
+    for group in groups[:20]:
+        keep, *dupes = [takes[i][0] for i in group]
+        print(f"   keep {keep}  <-  {', '.join(dupes)}")
+    if len(groups) > 20:
+        print(f"   ... {len(groups) - 20} more groups in {args.report}")
+
+    report = {
+        "data_dir": args.data_dir, "takes": len(takes), "threshold": args.threshold, "cross_label": args.cross_label,
+        "embed_seconds": round(embed_time, 3), "search_seconds": round(search_time, 3),
+        "exact_pairs": n_exact, "near_pairs": [{"a": takes[a][0], "b": takes[b][0], "cosine": round(float(s), 5)}
+                                               for (a, b), s in zip(near, near_sims)],
+        "groups": [{"keep": takes[g[0]][0], "duplicates": [takes[i][0] for i in g[1:]]} for g in groups],
+    }
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+
+    if args.quarantine and groups:
+        moved = quarantine(args.data_dir, takes, groups)
+        print(f"[DONE] Moved {moved} duplicates to {os.path.join(args.data_dir, QUARANTINE_DIR)}")
+
+if __name__ == "__main__":
+    main()
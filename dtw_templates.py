@@ -0,0 +1,366 @@
+import os
+import io
+import json
+import time
+import argparse
+import numpy as np
+
+from gesture_utils import (DATA_DIR, EXPECTED_FRAMES, NUM_FEATURES, PREPROCESSING_VERSION, detect_labels, load_dataset,
+                           read_any, take_files, fast_resample)
+
+# ======================================================
+# 1. Configuration
+# ======================================================
+# python dtw_templates.py build                                  -> สร้าง Template Store จาก dataset_cf ทั้งหมด
+# python dtw_templates.py enroll thank_you dataset_cf/thank_you  -> เพิ่มท่าใหม่จากไม่กี่ Take (Server ที่รันอยู่โหลดเองระหว่างท่า)
+# python dtw_templates.py eval                                   -> Leave-one-out Accuracy + เวลาค้นต่อท่า
+TEMPLATES_PATH = "gesture_templates.npz"
+DTW_DOWNSAMPLE = 2       # เฉลี่ยทีละ 2 เฟรม (70 -> 35) ก่อนเทียบ เซลล์ DTW น้อยลง 4 เท่า
+DTW_WINDOW = 0.1         # Sakoe-Chiba Band: เลื่อนเวลาได้ไม่เกิน 10% ของความยาวท่า
+PAA_SEGMENT = 5          # ขนาดช่วงของ LB_PAA (ขั้นกรองแรกที่ถูกที่สุด)
+FIRST_CHUNK = 16         # จำนวน Template ที่ใกล้สุด (ตาม Lower Bound) ที่คำนวณ DTW เต็มก่อน เพื่อได้ระยะอ้างอิงเร็ว
+CHUNK_GROWTH = 4         # Chunk ถัดไปใหญ่ขึ้นทีละ 4 เท่า (ถ้าตัดทิ้งได้น้อย ก็ยังใกล้เคียงการคำนวณทีเดียวทั้งหมด)
+RELEVANCE = 8.0          # คลาสที่ไกลกว่าอันดับ 1 เกิน RELEVANCE * temperature มี Probability < e^-8 จึงไม่ต้องหาระยะจริง
+TEMPERATURE_FACTOR = 0.5 # Softmax temperature = ค่านี้ * ค่ากลางระยะ Nearest Neighbour ของ Template
+TEMPERATURE_SAMPLE = 200
+MIN_SCALE = 1e-3
+
+# ======================================================
+# 2. Lower Bounds + DTW (NumPy ทั้งหมด, เทียบ 1 Query กับหลาย Template พร้อมกัน)
+# ======================================================
+def downsample(x, factor=DTW_DOWNSAMPLE):
+    """(..., T, C) -> (..., T // factor, C) by averaging consecutive frames."""
+    t = x.shape[-2] // factor * factor
+    return x[..., :t, :].reshape(x.shape[:-2] + (t // factor, factor, x.shape[-1])).mean(axis=-2)
+
+def band_width(length, window=DTW_WINDOW):
+    return max(1, int(np.ceil(window * length)))
+
+def envelopes(templates, w):
+    """Upper / lower LB_Keogh envelopes (M, T, C): running max / min over [i - w, i + w]."""
+    n = templates.shape[1]
+    upper, lower = templates.copy(), templates.copy()
+    for k in range(1, w + 1):
+        upper[:, :n - k] = np.maximum(upper[:, :n - k], templates[:, k:])
+        upper[:, k:] = np.maximum(upper[:, k:], templates[:, :n - k])
+        lower[:, :n - k] = np.minimum(lower[:, :n - k], templates[:, k:])
+        lower[:, k:] = np.minimum(lower[:, k:], templates[:, :n - k])
+    return upper, lower
+
+def paa_envelopes(upper, lower, segment=PAA_SEGMENT):
+    """
+    Envelopes reduced to segments (max of upper / min of lower) for LB_PAA, stored as
+    float32 centre and half-width (M, segments * C) so the bound is a single pass.
+    """
+    m, n, c = upper.shape
+    s = n // segment
+    upper = upper[:, :s * segment].reshape(m, s, segment, c).max(axis=2)
+    lower = lower[:, :s * segment].reshape(m, s, segment, c).min(axis=2)
+    return ((upper + lower) / 2).astype(np.float32).reshape(m, -1), ((upper - lower) / 2).astype(np.float32).reshape(m, -1)
+
+def lb_paa(query, centre, half_width, segment=PAA_SEGMENT):
+    """
+    Lower bound of LB_Keogh from segment means (Jensen: the squared hinge is convex),
+    so it is also a lower bound of DTW. (M,) for one query (T, C).
+    """
+    s = centre.shape[1] // query.shape[1]
+    q = query[:s * segment].reshape(s, segment, -1).mean(axis=1).astype(np.float32).ravel()
+    excess = np.abs(centre - q)
+    excess -= half_width
+    np.maximum(excess, 0, out=excess)
+    # float32 ปัดเศษได้นิดหน่อย ลดลงเล็กน้อยให้ยังเป็น Lower Bound แน่นอน
+    return (segment * (1 - 1e-4)) * np.einsum("mk,mk->m", excess, excess, dtype=np.float64)
+
+def lb_keogh_rows(query, upper, lower):
+    """Per-row LB_Keogh contributions (M, T): every query frame is at least this far from the band."""
+    excess = np.maximum(query - upper, 0) + np.maximum(lower - query, 0)
+    return np.einsum("mtc,mtc->mt", excess, excess)
+
+def dtw_many(query, templates, w, limits, lb_tail):
+    """
+    Banded DTW (squared Euclidean frame cost) of one query (T, C) against M templates at once.
+    Row by row; within a row the left-to-right recurrence D[j] = min(tmp[j], D[j-1] + c[j]) is
+    solved in closed form as C[j] + running_min(tmp - C) with C = cumsum(c), so each row is a few
+    array operations for all templates. A template is abandoned as soon as its best cell in the
+    row plus the LB_Keogh of the rows still to come reaches its limit. Returns (M,) distances,
+    inf for abandoned templates.
+    """
+    m, n, _ = templates.shape
+    out = np.full(m, np.inf)
+    alive = np.arange(m)
+    prev = np.full((m, n + 1), np.inf)
+    prev[:, 0] = 0.0  # จุดเริ่ม (0, 0)
+    for i in range(n):
+        lo, hi = max(0, i - w), min(n, i + w + 1)
+        diff = templates[:, lo:hi] - query[i]
+        cost = np.einsum("mbc,mbc->mb", diff, diff)
+        tmp = cost + np.minimum(prev[:, lo:hi], prev[:, lo + 1:hi + 1])
+        csum = np.cumsum(cost, axis=1)
+        row = csum + np.minimum.accumulate(tmp - csum, axis=1)
+        if i == 0:
+            prev[:, 0] = np.inf
+        prev[:, lo + 1:hi + 1] = row
+        if lo > 0:
+            prev[:, lo] = np.inf  # ออกนอก Band
+        keep = row.min(axis=1) + lb_tail[:, i + 1] < limits
+        if not keep.all():
+            alive, templates, prev, limits, lb_tail = alive[keep], templates[keep], prev[keep], limits[keep], lb_tail[keep]
+            if len(alive) == 0:
+                return out
+    out[alive] = prev[:, n]
+    return out
+
+# ======================================================
+# 3. Template Store
+# ======================================================
+class TemplateStore:
+    """
+    Resampled takes (M, 70, 22) with their class, searched by nearest-neighbour DTW.
+    Channels are divided by a fixed per-channel scale (set when the store is created) so flex,
+    accel and gyro weigh alike. Classes can be added at any time with enroll().
+    """
+    def __init__(self, templates, labels, classes, scale, texts=None, files=None, temperature=None):
+        self.templates = np.asarray(templates, dtype=np.float32).reshape(-1, EXPECTED_FRAMES, NUM_FEATURES)
+        self.labels = np.asarray(labels, dtype=np.int64)
+        self.classes = list(classes)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.texts = dict(texts or {})
+        self.files = list(files or [""] * len(self.labels))
+        self.temperature = temperature
+        self._index()
+        if self.temperature is None:
+            self.temperature = self.estimate_temperature()
+
+    @property
+    def labels_map(self):
+        return dict(enumerate(self.classes))
+
+    def _index(self):
+        # เตรียมทุกอย่างที่ใช้ตอนค้น: Template ที่ย่อแล้ว, Envelope, Envelope แบบช่วง (ทำครั้งเดียวต่อการแก้ Store)
+        self.series = self.prepare(self.templates)
+        self.w = band_width(self.series.shape[1])
+        self.upper, self.lower = envelopes(self.series, self.w)
+        self.centre_seg, self.half_width_seg = paa_envelopes(self.upper, self.lower)
+
+    def prepare(self, batch):
+        return downsample(np.asarray(batch, dtype=np.float64) / self.scale)
+
+    # ---------- Search ----------
+    def search(self, query, skip=None):
+        """
+        Nearest DTW distance per class (num_classes,) for one prepared query (T, C); inf for classes
+        that cannot matter (further than RELEVANCE * temperature from the best). skip = template index
+        to leave out (leave-one-out).
+        """
+        num_classes = len(self.classes)
+        best = np.full(num_classes, np.inf)
+        if len(self.labels) == 0:
+            return best
+        radius = RELEVANCE * self.temperature if self.temperature is not None else np.inf
+        lb = lb_paa(query, self.centre_seg, self.half_width_seg)
+        if skip is not None:
+            lb[skip] = np.inf
+        order = np.argsort(lb, kind="stable")
+        pos, size = 0, FIRST_CHUNK
+        while pos < len(order):
+            # ทุก Template ที่เหลือมี Lower Bound มากกว่านี้ (เรียงไว้แล้ว) -> ไม่มีตัวไหนเปลี่ยนผลได้อีก
+            if lb[order[pos]] >= best.min() + radius or np.isinf(lb[order[pos]]):
+                break
+            idx = order[pos:pos + size]
+            pos, size = pos + size, size * CHUNK_GROWTH
+            limits = np.minimum(best[self.labels[idx]], best.min() + radius)
+            idx, limits = idx[lb[idx] < limits], limits[lb[idx] < limits]
+            if len(idx) == 0:
+                continue
+            rows = lb_keogh_rows(query, self.upper[idx], self.lower[idx])
+            keep = rows.sum(axis=1) < limits
+            idx, limits, rows = idx[keep], limits[keep], rows[keep]
+            if len(idx) == 0:
+                continue
+            lb_tail = np.zeros((len(idx), rows.shape[1] + 1))
+            lb_tail[:, :-1] = np.cumsum(rows[:, ::-1], axis=1)[:, ::-1]
+            dist = dtw_many(query, self.series[idx], self.w, limits, lb_tail)
+            np.minimum.at(best, self.labels[idx], dist)
+        return best
+
+    def predict_proba(self, batch):
+        """(N, 70, 22) resampled -> (N, num_classes): softmax of -distance / temperature over classes."""
+        queries = self.prepare(batch)
+        probs = np.zeros((len(queries), len(self.classes)))
+        for n, query in enumerate(queries):
+            dist = self.search(query)
+            if np.all(np.isinf(dist)):
+                probs[n] = 1.0 / len(self.classes)
+                continue
+            logits = -(dist - dist.min()) / max(self.temperature, 1e-12)
+            weights = np.exp(logits)
+            probs[n] = weights / weights.sum()
+        return probs
+
+    def estimate_temperature(self, sample=TEMPERATURE_SAMPLE, seed=0):
+        """TEMPERATURE_FACTOR * median leave-one-out nearest-neighbour distance over a sample of templates."""
+        if len(self.labels) < 2:
+            return 1.0
+        self.temperature = 0.0  # ต้องการแค่ระยะที่ใกล้สุด (Radius 0)
+        idx = np.random.default_rng(seed).permutation(len(self.labels))[:sample]
+        nearest = [self.search(self.series[i], skip=i).min() for i in idx]
+        nearest = [d for d in nearest if np.isfinite(d) and d > 0]  # Take ซ้ำกันเป๊ะไม่นับ
+        return float(TEMPERATURE_FACTOR * np.median(nearest)) if nearest else 1.0
+
+    # ---------- Edit ----------
+    def enroll(self, name, resampled, text=None, files=None):
+        """Adds templates (k, 70, 22) for a gesture (new or existing). Returns the class index."""
+        if name not in self.classes:
+            self.classes.append(name)
+        label = self.classes.index(name)
+        resampled = np.asarray(resampled, dtype=np.float32).reshape(-1, EXPECTED_FRAMES, NUM_FEATURES)
+        self.templates = np.concatenate([self.templates, resampled])
+        self.labels = np.concatenate([self.labels, np.full(len(resampled), label)])
+        self.files += list(files or [""] * len(resampled))
+        if text:
+            self.texts[name] = text
+        self._index()
+        return label
+
+    def remove(self, name):
+        """Drops a gesture and its templates; later classes move down one index."""
+        label = self.classes.index(name)
+        keep = self.labels != label
+        self.templates, self.files = self.templates[keep], [f for f, k in zip(self.files, keep) if k]
+        self.labels = self.labels[keep] - (self.labels[keep] > label)
+        self.classes.pop(label)
+        self.texts.pop(name, None)
+        self._index()
+
+    # ---------- Files ----------
+    @classmethod
+    def from_dataset(cls, data_dir=DATA_DIR, labels_map=None):
+        labels_map = labels_map or detect_labels(data_dir)
+        X, y, files = load_dataset(labels_map, data_dir, return_files=True)
+        scale = np.maximum(X.reshape(-1, NUM_FEATURES).std(axis=0), MIN_SCALE) if len(X) else np.ones(NUM_FEATURES)
+        return cls(X, y, [labels_map[i] for i in range(len(labels_map))], scale, files=files)
+
+    def save(self, path=TEMPLATES_PATH):
+        meta = {"classes": self.classes, "texts": self.texts, "files": self.files,
+                "temperature": self.temperature, "preprocessing_version": PREPROCESSING_VERSION}
+        buffer = io.BytesIO()
+        np.savez(buffer, templates=self.templates, labels=self.labels, scale=self.scale,
+                 meta=np.frombuffer(json.dumps(meta, ensure_ascii=False).encode("utf-8"), dtype=np.uint8))
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp, path)  # Server ที่กำลังอ่านอยู่ไม่เห็นไฟล์ครึ่งๆ กลางๆ
+
+    @classmethod
+    def load(cls, path=TEMPLATES_PATH):
+        with np.load(path) as data:
+            meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+            if meta["preprocessing_version"] != PREPROCESSING_VERSION:
+                raise ValueError(f"{path} was built with preprocessing v{meta['preprocessing_version']}, "
+                                 f"code is v{PREPROCESSING_VERSION} (rebuild it)")
+            return cls(data["templates"], data["labels"], meta["classes"], data["scale"],
+                       meta["texts"], meta["files"], meta["temperature"])
+
+def load_takes(paths):
+    """Resampled takes (k, 70, 22) + their paths from take files and/or folders."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = take_files(path)
+            files += [found[stem] for stem in sorted(found)]
+        else:
+            files.append(path)
+    takes, used = [], []
+    for path in files:
+        resampled = fast_resample(read_any(path))
+        if resampled is not None:
+            takes.append(resampled)
+            used.append(path)
+    return np.array(takes, dtype=np.float32).reshape(-1, EXPECTED_FRAMES, NUM_FEATURES), used
+
+# ======================================================
+# 4. Evaluation
+# ======================================================
+def evaluate(store, limit=None, seed=0):
+    """Leave-one-out 1-NN accuracy and per-query search time over (a sample of) the store's own templates."""
+    idx = np.random.default_rng(seed).permutation(len(store.labels))[:limit]
+    correct, times = 0, []
+    for i in idx:
+        start = time.perf_counter()
+        dist = store.search(store.series[i], skip=i)
+        times.append((time.perf_counter() - start) * 1000)
+        correct += int(np.argmin(dist) == store.labels[i])
+    return correct / max(len(idx), 1), np.array(times)
+
+# ======================================================
+# 5. CLI
+# ======================================================
+def main():
+    parser = argparse.ArgumentParser(description="DTW template store for few-shot gestures")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="create the store from every take in the dataset")
+    build.add_argument("--data-dir", default=DATA_DIR)
+    enroll = sub.add_parser("enroll", help="add a gesture (or more takes of one) from take files / folders")
+    enroll.add_argument("gesture")
+    enroll.add_argument("paths", nargs="+")
+    enroll.add_argument("--text", help="text to speak for this gesture")
+    remove = sub.add_parser("remove", help="drop a gesture from the store")
+    remove.add_argument("gesture")
+    info = sub.add_parser("info")
+    evaluate_cmd = sub.add_parser("eval", help="leave-one-out accuracy and search time")
+    evaluate_cmd.add_argument("--limit", type=int, default=500)
+    for p in (build, enroll, remove, info, evaluate_cmd):
+        p.add_argument("--store", default=TEMPLATES_PATH)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        if not os.path.isdir(args.data_dir):
+            print(f"[!] ไม่พบโฟลเดอร์ {args.data_dir} ครับ")
+            return
+        start = time.perf_counter()
+        store = TemplateStore.from_dataset(args.data_dir)
+        store.save(args.store)
+        print(f"[DONE] {len(store.labels)} templates, {len(store.classes)} gestures -> '{args.store}' "
+              f"({time.perf_counter() - start:.1f} s, temperature {store.temperature:.3g})")
+        return
+
+    if not os.path.exists(args.store):
+        print(f"[!] ไม่พบ {args.store} (สร้างด้วย 'python dtw_templates.py build' ก่อน) ครับ")
+        return
+    store = TemplateStore.load(args.store)
+
+    if args.command == "enroll":
+        missing = [p for p in args.paths if not os.path.exists(p)]
+        if missing:
+            print(f"[!] ไม่พบ {', '.join(missing)} ครับ")
+            return
+        takes, used = load_takes(args.paths)
+        if len(takes) == 0:
+            print("[!] ไม่มี Take ที่ใช้ได้เลยครับ")
+            return
+        new = args.gesture not in store.classes
+        store.enroll(args.gesture, takes, text=args.text, files=used)
+        store.save(args.store)
+        print(f"[ENROLL] {'new gesture' if new else 'added to'} '{args.gesture}': {len(takes)} takes "
+              f"(store: {len(store.labels)} templates, {len(store.classes)} gestures)")
+    elif args.command == "remove":
+        if args.gesture not in store.classes:
+            print(f"[!] ไม่มีท่า '{args.gesture}' ใน Store ครับ")
+            return
+        store.remove(args.gesture)
+        store.save(args.store)
+        print(f"[REMOVE] '{args.gesture}' (store: {len(store.labels)} templates, {len(store.classes)} gestures)")
+    elif args.command == "info":
+        counts = np.bincount(store.labels, minlength=len(store.classes))
+        print(f"--- {args.store}: {len(store.labels)} templates, temperature {store.temperature:.3g} ---")
+        for i, name in enumerate(store.classes):
+            text = f" ({store.texts[name]})" if name in store.texts else ""
+            print(f"   [{i}] {name}{text}: {counts[i]}")
+    else:
+        accuracy, times = evaluate(store, args.limit)
+        print(f"[EVAL] leave-one-out 1-NN accuracy {accuracy * 100:.1f}% over {len(times)} templates "
+              f"| search p50 {np.percentile(times, 50):.2f} ms / p95 {np.percentile(times, 95):.2f} ms "
+              f"({len(store.labels)} templates)")
+
+if __name__ == "__main__":
+    main()
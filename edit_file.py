@@ -1,68 +1,22 @@
-import os
+import sys
 
-# ระบุโฟลเดอร์หลัก (ถ้าของคุณใช้ "data" ให้แก้ตรงนี้นะครับ ในโค้ดเดิมเห็นใช้ "dataset")
-DATA_DIR = "dataset" 
+from gesture_utils import DATA_DIR
+from resequence import Journal, resequence
 
-def rename_files_per_user():
-    if not os.path.exists(DATA_DIR):
-        print(f"[!] ไม่พบโฟลเดอร์ '{DATA_DIR}' ครับ ลองเช็คชื่อโฟลเดอร์ดูอีกทีนะ")
-        return
+# เดิมไฟล์นี้ rename สองรอบทุกไฟล์และเรียงตามชื่อไฟล์ ตอนนี้ใช้ resequence.py แทน
+# (สแกนครั้งเดียว มี Journal ให้ทำต่อ/ย้อนกลับได้ และอัปเดต Take Index ไปด้วย)
+# ใช้ python resequence.py --help สำหรับตัวเลือกเพิ่มเติม (--dry-run, --order mtime, --rollback)
 
-    # ลูปเข้าไปในแต่ละโฟลเดอร์ท่าทาง (เช่น hello, stop)
-    for gesture in os.listdir(DATA_DIR):
-        gesture_path = os.path.join(DATA_DIR, gesture)
-        
-        # ข้ามถ้าไม่ใช่โฟลเดอร์
-        if not os.path.isdir(gesture_path):
-            continue
-            
-        print(f"\n[📂] กำลังจัดระเบียบโฟลเดอร์: {gesture}")
-        
-        # ดึงรายชื่อไฟล์ csv ทั้งหมด และเรียงตามตัวอักษรเพื่อรักษาลำดับเวลาเดิมไว้
-        files = [f for f in os.listdir(gesture_path) if f.endswith('.csv')]
-        files.sort() 
-        
-        user_counts = {}
-        rename_map = []
-        
-        # --- PASS 1: คำนวณชื่อใหม่และเปลี่ยนชื่อเป็นนามสกุลชั่วคราว (.tmp) ---
-        # (วิธีนี้ช่วยป้องกันปัญหาชื่อไฟล์ใหม่ไปทับกับชื่อไฟล์เก่าที่มีอยู่แล้ว)
-        for old_name in files:
-            # แยกชิ้นส่วนชื่อไฟล์ (สมมติ: jack_hello_190226_031.csv)
-            parts = old_name.replace('.csv', '').split('_')
-            
-            if len(parts) >= 4:
-                seq_str = parts[-1]       # 031
-                date_str = parts[-2]      # 190226
-                gest = parts[-3]          # hello
-                user_name = "_".join(parts[:-3]) # jack (รองรับกรณีชื่อคนมี _ ด้วย)
-                
-                # นับจำนวนไฟล์ของคนนี้
-                user_counts[user_name] = user_counts.get(user_name, 0) + 1
-                new_seq = user_counts[user_name]
-                
-                # สร้างชื่อใหม่
-                new_name = f"{user_name}_{gest}_{date_str}_{new_seq:03d}.csv"
-                temp_name = f"{old_name}.tmp"
-                
-                old_path = os.path.join(gesture_path, old_name)
-                temp_path = os.path.join(gesture_path, temp_name)
-                new_path = os.path.join(gesture_path, new_name)
-                
-                # เปลี่ยนเป็น .tmp ก่อน
-                os.rename(old_path, temp_path)
-                rename_map.append((temp_path, new_path, old_name, new_name))
-        
-        # --- PASS 2: เปลี่ยนจาก .tmp เป็น .csv ด้วยชื่อใหม่ที่ถูกต้อง ---
-        for temp_path, new_path, old_name, new_name in rename_map:
-            os.rename(temp_path, new_path)
-            
-            if old_name != new_name:
-                print(f"  [RENAME] {old_name}  ->  {new_name}")
-            else:
-                print(f"  [SKIP]   {old_name} (ชื่อถูกต้องอยู่แล้ว)")
+def rename_files_per_user(data_dir=DATA_DIR):
+    if Journal(data_dir).exists():
+        print("[!] พบงานที่ค้างอยู่ ใช้ python resequence.py --resume หรือ --rollback ก่อนครับ")
+        return
+    summary = resequence(data_dir)
+    for gesture, old_name, new_name in summary["moves"]:
+        print(f"  [RENAME] {gesture}/{old_name}  ->  {new_name}")
+    print(f"\n{summary['renames']} renames over {summary['takes']} takes")
 
 if __name__ == "__main__":
     print("=== เริ่มกระบวนการเปลี่ยนชื่อไฟล์ (Reset Sequence) ===")
-    rename_files_per_user()
-    print("\n[✔] เสร็จสิ้นการเปลี่ยนชื่อไฟล์ทั้งหมดแล้วครับ!")
\ No newline at end of file
+    rename_files_per_user(sys.argv[1] if len(sys.argv) > 1 else DATA_DIR)
+    print("\n[✔] เสร็จสิ้นการเปลี่ยนชื่อไฟล์ทั้งหมดแล้วครับ!")
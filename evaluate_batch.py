@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from sklearn.metrics import confusion_matrix, precision_recall_fscore_support
+
+from gesture_utils import DATA_DIR, LABELS_FILE, EXPECTED_FRAMES, NUM_FEATURES, load_labels_map, read_take, fast_resample, parse_take_name
+from gesture_backends import BACKEND_NAMES, load_backend, load_calibrated_backend
+from model_bundle import load_bundle
+from take_catalog import CATALOG_FILE, TakeCatalog
+
+# ======================================================
+# 1. Configuration
+# ======================================================
+# ใช้แทน test_model.py: วัดผลทั้งโฟลเดอร์/ทั้ง Label ทีเดียว ไม่ต้องสุ่มทีละไฟล์
+BACKEND = "ensemble"
+BATCH_SIZE = 1024
+LATENCY_SAMPLES = 200     # จำนวน Take ที่วัด Latency แบบทีละท่า (เหมือน Inference Server)
+OUTPUT_FILE = "batch_eval_results.json"
+
+# ======================================================
+# 2. Sources
+# ======================================================
+def collect_takes(root, labels=None, users=None):
+    """
+    (path, gesture) for every CSV under root. root can be a dataset folder (root/<gesture>/*.csv)
+    or a single gesture folder (its name is the gesture).
+    """
+    gesture_dirs = [d for d in sorted(os.listdir(root)) if os.path.isdir(os.path.join(root, d)) and not d.startswith(("_", "."))]
+    if not gesture_dirs:
+        gesture_dirs, root = [os.path.basename(os.path.normpath(root))], os.path.dirname(os.path.normpath(root))
+    takes = []
+    for gesture in gesture_dirs:
+        if labels and gesture not in labels:
+            continue
+        folder = os.path.join(root, gesture)
+        for file in sorted(os.listdir(folder)):
+            if not file.endswith(".csv"):
+                continue
+            if users:
+                parsed = parse_take_name(file, gesture)
+                if parsed is None or parsed[0] not in users:
+                    continue
+            takes.append((os.path.join(folder, file), gesture))
+    return takes
+
+def catalog_takes(root, labels=None, users=None, since=None, until=None, min_frames=None):
+    """Same as collect_takes, but filtered by the dataset catalog (date range / length) instead of listing folders."""
+    catalog = TakeCatalog(root)
+    try:
+        rows = catalog.query(gestures=labels, users=users, since=since, until=until, min_frames=min_frames)
+    finally:
+        catalog.close()
+    return [(os.path.join(root, *r["path"].split("/")), r["gesture"]) for r in rows]
+
+def load_take(path):
+    return fast_resample(read_take(path), target=EXPECTED_FRAMES)
+
+def load_batch(takes, workers=None):
+    # งานส่วนใหญ่คือรอ Disk ใช้ Thread ก็พอ (ไม่ต้อง Pickle ข้อมูลข้าม Process)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        resampled = list(pool.map(load_take, [p for p, _ in takes], chunksize=256))
+    keep = [i for i, r in enumerate(resampled) if r is not None]
+    X = np.array([resampled[i] for i in keep], dtype=np.float32).reshape(-1, EXPECTED_FRAMES, NUM_FEATURES)
+    return X, keep
+
+# ======================================================
+# 3. Evaluation
+# ======================================================
+def predict_batched(backend, X, batch_size=BATCH_SIZE):
+    probs, stages = [], []
+    staged = hasattr(backend, "predict_staged")
+    for start in range(0, len(X), batch_size):
+        batch = X[start:start + batch_size]
+        if staged:
+            p, s = backend.predict_staged(batch)
+            stages.append(s)
+        else:
+            p = backend.predict_proba(batch)
+        probs.append(p)
+    probs = np.concatenate(probs) if probs else np.empty((0, 0))
+    return probs, (np.concatenate(stages) if stages else None)
+
+def latency_distribution(backend, X, samples=LATENCY_SAMPLES):
+    if len(X) == 0:
+        return {}
+    backend.predict_proba(X[:1])  # warm-up
+    idx = np.random.default_rng(42).choice(len(X), size=min(samples, len(X)), replace=False)
+    times = []
+    for i in idx:
+        start = time.perf_counter()
+        backend.predict_proba(X[i][np.newaxis])
+        times.append((time.perf_counter() - start) * 1000)
+    times = np.array(times)
+    return {"samples": len(times), "mean_ms": float(times.mean()),
+            **{f"p{q}_ms": float(np.percentile(times, q)) for q in (50, 90, 99)}, "max_ms": float(times.max())}
+
+def evaluate(backend, labels_map, takes, batch_size=BATCH_SIZE, latency_samples=LATENCY_SAMPLES, workers=None):
+    inv_labels_map = {v: k for k, v in labels_map.items()}
+    known = [t for t in takes if t[1] in inv_labels_map]
+    unknown = sorted({g for _, g in takes if g not in inv_labels_map})
+
+    start = time.perf_counter()
+    X, keep = load_batch(known, workers)
+    known = [known[i] for i in keep]
+    load_s = time.perf_counter() - start
+    y = np.array([inv_labels_map[g] for _, g in known], dtype=np.int64)
+    skipped = {"unknown_labels": unknown, "unreadable": len(takes) - len(known) - sum(g in unknown for _, g in takes)}
+    if len(y) == 0:
+        # ไม่มี Take ที่ใช้ได้เลย (Label ไม่ตรงโมเดล / อ่านไม่ได้ทั้งหมด) ไม่มีอะไรให้วัด
+        return {"takes": 0, "skipped": skipped}
+
+    start = time.perf_counter()
+    probs, stages = predict_batched(backend, X, batch_size)
+    predict_s = time.perf_counter() - start
+    pred = probs.argmax(axis=1)
+
+    classes = sorted(labels_map)
+    precision, recall, f1, support = precision_recall_fscore_support(y, pred, labels=classes, zero_division=0)
+    result = {
+        "takes": len(known),
+        "skipped": skipped,
+        "accuracy": float(np.mean(pred == y)),
+        "mean_confidence": float(probs.max(axis=1).mean()),
+        "throughput": {"load_s": load_s, "predict_s": predict_s, "batch_size": batch_size,
+                       "gestures_per_sec": len(X) / predict_s if predict_s > 0 else 0.0,
+                       "end_to_end_gestures_per_sec": len(X) / (load_s + predict_s) if load_s + predict_s > 0 else 0.0},
+        "latency": latency_distribution(backend, X, latency_samples),
+        "per_class": {labels_map[c]: {"precision": float(precision[i]), "recall": float(recall[i]),
+                                      "f1": float(f1[i]), "support": int(support[i])}
+                      for i, c in enumerate(classes) if support[i] > 0 or np.any(pred == c)},
+        "confusion_matrix": {"labels": [labels_map[c] for c in classes],
+                             "matrix": confusion_matrix(y, pred, labels=classes).tolist()},
+        "errors": [{"file": path, "actual": g, "predicted": labels_map[int(p)], "confidence": float(probs[i, p])}
+                   for i, ((path, g), p) in enumerate(zip(known, pred)) if inv_labels_map[g] != p],
+    }
+    if stages is not None:
+        result["stages"] = {name: float(np.mean(stages == i)) for i, name in enumerate(backend.stage_names)}
+    return result
+
+# ======================================================
+# 4. CLI
+# ======================================================
+def main():
+    parser = argparse.ArgumentParser(description="Score a whole dataset / folder / label slice with any backend")
+    parser.add_argument("path", nargs="?", default=DATA_DIR, help="dataset folder or a single gesture folder")
+    parser.add_argument("--backend", default=BACKEND, choices=BACKEND_NAMES)
+    parser.add_argument("--bundle", nargs="?", const="", help="load models from a model bundle (latest if no path)")
+    parser.add_argument("--labels-file", default=LABELS_FILE)
+    parser.add_argument("--labels", nargs="+", help="only these gestures")
+    parser.add_argument("--users", nargs="+", help="only takes recorded by these users")
+    parser.add_argument("--since", help="only takes recorded on/after yyyy-mm-dd (uses the dataset catalog)")
+    parser.add_argument("--until", help="only takes recorded on/before yyyy-mm-dd (uses the dataset catalog)")
+    parser.add_argument("--min-frames", type=int, help="only takes with at least this many raw frames (uses the dataset catalog)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--latency-samples", type=int, default=LATENCY_SAMPLES)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"[!] ไม่พบโฟลเดอร์ {args.path} ครับ")
+        return
+
+    start = time.perf_counter()
+    if args.bundle is not None:
+        bundle = load_bundle(args.bundle or None)
+        labels_map = bundle.labels_map
+        backend = bundle.load_backend(args.backend)
+        source = f"bundle v{bundle.version}"
+    else:
+        # dtw ใช้ Label จาก Template Store ไม่ต้องมี labels_map.json
+        if args.backend != "dtw" and not os.path.exists(args.labels_file):
+            print(f"[!] ไม่พบไฟล์ {args.labels_file} กรุณารันโค้ดเทรนก่อนครับ")
+            return
+        labels_map = load_labels_map(args.labels_file) if os.path.exists(args.labels_file) else {}
+        backend = load_calibrated_backend(labels_map) if args.backend == "calibrated" else load_backend(args.backend, labels_map)
+        labels_map = getattr(backend, "labels_map", labels_map)
+        source = "model files"
+    print(f"--- {args.backend} loaded from {source} in {(time.perf_counter()-start)*1000:.0f} ms ---")
+
+    if args.since or args.until or args.min_frames:
+        if not os.path.exists(os.path.join(args.path, CATALOG_FILE)):
+            print(f"[!] ไม่พบ Catalog ใน {args.path} กรุณารัน python take_catalog.py rescan ก่อนครับ")
+            return
+        takes = catalog_takes(args.path, args.labels, args.users, args.since, args.until, args.min_frames)
+    else:
+        takes = collect_takes(args.path, args.labels, args.users)
+    if not takes:
+        print("[!] ไม่พบไฟล์ .csv ที่ตรงเงื่อนไขครับ")
+        return
+
+    result = evaluate(backend, labels_map, takes, args.batch_size, args.latency_samples, args.workers)
+    result = {"backend": args.backend, "source": source, "path": args.path, **result}
+    if result["takes"] == 0:
+        skipped = result["skipped"]
+        print(f"[!] ไม่มี Take ที่ประเมินได้ครับ (Label ที่โมเดลไม่รู้จัก: {', '.join(skipped['unknown_labels']) or '-'}, "
+              f"อ่านไม่ได้ {skipped['unreadable']} ไฟล์)")
+        return
+
+    t, lat = result["throughput"], result["latency"]
+    print(f"\n=== {result['takes']} takes | accuracy {result['accuracy']*100:.2f}% | mean confidence {result['mean_confidence']*100:.1f}% ===")
+    print(f" Load     : {t['load_s']:.2f} s | Predict: {t['predict_s']:.2f} s ({t['gestures_per_sec']:.0f} gestures/s batched)")
+    if lat:
+        print(f" Latency  : p50 {lat['p50_ms']:.2f} ms | p90 {lat['p90_ms']:.2f} ms | p99 {lat['p99_ms']:.2f} ms (single gesture)")
+    if "stages" in result:
+        print(" Stages   : " + " | ".join(f"{k} {v*100:.1f}%" for k, v in result["stages"].items()))
+    if result["skipped"]["unknown_labels"]:
+        print(f" Skipped  : labels not in the model: {', '.join(result['skipped']['unknown_labels'])}")
+    print(f"\n {'LABEL':14s} {'PREC':>7s} {'REC':>7s} {'F1':>7s} {'N':>6s}")
+    for name, m in result["per_class"].items():
+        print(f" {name:14s} {m['precision']*100:6.1f}% {m['recall']*100:6.1f}% {m['f1']*100:6.1f}% {m['support']:6d}")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=4)
+    print(f"\n[DONE] Results saved as '{args.output}' ({len(result['errors'])} misclassified takes listed)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from torch.utils.data import DataLoader, TensorDataset
+import xgboost as xgb
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import GroupKFold, LeaveOneGroupOut, train_test_split
+
+from gesture_utils import DATA_DIR, detect_labels, load_dataset, parse_take_name, zero_start, extract_advanced_features
+from gesture_backends import CNNLSTM, GestureStudent, CNNLSTMBackend, XGBBackend, RFBackend, StudentBackend
+
+# ======================================================
+# 1. Configuration
+# ======================================================
+# วัดผลแบบแยกผู้ใช้: ผู้ใช้ที่อยู่ใน Test ห้ามมี Take อยู่ใน Train เลย (เหมือนคนใส่ถุงมือคนใหม่)
+MODELS = ["xgb", "rf"]       # เพิ่ม "student", "cnnlstm" ได้ (ช้ากว่ามาก)
+EPOCHS = 30                  # สำหรับโมเดล PyTorch (ไม่มีการเลือก Epoch จาก Test เพราะจะรั่ว)
+RESULTS_FILE = "subject_eval_results.json"
+LATENCY_RUNS = 50
+
+# ======================================================
+# 2. Metadata Index
+# ======================================================
+def build_metadata(files, labels):
+    """One row per loaded take: user / gesture / date / seq parsed from '{name}_{gesture}_{date}_{seq}.csv'."""
+    rows = []
+    for path, label in zip(files, labels):
+        gesture, filename = os.path.split(path)
+        parsed = parse_take_name(filename, gesture)
+        user, date, seq = parsed if parsed else ("unknown", "", 0)
+        rows.append({"file": path, "user": user, "gesture": gesture, "date": date, "seq": seq, "label": int(label)})
+    return pd.DataFrame(rows)
+
+# ======================================================
+# 3. Per-fold Training (same hyper-parameters as the trainers)
+# ======================================================
+def expand_proba(probs, classes, num_classes):
+    # Fold ที่ Train ไม่มีบางคลาส: ใส่ความน่าจะเป็น 0 ให้คลาสนั้น
+    full = np.zeros((len(probs), num_classes), dtype=np.float64)
+    full[:, classes] = probs
+    return full
+
+class EncodedBackend:
+    """XGBoost needs labels 0..k-1, so folds missing a class train on re-encoded labels."""
+    def __init__(self, backend, classes, num_classes):
+        self.backend, self.classes, self.num_classes = backend, classes, num_classes
+
+    def predict_proba(self, batch):
+        return expand_proba(self.backend.predict_proba(batch), self.classes, self.num_classes)
+
+def train_torch(model, X, y, epochs):
+    loader = DataLoader(TensorDataset(torch.tensor(zero_start(X)), torch.tensor(y)), batch_size=32, shuffle=True)
+    optimizer = optim.Adam(model.parameters(), lr=0.001)
+    criterion = nn.CrossEntropyLoss()
+    for _ in range(epochs):
+        model.train()
+        for inputs, labels in loader:
+            optimizer.zero_grad()
+            criterion(model(inputs), labels).backward()
+            optimizer.step()
+    return model
+
+def fit_model(name, X, y, num_classes, epochs):
+    if name == "xgb":
+        classes = np.unique(y)
+        model = xgb.XGBClassifier(n_estimators=100, learning_rate=0.1, max_depth=6, objective='multi:softprob',
+                                  eval_metric='mlogloss', random_state=42, n_jobs=1)
+        model.fit(zero_start(X).reshape(len(X), -1), np.searchsorted(classes, y))
+        return EncodedBackend(XGBBackend.from_model(model), classes, num_classes)
+    if name == "rf":
+        model = RandomForestClassifier(n_estimators=200, criterion='gini', max_depth=15, min_samples_split=5,
+                                       min_samples_leaf=2, max_features='sqrt', random_state=42, n_jobs=1)
+        model.fit(extract_advanced_features(X), y)
+        return RFBackend.from_model(model, num_classes)
+    if name == "cnnlstm":
+        return CNNLSTMBackend.from_model(train_torch(CNNLSTM(num_classes), X, y, epochs))
+    if name == "student":
+        return StudentBackend.from_model(train_torch(GestureStudent(num_classes), X, y, epochs))
+    raise ValueError(f"Unknown model '{name}'")
+
+def single_latency_ms(backend, X):
+    backend.predict_proba(X[:1])  # warm-up
+    start = time.perf_counter()
+    for i in range(LATENCY_RUNS):
+        backend.predict_proba(X[i % len(X)][np.newaxis])
+    return (time.perf_counter() - start) / LATENCY_RUNS * 1000
+
+# ข้อมูลถูกส่งให้แต่ละ Worker ครั้งเดียวตอนเริ่ม (ไม่ต้อง Pickle ทุก Fold)
+_X, _y = None, None
+
+def _init_worker(X, y):
+    global _X, _y
+    _X, _y = X, y
+    torch.set_num_threads(1)
+
+def run_fold(fold, train_idx, test_idx, models, num_classes, epochs):
+    torch.manual_seed(42)
+    result = {"fold": fold, "test_idx": test_idx, "pred": {}, "latency_ms": {}, "train_s": {}}
+    for name in models:
+        start = time.perf_counter()
+        backend = fit_model(name, _X[train_idx], _y[train_idx], num_classes, epochs)
+        result["train_s"][name] = time.perf_counter() - start
+        result["pred"][name] = backend.predict_proba(_X[test_idx]).argmax(axis=1)
+        result["latency_ms"][name] = single_latency_ms(backend, _X[test_idx])
+    return result
+
+# ======================================================
+# 4. Evaluation
+# ======================================================
+def make_folds(meta, mode, n_folds):
+    groups = meta["user"].values
+    if mode == "loso":
+        splitter = LeaveOneGroupOut()
+    elif mode == "group-kfold":
+        splitter = GroupKFold(n_splits=min(n_folds, len(np.unique(groups))))
+    elif mode == "random":
+        # แบบเดิมของ Trainer ทุกตัว (Take ของคนเดียวกันอยู่ทั้ง Train และ Test) ไว้เทียบ
+        idx_train, idx_test = train_test_split(np.arange(len(meta)), test_size=0.3, random_state=42, stratify=meta["label"])
+        return [(idx_train, idx_test)]
+    else:
+        raise ValueError(f"Unknown mode '{mode}'")
+    return list(splitter.split(np.zeros(len(meta)), meta["label"], groups))
+
+def evaluate(X, y, meta, models, mode="loso", n_folds=5, epochs=EPOCHS, workers=None):
+    num_classes = int(y.max()) + 1
+    folds = make_folds(meta, mode, n_folds)
+    preds = {name: np.full(len(y), -1) for name in models}
+    fold_rows = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(X, y)) as pool:
+        jobs = [pool.submit(run_fold, i, tr, te, models, num_classes, epochs) for i, (tr, te) in enumerate(folds)]
+        for job in jobs:
+            r = job.result()
+            users = sorted(set(meta["user"].values[r["test_idx"]]))
+            for name in models:
+                preds[name][r["test_idx"]] = r["pred"][name]
+                acc = float(np.mean(r["pred"][name] == y[r["test_idx"]]))
+                fold_rows.append({"fold": r["fold"], "users": users, "model": name, "n": len(r["test_idx"]),
+                                  "accuracy": acc, "latency_ms": r["latency_ms"][name], "train_s": r["train_s"][name]})
+                print(f"   fold {r['fold']+1}/{len(folds)} [{', '.join(users)}] {name:8s}: {acc*100:6.2f}% "
+                      f"({len(r['test_idx'])} takes, {r['latency_ms'][name]:.2f} ms/gesture)")
+
+    evaluated = preds[models[0]] >= 0
+    per_user = []
+    for user, idx in meta[evaluated].groupby("user").groups.items():
+        row = {"user": user, "takes": len(idx)}
+        for name in models:
+            row[name] = float(np.mean(preds[name][idx] == y[idx]))
+        per_user.append(row)
+    fold_df = pd.DataFrame(fold_rows)
+    summary = {name: {
+        "accuracy": float(np.mean(preds[name][evaluated] == y[evaluated])),
+        "mean_user_accuracy": float(np.mean([r[name] for r in per_user])),
+        "worst_user_accuracy": float(np.min([r[name] for r in per_user])),
+        "latency_ms": float(fold_df[fold_df.model == name]["latency_ms"].mean()),
+    } for name in models}
+    return {"mode": mode, "folds": fold_rows, "per_user": per_user, "summary": summary}
+
+def print_report(result, models):
+    print(f"\n=== Per-user accuracy ({result['mode']}) ===")
+    table = pd.DataFrame(result["per_user"]).set_index("user")
+    print((table[models] * 100).round(2).assign(takes=table["takes"]).to_string())
+    print(f"\n=== Summary ({result['mode']}) ===")
+    for name, s in result["summary"].items():
+        print(f"   {name:8s}: overall {s['accuracy']*100:.2f}% | mean per user {s['mean_user_accuracy']*100:.2f}% "
+              f"| worst user {s['worst_user_accuracy']*100:.2f}% | {s['latency_ms']:.2f} ms/gesture")
+
+# ======================================================
+# 5. CLI
+# ======================================================
+def main():
+    parser = argparse.ArgumentParser(description="Leave-one-subject-out / grouped k-fold evaluation")
+    parser.add_argument("--mode", choices=["loso", "group-kfold"], default="loso")
+    parser.add_argument("--folds", type=int, default=5, help="for group-kfold")
+    parser.add_argument("--models", nargs="+", choices=["xgb", "rf", "student", "cnnlstm"], default=MODELS)
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--compare-random", action="store_true", help="also run the trainers' random take split")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--output", default=RESULTS_FILE)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.data_dir):
+        print(f"[!] ไม่พบโฟลเดอร์ {args.data_dir} กรุณาสร้างและใส่ข้อมูลก่อนครับ")
+        return
+
+    labels_map = detect_labels(args.data_dir)
+    X, y, files = load_dataset(labels_map, args.data_dir, return_files=True)
+    meta = build_metadata(files, y)
+    print(f"\n--- {len(meta)} takes | {meta['user'].nunique()} users | {meta['gesture'].nunique()} gestures ---")
+    print(meta.pivot_table(index="user", columns="gesture", values="file", aggfunc="count", fill_value=0).to_string())
+
+    if meta["user"].nunique() < 2:
+        print("[!] ต้องมีผู้ใช้อย่างน้อย 2 คนถึงจะแยก Train/Test ตามผู้ใช้ได้ครับ")
+        return
+
+    results = {"labels": {str(k): v for k, v in labels_map.items()}, "models": args.models}
+    runs = [args.mode] + (["random"] if args.compare_random else [])
+    for mode in runs:
+        print(f"\n--- Evaluating ({mode}) ---")
+        start = time.perf_counter()
+        result = evaluate(X, y, meta, args.models, mode, args.folds, args.epochs, args.workers)
+        result["seconds"] = time.perf_counter() - start
+        print_report(result, args.models)
+        results[mode] = result
+
+    if args.compare_random:
+        print("\n=== Subject split vs. random take split ===")
+        for name in args.models:
+            subj, rand = results[args.mode]["summary"][name]["accuracy"], results["random"]["summary"][name]["accuracy"]
+            print(f"   {name:8s}: {subj*100:.2f}% vs {rand*100:.2f}% (random split overstates by {(rand-subj)*100:.2f} pts)")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=4)
+    print(f"\n[DONE] Results saved as '{args.output}'")
+
+if __name__ == "__main__":
+    main()
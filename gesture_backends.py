@@ -0,0 +1,445 @@
+import os
+import json
+import hashlib
+import numpy as np
+import torch
+import torch.nn as nn
+import xgboost as xgb
+import joblib
+
+from gesture_utils import zero_start, extract_advanced_features
+from dtw_templates import TEMPLATES_PATH, TemplateStore
+
+# ======================================================
+# 1. Default Model Files
+# ======================================================
+PYTORCH_MODEL_PATH = "gesture_model_best_cnnlstm.pth"
+XGB_MODEL_PATH = "gesture_model_best_xgb.json"
+STUDENT_MODEL_PATH = "gesture_model_student.pth"
+RF_MODEL_PATH = "gesture_model_rf.pkl"
+CALIBRATION_PATH = "gesture_calibration.json"
+
+DEFAULT_PATHS = {
+    "cnnlstm": PYTORCH_MODEL_PATH,
+    "xgb": XGB_MODEL_PATH,
+    "student": STUDENT_MODEL_PATH,
+    "rf": RF_MODEL_PATH,
+    "calibration": CALIBRATION_PATH,
+    "dtw": TEMPLATES_PATH,
+}
+# ชื่อที่ load_backend() รู้จัก: โมเดลเดี่ยวทุกตัวใน DEFAULT_PATHS + Backend ที่ประกอบจากหลายไฟล์
+BACKEND_NAMES = [name for name in DEFAULT_PATHS if name != "calibration"] + ["ensemble", "calibrated"]
+
+# ======================================================
+# 2. Model Architectures (ต้องตรงกับตอนเทรน)
+# ======================================================
+class CNNLSTM(nn.Module):
+    def __init__(self, num_classes):
+        super(CNNLSTM, self).__init__()
+        self.conv1 = nn.Conv1d(in_channels=22, out_channels=64, kernel_size=3, padding=1)
+        self.bn1 = nn.BatchNorm1d(64)
+        self.pool1 = nn.MaxPool1d(2)
+
+        self.conv2 = nn.Conv1d(in_channels=64, out_channels=128, kernel_size=3, padding=1)
+        self.bn2 = nn.BatchNorm1d(128)
+        self.pool2 = nn.MaxPool1d(2)
+
+        self.relu = nn.ReLU()
+        self.dropout = nn.Dropout(0.3)
+        self.lstm = nn.LSTM(input_size=128, hidden_size=64, num_layers=2, batch_first=True, dropout=0.3)
+        self.fc = nn.Linear(64, num_classes)
+
+    def embed(self, x):
+        """Everything before the classifier head: (Batch, 70, 22) -> (Batch, 64)."""
+        x = x.permute(0, 2, 1) # (Batch, 22, 70)
+        x = self.pool1(self.relu(self.bn1(self.conv1(x))))
+        x = self.pool2(self.relu(self.bn2(self.conv2(x))))
+        x = x.permute(0, 2, 1) # (Batch, seq_len, features)
+        lstm_out, _ = self.lstm(x)
+        return lstm_out[:, -1, :]
+
+    def forward(self, x):
+        out = self.fc(self.dropout(self.embed(x)))
+        return out
+
+class GestureStudent(nn.Module):
+    """
+    Compact 1D-CNN distilled from the CNN-LSTM + XGBoost ensemble.
+    ~10x fewer parameters than CNNLSTM and no recurrent layer, so a single
+    gesture is one small conv pass instead of a conv + 2-layer LSTM + 2300 trees.
+    """
+    def __init__(self, num_classes, width=32):
+        super(GestureStudent, self).__init__()
+        self.conv1 = nn.Conv1d(in_channels=22, out_channels=width, kernel_size=5, padding=2)
+        self.bn1 = nn.BatchNorm1d(width)
+        self.pool1 = nn.MaxPool1d(2)
+
+        self.conv2 = nn.Conv1d(in_channels=width, out_channels=width * 2, kernel_size=3, padding=1)
+        self.bn2 = nn.BatchNorm1d(width * 2)
+
+        self.relu = nn.ReLU()
+        self.gap = nn.AdaptiveAvgPool1d(1)
+        self.fc = nn.Linear(width * 2, num_classes)
+
+    def forward(self, x):
+        x = x.permute(0, 2, 1) # (Batch, 22, 70)
+        x = self.pool1(self.relu(self.bn1(self.conv1(x))))
+        x = self.relu(self.bn2(self.conv2(x)))
+        x = self.gap(x).squeeze(-1)
+        return self.fc(x)
+
+# ======================================================
+# 3. Inference Backends
+# ======================================================
+# ทุก Backend รับ Batch ที่ Resample แล้ว (N, 70, 22) และคืนค่า Probability (N, num_classes)
+# mmap=True: อ่าน Weights ผ่าน Memory Map (ใช้ตอนโหลดจาก Model Bundle ให้ Server เปิดเร็วขึ้น)
+# ใช้ได้กับ PyTorch (torch.load mmap) และ RF (joblib mmap_mode) เท่านั้น; XGBoost แปลง JSON เป็นต้นไม้ของตัวเองเสมอ
+def load_state_dict_file(model_path, mmap=False):
+    return torch.load(model_path, map_location=torch.device('cpu'), mmap=mmap, weights_only=True)
+
+def load_xgb_file(model_path):
+    model = xgb.XGBClassifier()
+    model.load_model(model_path)
+    return model
+
+class CNNLSTMBackend:
+    name = "cnnlstm"
+
+    def __init__(self, num_classes, model_path=PYTORCH_MODEL_PATH, mmap=False):
+        self.model = CNNLSTM(num_classes=num_classes)
+        self.model.load_state_dict(load_state_dict_file(model_path, mmap))
+        self.model.eval()
+
+    @classmethod
+    def from_model(cls, model):
+        """Wraps an already trained CNNLSTM (e.g. a fold in evaluate_subjects.py)."""
+        backend = cls.__new__(cls)
+        backend.model = model.eval()
+        return backend
+
+    def predict_proba(self, batch):
+        tensor_3d = torch.tensor(zero_start(batch), dtype=torch.float32)
+        with torch.no_grad():
+            return torch.softmax(self.model(tensor_3d), dim=1).numpy()
+
+    def set_head(self, head_state):
+        """Swaps in a per-user classifier head (adapt_user.py); the base head is kept for reset_head()."""
+        if getattr(self, "base_head", None) is None:
+            self.base_head = {k: v.clone() for k, v in self.model.fc.state_dict().items()}
+        self.model.fc.load_state_dict(head_state)
+
+    def reset_head(self):
+        if getattr(self, "base_head", None) is not None:
+            self.model.fc.load_state_dict(self.base_head)
+
+class XGBBackend:
+    name = "xgb"
+
+    def __init__(self, model_path=XGB_MODEL_PATH, mmap=False):
+        # mmap ไม่มีผลกับ XGBoost (รับไว้ให้ Interface เหมือน Backend อื่น)
+        self.model = load_xgb_file(model_path)
+
+    @classmethod
+    def from_model(cls, model):
+        backend = cls.__new__(cls)
+        backend.model = model
+        return backend
+
+    def predict_proba(self, batch):
+        vectors_2d = zero_start(batch).reshape(len(batch), -1) # (N, 1540)
+        return self.model.predict_proba(vectors_2d)
+
+class FlatForest:
+    """
+    All trees of a fitted RandomForestClassifier packed into flat node arrays, so one
+    gesture walks every tree at once (one NumPy step per tree level) instead of
+    sklearn's per-tree Python loop, which dominates latency for single-gesture calls.
+    """
+    def __init__(self, forest, num_classes):
+        trees = [est.tree_ for est in forest.estimators_]
+        offsets = np.cumsum([0] + [t.node_count for t in trees[:-1]])
+        self.roots = offsets
+        self.left = np.concatenate([np.where(t.children_left >= 0, t.children_left + o, -1) for t, o in zip(trees, offsets)])
+        self.right = np.concatenate([np.where(t.children_right >= 0, t.children_right + o, -1) for t, o in zip(trees, offsets)])
+        self.feature = np.concatenate([np.maximum(t.feature, 0) for t in trees])
+        self.threshold = np.concatenate([t.threshold for t in trees])
+        self.depth = max(t.max_depth for t in trees)
+
+        # ค่าที่ Leaf -> สัดส่วนของแต่ละคลาส (เหมือน predict_proba ของแต่ละต้น)
+        value = np.concatenate([t.value[:, 0, :] for t in trees])
+        value = value / np.maximum(value.sum(axis=1, keepdims=True), 1e-12)
+        self.value = np.zeros((len(value), num_classes))
+        self.value[:, forest.classes_.astype(int)] = value
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy() # (N, n_trees)
+        rows = np.arange(len(X))[:, np.newaxis]
+        for _ in range(self.depth):
+            is_leaf = self.left[node] < 0
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(is_leaf, node, np.where(go_left, self.left[node], self.right[node]))
+        return self.value[node].mean(axis=1)
+
+class RFBackend:
+    """Random Forest on the 110 summary features (train_model_rf.py, no Zero-Starting)."""
+    name = "rf"
+
+    def __init__(self, model_path=RF_MODEL_PATH, num_classes=None, mmap=False):
+        self.model = joblib.load(model_path, mmap_mode='r' if mmap else None)
+        self.forest = FlatForest(self.model, num_classes or len(self.model.classes_))
+
+    @classmethod
+    def from_model(cls, model, num_classes=None):
+        backend = cls.__new__(cls)
+        backend.model = model
+        backend.forest = FlatForest(model, num_classes or len(model.classes_))
+        return backend
+
+    def predict_proba(self, batch):
+        return self.forest.predict_proba(extract_advanced_features(batch))
+
+class EnsembleBackend:
+    """Soft Voting: averages the probabilities of every member backend."""
+    name = "ensemble"
+
+    def __init__(self, members):
+        self.members = members
+
+    def predict_proba(self, batch):
+        return sum(m.predict_proba(batch) for m in self.members) / len(self.members)
+
+class StudentBackend:
+    name = "student"
+
+    def __init__(self, model_path=STUDENT_MODEL_PATH, mmap=False):
+        state_dict = load_state_dict_file(model_path, mmap)
+        # อ่านขนาดโมเดลจาก Weights เลย ไม่ต้องจำค่า width/num_classes แยก
+        num_classes, hidden = state_dict["fc.weight"].shape
+        self.model = GestureStudent(num_classes=num_classes, width=hidden // 2)
+        self.model.load_state_dict(state_dict)
+        self.model.eval()
+
+    @classmethod
+    def from_model(cls, model):
+        backend = cls.__new__(cls)
+        backend.model = model.eval()
+        return backend
+
+    def predict_proba(self, batch):
+        tensor_3d = torch.tensor(zero_start(batch), dtype=torch.float32)
+        with torch.no_grad():
+            return torch.softmax(self.model(tensor_3d), dim=1).numpy()
+
+class DTWBackend:
+    """
+    Nearest-neighbour DTW over the template store (dtw_templates.py); no training, so gestures
+    enrolled into the store file show up after refresh(). Classes come from the store (labels_map),
+    not from labels_map.json.
+    """
+    name = "dtw"
+
+    def __init__(self, model_path=TEMPLATES_PATH):
+        self.model_path = model_path
+        self.mtime = os.stat(model_path).st_mtime_ns
+        self.store = TemplateStore.load(model_path)
+
+    @property
+    def labels_map(self):
+        return self.store.labels_map
+
+    @property
+    def texts(self):
+        return self.store.texts
+
+    def refresh(self):
+        """Reloads the store if the file changed since it was loaded. Returns True when it did."""
+        mtime = os.stat(self.model_path).st_mtime_ns
+        if mtime == self.mtime:
+            return False
+        self.store, self.mtime = TemplateStore.load(self.model_path), mtime
+        return True
+
+    def predict_proba(self, batch):
+        return self.store.predict_proba(batch)
+
+def backbone_fingerprint(model):
+    """Hash of every CNNLSTM weight except the head: a per-user head only fits the backbone it was trained on."""
+    digest = hashlib.sha256()
+    for name, tensor in sorted(model.state_dict().items()):
+        if not name.startswith("fc."):
+            digest.update(name.encode("utf-8"))
+            digest.update(tensor.detach().cpu().numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+def iter_backends(backend):
+    """The backend and every backend nested in it (ensemble members, cascade stages, temperature wrappers)."""
+    yield backend
+    for child in getattr(backend, "members", []) + getattr(backend, "stages", []):
+        yield from iter_backends(child)
+    if hasattr(backend, "backend"):
+        yield from iter_backends(backend.backend)
+
+# ======================================================
+# 4. Calibration (Temperature Scaling, Stacking, Early Exit)
+# ======================================================
+def apply_temperature(probs, temperature):
+    # เทียบเท่า softmax(logits / T): log(p) ต่างจาก logits แค่ค่าคงที่ต่อแถว จึงใช้กับ XGBoost ได้ด้วย
+    logits = np.log(np.clip(probs, 1e-8, 1.0)) / temperature
+    logits -= logits.max(axis=1, keepdims=True)
+    scaled = np.exp(logits)
+    return scaled / scaled.sum(axis=1, keepdims=True)
+
+class TemperatureBackend:
+    def __init__(self, backend, temperature):
+        self.backend = backend
+        self.temperature = temperature
+        self.name = backend.name
+
+    def predict_proba(self, batch):
+        return apply_temperature(self.backend.predict_proba(batch), self.temperature)
+
+class WeightedEnsembleBackend:
+    """Stacked Soft Voting with learned weights (replaces the fixed 50:50 average)."""
+    name = "ensemble"
+
+    def __init__(self, members, weights):
+        self.members = members
+        self.weights = weights
+
+    def predict_proba(self, batch, known=None):
+        # known = Probability ของสมาชิกที่คำนวณไปแล้วใน Stage ก่อนหน้า (ไม่ต้องรันซ้ำ)
+        known = known or {}
+        return sum(w * (known[m.name] if m.name in known else m.predict_proba(batch))
+                   for m, w in zip(self.members, self.weights))
+
+class CascadeBackend:
+    """
+    Early-exit cascade: runs the stages in order and stops at the first stage whose
+    top-class probability reaches that stage's per-class exit threshold. The last
+    stage always answers. predict_staged() also returns the stage index per gesture.
+    """
+    name = "cascade"
+
+    def __init__(self, stages, exit_thresholds, class_thresholds=None):
+        self.stages = stages
+        self.stage_names = [stage.name for stage in stages]
+        self.exit_thresholds = exit_thresholds # one per-class array per stage except the last
+        self.class_thresholds = class_thresholds
+
+    def predict_staged(self, batch):
+        n = len(batch)
+        out = None
+        stage_of = np.full(n, len(self.stages) - 1)
+        pending = np.arange(n)
+        known = {}
+
+        for i, stage in enumerate(self.stages):
+            if isinstance(stage, WeightedEnsembleBackend):
+                probs = stage.predict_proba(batch[pending], known=known)
+            else:
+                probs = stage.predict_proba(batch[pending])
+                known[stage.name] = probs
+            if out is None:
+                out = np.zeros((n, probs.shape[1]))
+
+            if i == len(self.stages) - 1:
+                out[pending] = probs
+                break
+
+            idx = probs.argmax(axis=1)
+            exit_mask = probs[np.arange(len(idx)), idx] >= self.exit_thresholds[i][idx]
+            out[pending[exit_mask]] = probs[exit_mask]
+            stage_of[pending[exit_mask]] = i
+
+            pending = pending[~exit_mask]
+            known = {k: v[~exit_mask] for k, v in known.items()}
+            if len(pending) == 0:
+                break
+
+        return out, stage_of
+
+    def predict_proba(self, batch):
+        return self.predict_staged(batch)[0]
+
+def load_calibration(labels_map, calibration_path=CALIBRATION_PATH):
+    with open(calibration_path, "r", encoding="utf-8") as f:
+        calibration = json.load(f)
+    if {int(k): v for k, v in calibration["labels"].items()} != labels_map:
+        raise ValueError(f"{calibration_path} was fitted on a different label map")
+    return calibration
+
+def thresholds_array(values):
+    # JSON เก็บ "ไม่ให้ Exit" เป็น null -> แปลงเป็น inf
+    return np.array([np.inf if v is None else v for v in values], dtype=np.float64)
+
+def calibration_requires(calibration, cascade=True):
+    """Model files a calibrated backend loads: every ensemble member plus the cascade's first stage."""
+    names = list(calibration["models"])
+    if cascade and calibration.get("cascade"):
+        names.append(calibration["cascade"]["model"])
+    return names
+
+def resolve_paths(paths, strict=False):
+    # strict = ใช้เฉพาะไฟล์ที่ให้มา (เช่น Model Bundle) ห้ามหยิบไฟล์ที่วางอยู่ใน Working Directory มาเติม
+    return dict(paths or {}) if strict else {**DEFAULT_PATHS, **(paths or {})}
+
+def model_file(paths, name):
+    if name not in paths:
+        raise ValueError(f"No '{name}' model file given")
+    return paths[name]
+
+def load_calibrated_backend(labels_map, calibration_path=None, early_exit=True, cascade=True, paths=None, mmap=False,
+                            strict=False):
+    """
+    Builds the calibrated ensemble as a cascade:
+    [cheap first stage (e.g. rf)] -> [fastest ensemble member] -> [full stacked ensemble]
+    Each optional stage is only added when it is enabled and present in the calibration file.
+    With strict=True only the given paths are used (no fallback to DEFAULT_PATHS).
+    """
+    paths = resolve_paths(paths, strict)
+    calibration = load_calibration(labels_map, calibration_path or model_file(paths, "calibration"))
+    missing = [name for name in calibration_requires(calibration, cascade) if name not in paths]
+    if missing:
+        raise ValueError(f"Calibration uses {', '.join(missing)} but no model file was given for it")
+    members = {name: TemperatureBackend(load_backend(name, labels_map, paths, mmap, strict), calibration["temperatures"][name])
+               for name in calibration["models"]}
+    ensemble = WeightedEnsembleBackend([members[n] for n in calibration["models"]],
+                                       [calibration["weights"][n] for n in calibration["models"]])
+
+    stages, exit_thresholds = [], []
+    if cascade and calibration.get("cascade"):
+        stages.append(load_backend(calibration["cascade"]["model"], labels_map, paths, mmap, strict))
+        exit_thresholds.append(thresholds_array(calibration["cascade"]["thresholds"]))
+    if early_exit:
+        stages.append(members[calibration["early_exit"]["model"]])
+        exit_thresholds.append(thresholds_array(calibration["early_exit"]["thresholds"]))
+    stages.append(ensemble)
+
+    return CascadeBackend(stages, exit_thresholds, thresholds_array(calibration["class_thresholds"]))
+
+# ======================================================
+# 5. Backend Factory
+# ======================================================
+def load_backend(name, labels_map, paths=None, mmap=False, strict=False):
+    """
+    paths overrides DEFAULT_PATHS; with strict=True (model bundles, model_bundle.py) only the
+    given paths are used and a missing model raises ValueError instead of loading the loose file.
+    """
+    paths = resolve_paths(paths, strict)
+    if name == "cnnlstm":
+        return CNNLSTMBackend(num_classes=len(labels_map), model_path=model_file(paths, "cnnlstm"), mmap=mmap)
+    if name == "xgb":
+        return XGBBackend(model_path=model_file(paths, "xgb"), mmap=mmap)
+    if name == "ensemble":
+        return EnsembleBackend([load_backend("cnnlstm", labels_map, paths, mmap, strict),
+                                load_backend("xgb", labels_map, paths, mmap, strict)])
+    if name == "student":
+        return StudentBackend(model_path=model_file(paths, "student"), mmap=mmap)
+    if name == "rf":
+        return RFBackend(model_path=model_file(paths, "rf"), num_classes=len(labels_map), mmap=mmap)
+    if name == "calibrated":
+        return load_calibrated_backend(labels_map, paths=paths, mmap=mmap, strict=strict)
+    if name == "dtw":
+        return DTWBackend(model_path=model_file(paths, "dtw"))
+    raise ValueError(f"Unknown backend '{name}'")
@@ -0,0 +1,292 @@
+import os
+import re
+import json
+import zlib
+import struct
+import numpy as np
+import pandas as pd
+from scipy.interpolate import interp1d
+
+# ======================================================
+# 1. Configuration (ต้องตรงกับตอนเทรน)
+# ======================================================
+DATA_DIR = "dataset_cf"
+EXPECTED_FRAMES = 70
+NUM_FEATURES = 22
+LABELS_FILE = "labels_map.json"
+
+# โฟลเดอร์ที่ไม่ใช่ท่าทางจริง (เช่น test/sim ที่ใช้ลองถุงมือ) ห้ามเข้าไปอยู่ใน Label Map
+# ไม่งั้น Index ของทุกคลาสหลังจากนั้นจะเลื่อนหมด; โฟลเดอร์ที่ขึ้นต้นด้วย "_" หรือ "." ก็ข้ามเหมือนกัน
+EXCLUDED_LABELS = {"test", "sim"}
+
+# เพิ่มเลขนี้ทุกครั้งที่ขั้นตอน Preprocessing เปลี่ยน (Model Bundle จะเช็คว่าตรงกันก่อนโหลด)
+PREPROCESSING_VERSION = 2
+
+# ตัดช่วงนิ่งหัว/ท้าย Take (ก่อนเริ่มท่าและหลังจบท่า) ก่อน Resample ใช้เหมือนกันทั้งตอนเก็บ เทรน และ Inference
+TRIM_IDLE = True
+TRIM_FLEX_SCALE = 10.0   # |ΔFlex| เฉลี่ยต่อเฟรม ที่นับเป็น Energy 1 หน่วย
+TRIM_GYRO_SCALE = 20.0   # |Gyro - ค่ากลางของ Take| (dps) ที่นับเป็น Energy 1 หน่วย
+TRIM_RATIO = 0.2         # เฟรมที่ Energy ต่ำกว่า 20% ของช่วงที่ขยับ (percentile 95) = นิ่ง
+TRIM_MIN_ENERGY = 1.0    # Take ที่ไม่มีเฟรมไหนเกินนี้ = ไม่ตัดอะไรเลย
+TRIM_SMOOTH = 5          # เฉลี่ย Energy กี่เฟรม (กันเฟรมกระตุกเดี่ยวๆ)
+TRIM_MARGIN = 2          # เผื่อเฟรมก่อน/หลังช่วงที่ขยับ
+TRIM_MIN_FRAMES = 10     # ถ้าตัดแล้วเหลือน้อยกว่านี้ ใช้ทั้ง Take ตามเดิม
+
+# Take แบบ Binary (.gpk): int16 ที่คูณ Scale แล้ว (Flex เป็นจำนวนเต็ม, Accel/Gyro ทศนิยม 2 ตำแหน่งเหมือน Firmware)
+PACK_EXT = ".gpk"
+PACK_MAGIC = b"GPK1"
+PACK_SCALES = np.array(([1.0] * 5 + [100.0] * 6) * 2)
+
+COLUMNS = [f'L_F{i}' for i in range(1, 6)] + ['L_Ax', 'L_Ay', 'L_Az', 'L_Gx', 'L_Gy', 'L_Gz'] + \
+          [f'R_F{i}' for i in range(1, 6)] + ['R_Ax', 'R_Ay', 'R_Az', 'R_Gx', 'R_Gy', 'R_Gz']
+
+# ======================================================
+# 2. Labels Mapping
+# ======================================================
+def detect_labels(data_dir=DATA_DIR):
+    """ดึงชื่อโฟลเดอร์ท่าทางแล้วเรียงตามตัวอักษร (เหมือนในสคริปต์เทรนทุกตัว)"""
+    folder_names = [d for d in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, d))
+                    and d not in EXCLUDED_LABELS and not d.startswith(("_", "."))]
+    folder_names.sort()
+    return {i: name for i, name in enumerate(folder_names)}
+
+def parse_take_name(filename, gesture):
+    """'{name}_{gesture}_{mmddyy}_{seq}.csv' -> (name, mmddyy, seq), or None for other files."""
+    match = re.fullmatch(rf"(.+)_{re.escape(gesture)}_(\d{{6}})_(\d+)\.csv", filename)
+    if match is None:
+        return None
+    return match.group(1), match.group(2), int(match.group(3))
+
+def load_labels_map(path=LABELS_FILE):
+    # JSON เก็บ Key เป็น String เสมอ ต้องแปลงกลับเป็น int
+    with open(path, "r", encoding="utf-8") as f:
+        return {int(k): v for k, v in json.load(f).items()}
+
+# ======================================================
+# 3. Preprocessing
+# ======================================================
+def parse_frame_line(line):
+    """One serial frame line ('S v1 ... v22', 'v1 ... v22' or '... v22 E') -> 22 floats, or None."""
+    parts = [x for x in line.split() if x not in ("S", "E")]
+    if len(parts) != NUM_FEATURES:
+        return None
+    try:
+        return [float(x) for x in parts]
+    except ValueError:
+        return None
+
+FLEX_COLS = np.r_[0:5, 11:16]
+GYRO_COLS = np.r_[8:11, 19:22]
+
+def motion_energy(frames):
+    """
+    Per-frame motion energy (frames,) of a take (frames, 22), or (N, frames) for a batch:
+    mean |frame-to-frame flex change| plus mean |gyro - the take's median gyro| (bias removed),
+    each divided by its TRIM_*_SCALE, smoothed over TRIM_SMOOTH frames. One vectorized pass.
+    """
+    frames = np.asarray(frames, dtype=np.float64)
+    flex = frames[..., FLEX_COLS]
+    gyro = frames[..., GYRO_COLS]
+    flex_speed = np.zeros(frames.shape[:-1])
+    flex_speed[..., 1:] = np.abs(flex[..., 1:, :] - flex[..., :-1, :]).mean(axis=-1)
+    # ค่ากลางด้วย partition (เร็วกว่า np.median มากสำหรับ Take สั้นๆ)
+    bias = np.take(np.partition(gyro, gyro.shape[-2] // 2, axis=-2), [gyro.shape[-2] // 2], axis=-2)
+    rotation = np.abs(gyro - bias).mean(axis=-1)
+    energy = flex_speed / TRIM_FLEX_SCALE + rotation / TRIM_GYRO_SCALE
+    if TRIM_SMOOTH > 1:
+        # ค่าเฉลี่ยเคลื่อนที่จาก cumsum (หน้าต่างหดลงที่ขอบ Take)
+        n = energy.shape[-1]
+        csum = np.zeros(energy.shape[:-1] + (n + 1,))
+        np.cumsum(energy, axis=-1, out=csum[..., 1:])
+        lo = np.maximum(np.arange(n) - TRIM_SMOOTH // 2, 0)
+        hi = np.minimum(np.arange(n) + TRIM_SMOOTH - TRIM_SMOOTH // 2, n)
+        energy = (csum[..., hi] - csum[..., lo]) / (hi - lo)
+    return energy
+
+def idle_bounds(frames):
+    """(start, end) of the moving part of a take; (0, len) when it should not be trimmed."""
+    n = len(frames)
+    if n < TRIM_MIN_FRAMES:
+        return 0, n
+    energy = motion_energy(frames)
+    peak = np.partition(energy, int(0.95 * (n - 1)))[int(0.95 * (n - 1))]  # ~percentile 95
+    threshold = max(TRIM_MIN_ENERGY, TRIM_RATIO * peak)
+    active = np.flatnonzero(energy > threshold)
+    if len(active) == 0:
+        return 0, n
+    start, end = max(0, active[0] - TRIM_MARGIN), min(n, active[-1] + TRIM_MARGIN + 1)
+    if end - start < TRIM_MIN_FRAMES:
+        return 0, n
+    return int(start), int(end)
+
+def trim_idle(frames):
+    """Drops all-zero rows, then (with TRIM_IDLE) the idle lead-in and tail."""
+    frames = np.asarray(frames, dtype=np.float64)
+    frames = frames[~np.all(frames == 0, axis=1)]
+    if not TRIM_IDLE:
+        return frames
+    start, end = idle_bounds(frames)
+    return frames[start:end]
+
+def resample_gesture(data, target=EXPECTED_FRAMES):
+    non_zero_data = trim_idle(data)
+    current_len = non_zero_data.shape[0]
+    if current_len < 2:
+        return None
+    old_x = np.linspace(0, current_len - 1, num=current_len)
+    new_x = np.linspace(0, current_len - 1, num=target)
+    f = interp1d(old_x, non_zero_data, axis=0, kind='linear', fill_value="extrapolate")
+    return f(new_x)
+
+def fast_resample(frames, target=EXPECTED_FRAMES):
+    """Same result as resample_gesture (trim_idle, linear), without building an interp1d."""
+    return linear_resample(trim_idle(frames), target)
+
+def linear_resample(data, target=EXPECTED_FRAMES):
+    """Linear resampling of an already trimmed take to `target` frames (None when shorter than 2)."""
+    n = len(data)
+    if n < 2:
+        return None
+    pos = np.linspace(0, n - 1, num=target)
+    lo = np.minimum(pos.astype(np.int64), n - 2)
+    frac = (pos - lo)[:, np.newaxis]
+    return data[lo] * (1 - frac) + data[lo + 1] * frac
+
+def zero_start(resampled):
+    """Zero-Starting: works on a single take (70, 22) or a batch (N, 70, 22)."""
+    return resampled - resampled[..., :1, :]
+
+def extract_advanced_features(raw_data):
+    """
+    22 * 5 = 110 summary features (same order as train_model_rf.py).
+    Works on a single take (70, 22) or a batch (N, 70, 22) in one vectorized pass.
+    """
+    velocity = np.diff(raw_data, axis=-2)
+    return np.concatenate([
+        np.mean(velocity, axis=-2),
+        np.std(velocity, axis=-2),
+        np.mean(raw_data, axis=-2),
+        np.std(raw_data, axis=-2),
+        np.ptp(raw_data, axis=-2),
+    ], axis=-1)
+
+# ======================================================
+# 4. Dataset Loading
+# ======================================================
+def read_take(path):
+    """
+    Reads one take CSV as a float64 (frames, 22) array. Parses the numbers directly
+    (~7x faster than pandas for these small files); anything unusual such as empty
+    cells falls back to pandas.read_csv.
+    """
+    with open(path, "rb") as f:
+        body = f.read().split(b"\n", 1)[-1]
+    try:
+        values = np.array(body.replace(b",", b" ").split(), dtype=np.float64)
+    except ValueError:
+        values = None
+    if values is None or len(values) % NUM_FEATURES:
+        return pd.read_csv(path).values.astype(np.float64)
+    return values.reshape(-1, NUM_FEATURES)
+
+def take_files(folder):
+    """
+    {stem: path} of the takes in a folder, using the packed .gpk copy when it is at least as new
+    as the CSV (one listdir; a .gpk without a CSV counts too).
+    """
+    entries = {}
+    with os.scandir(folder) as it:
+        for e in it:
+            stem, ext = os.path.splitext(e.name)
+            if ext in (".csv", PACK_EXT) and e.is_file():
+                entries.setdefault(stem, {})[ext] = e
+    takes = {}
+    for stem, found in entries.items():
+        csv, packed = found.get(".csv"), found.get(PACK_EXT)
+        if packed is not None and (csv is None or packed.stat().st_mtime_ns >= csv.stat().st_mtime_ns):
+            takes[stem] = packed.path
+        elif csv is not None:
+            takes[stem] = csv.path
+    return takes
+
+def read_any(path):
+    """read_take for .csv, read_packed for .gpk."""
+    return read_packed(path) if path.endswith(PACK_EXT) else read_take(path)
+
+def load_dataset(labels_map, data_dir=DATA_DIR, target=EXPECTED_FRAMES, return_files=False, return_lengths=False):
+    """
+    Loads every take under data_dir/<label>/ and resamples it to `target` frames.
+    Returns the raw resampled tensor (N, target, 22) as float32 and the int64 labels;
+    each backend applies its own normalization (e.g. Zero-Starting) on top.
+    With return_files=True the "<label>/<file>.csv" path of every row is returned too.
+    With return_lengths=True the frame count of every take after trim_idle (before
+    resampling) is returned last, e.g. for the per-take time step of orientation.fuse.
+    Packed .gpk copies are read instead of the CSV when present (identical values).
+    """
+    inv_labels_map = {v: k for k, v in labels_map.items()}
+    jobs = []
+    for label_name in labels_map.values():
+        path = os.path.join(data_dir, label_name)
+        if not os.path.exists(path): continue
+        files = take_files(path)
+        print(f"   {label_name}: {len(files)} files")
+        jobs += [(label_name, stem, files[stem]) for stem in sorted(files)]
+
+    # จองผลลัพธ์ float32 ไว้ก่อนแล้วเติมทีละ Take (ไม่ต้องเก็บ List ของ float64 ทั้ง Dataset ไว้ใน RAM)
+    X = np.empty((len(jobs), target, NUM_FEATURES), dtype=np.float32)
+    y, loaded, lengths = [], [], []
+    for label_name, stem, file_path in jobs:
+        try:
+            trimmed = trim_idle(read_any(file_path))
+            resampled_data = linear_resample(trimmed, target=target)
+            if resampled_data is not None:
+                X[len(y)] = resampled_data
+                y.append(inv_labels_map[label_name])
+                loaded.append(os.path.join(label_name, stem + ".csv"))
+                lengths.append(len(trimmed))
+        except Exception as e:
+            print(f"      [ERROR] reading {os.path.basename(file_path)}: {e}")
+
+    result = (X[:len(y)], np.array(y, dtype=np.int64))
+    if return_files:
+        result += (loaded,)
+    if return_lengths:
+        result += (np.array(lengths, dtype=np.int64),)
+    return result
+
+# ======================================================
+# 5. Packed Takes (int16 + delta + zlib)
+# ======================================================
+def encode_packed(frames):
+    """
+    (frames, 22) -> .gpk bytes: header, then zlib of the per-channel frame-to-frame deltas of
+    round(value * scale) as int16, channel by channel. Raises ValueError if a value would not
+    come back exactly (more decimals than the firmware sends, or out of int16 range).
+    """
+    frames = np.asarray(frames, dtype=np.float64).reshape(-1, NUM_FEATURES)
+    q = np.rint(frames * PACK_SCALES)
+    if np.any(np.abs(q) > 32767) or not np.array_equal(q / PACK_SCALES, frames):
+        raise ValueError("take is not exactly representable as scaled int16")
+    q = q.astype(np.int16)
+    delta = np.empty_like(q)
+    delta[:1] = q[:1]
+    delta[1:] = q[1:] - q[:-1]  # ล้นได้ แต่ cumsum แบบ int16 ตอนถอดก็ล้นกลับเหมือนกันพอดี
+    header = struct.pack("<4sIHH", PACK_MAGIC, len(q), NUM_FEATURES, 0)
+    return header + zlib.compress(np.ascontiguousarray(delta.T).tobytes(), 6)
+
+def decode_packed_int16(data):
+    """.gpk bytes -> the scaled int16 (frames, 22) array (4x smaller than float64 in RAM)."""
+    magic, n, channels, _ = struct.unpack_from("<4sIHH", data)
+    if magic != PACK_MAGIC or channels != NUM_FEATURES:
+        raise ValueError("not a packed take")
+    delta = np.frombuffer(zlib.decompress(data[12:]), dtype=np.int16).reshape(channels, n).T
+    return np.cumsum(delta, axis=0, dtype=np.int16)
+
+def decode_packed(data, dtype=np.float64):
+    """.gpk bytes -> (frames, 22) values, bit-identical to reading the original CSV as float64."""
+    values = decode_packed_int16(data) / PACK_SCALES
+    return values if dtype == np.float64 else values.astype(dtype)
+
+def read_packed(path, dtype=np.float64):
+    with open(path, "rb") as f:
+        return decode_packed(f.read(), dtype)
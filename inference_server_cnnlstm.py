@@ -1,14 +1,14 @@
 import json
 import serial
-import pandas as pd
-import numpy as np
 import torch
 import torch.nn as nn
-from scipy.interpolate import interp1d
-import os
 from gtts import gTTS
 import pygame
 import io
+import numpy as np
+
+from gesture_utils import resample_gesture
+from model_bundle import BUNDLE_ROOT, BundleWatcher
 
 # ======================================================
 # 1. Configuration
@@ -18,6 +18,14 @@ BAUD_RATE = 115200
 MODEL_PATH = "gesture_model_cnnlstm.pth"  # เปลี่ยนเป็นไฟล์ PyTorch
 TARGET_FRAMES = 70  # ต้องตรงกับตอนเทรน
 
+# Hot Reload: วาง Model Bundle ใหม่ (python model_bundle.py build) ลง MODEL_BUNDLE_DIR ระหว่างที่ Server รันอยู่ได้เลย
+# โหลด + Warm-up โมเดล cnnlstm ของ Bundle ใน Thread แยก แล้วสลับเข้ามาตอนว่างระหว่างท่า (ใช้แทน MODEL_PATH)
+# Bundle ที่ไม่มี cnnlstm หรือโหลดไม่ผ่านจะถูกข้าม และใช้โมเดลเดิมต่อ
+MODEL_BUNDLE_DIR = BUNDLE_ROOT
+HOT_RELOAD = True
+RELOAD_POLL_SEC = 2.0
+BUNDLE_BACKEND = "cnnlstm"
+
 # ตารางแปลชื่อ Class เป็นภาษาไทย (เสียงพูด)
 TRANSLATION_DICT = {
     "come_here": "มา",
@@ -107,23 +115,23 @@ except Exception as e:
     print(f"Error loading model: {e}")
     exit()
 
+backend = None  # Backend จาก Model Bundle หลัง Hot Reload (None = ใช้ model จาก MODEL_PATH)
+
 # ======================================================
 # 4. Core Prediction Logic
 # ======================================================
 def resample_and_predict(data):
-    data_np = np.array(data)
-    current_len = data_np.shape[0]
-    
-    x_old = np.linspace(0, 1, current_len)
-    x_new = np.linspace(0, 1, TARGET_FRAMES)
-    
-    resampled_data = []
-    for col in range(22):
-        f = interp1d(x_old, data_np[:, col], kind='linear', fill_value="extrapolate")
-        resampled_data.append(f(x_new))
-    
-    resampled_np = np.array(resampled_data).T  # จะได้รูปทรง (70, 22)
+    # Resample ตัวเดียวกับตอนเทรน (gesture_utils: ตัดช่วงนิ่งหัว/ท้าย แล้ว Resample)
+    resampled_np = resample_gesture(data, target=TARGET_FRAMES)
+    if resampled_np is None:
+        return None, 0.0
     
+    if backend is not None:
+        # Backend ของ Bundle ทำ Zero-Starting + Softmax เองตามแบบที่โมเดลนั้นเทรนมา
+        probs = backend.predict_proba(np.asarray(resampled_np, dtype=np.float32)[np.newaxis])[0]
+        idx = int(np.argmax(probs))
+        return LABELS_MAP[idx], float(probs[idx])
+
     # [สำคัญมาก!] Zero-Starting: ล้างค่าเริ่มต้นให้ถุงมือเริ่มที่ 0
     normalized_np = resampled_np - resampled_np[0]
     
@@ -144,6 +152,16 @@ def resample_and_predict(data):
     
     return LABELS_MAP[idx], conf
 
+def swap_if_ready(watcher):
+    # เรียกจาก Serial Loop ตอนว่างระหว่างท่าเท่านั้น การสลับจึงเป็นแค่การเปลี่ยน Reference ไม่ชนกับการ Predict
+    global backend, LABELS_MAP
+    ready = watcher.take_ready()
+    if ready is None:
+        return
+    new_bundle, new_backend, load_ms = ready
+    backend, LABELS_MAP = new_backend, new_bundle.labels_map
+    print(f"\n[RELOAD] Now using bundle v{new_bundle.version} | load + warm-up {load_ms:.0f} ms (background)")
+
 # ======================================================
 # 5. Main Serial Loop
 # ======================================================
@@ -154,11 +172,20 @@ def main():
         print(f"--- Inference Server Ready on {SERIAL_PORT} ---")
         print("Waiting for gesture signal...")
 
+        watcher = None
+        if HOT_RELOAD:
+            # เวอร์ชันปัจจุบัน "" = Bundle ที่มีอยู่แล้วก็ถูกโหลดด้วย
+            watcher = BundleWatcher(MODEL_BUNDLE_DIR, BUNDLE_BACKEND, "", RELOAD_POLL_SEC).start()
+            print(f"[RELOAD] Watching '{MODEL_BUNDLE_DIR}' for new bundles")
+
         gesture_buffer = []
         is_collecting = False
 
         while True:
             line = ser.readline().decode('utf-8', errors='ignore').strip()
+            # สลับโมเดลเฉพาะตอนไม่ได้เก็บท่า (readline timeout 1 วิ จึงสลับได้แม้ไม่มีท่าเข้ามา)
+            if watcher is not None and not is_collecting:
+                swap_if_ready(watcher)
             if not line: continue
 
             if "START_SIGNAL" in line:
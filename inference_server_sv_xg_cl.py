@@ -1,27 +1,57 @@
-import json
+import os
 import serial
-import pandas as pd
+import time
+import argparse
 import numpy as np
-import torch
-import torch.nn as nn
-import xgboost as xgb
-from scipy.interpolate import interp1d
-import os
 from gtts import gTTS
 import pygame
 import io
+from collections import deque
+
+from gesture_utils import LABELS_FILE, EXPECTED_FRAMES, load_labels_map, resample_gesture, parse_frame_line
+from gesture_backends import CNNLSTMBackend, load_backend, load_calibrated_backend, iter_backends, backbone_fingerprint
+from adapt_user import head_path, load_head
+from sentence_decoder import BeamDecoder, USAGE_LOG, load_lm, lm_matrix, log_usage
+from profiling_hooks import ProfilingHooks
+from model_bundle import BUNDLE_ROOT, BundleWatcher, find_latest_bundle, load_bundle, warm_up
 
 # ======================================================
 # 1. Configuration
 # ======================================================
 SERIAL_PORT = "COM3"
 BAUD_RATE = 115200
-TARGET_FRAMES = 70  
+TARGET_FRAMES = EXPECTED_FRAMES
+
+# "ensemble" = CNN-LSTM + XGBoost (Soft Voting), "student" = โมเดลเล็กจาก train_model_distill.py
+# "calibrated" = Ensemble ที่ผ่าน calibrate_ensemble.py (Temperature, น้ำหนัก, Threshold ต่อคลาส, Early Exit)
+# "dtw" = เทียบกับ Template ด้วย DTW (dtw_templates.py) ไม่ต้องเทรน เพิ่มท่าใหม่ด้วย enroll ระหว่าง Server รันได้เลย
+# (ไฟล์โมเดลตั้งค่าไว้ใน gesture_backends.py)
+BACKEND = "ensemble"
+CONF_THRESHOLD = 0.45  # ใช้เมื่อ Backend ไม่มี Threshold ต่อคลาส
+
+# Cascade (เฉพาะ BACKEND = "calibrated"): RF ตอบทันทีถ้ามั่นใจพอ ที่เหลือส่งต่อ XGBoost -> Ensemble เต็ม
+CASCADE_MODE = True
+EARLY_EXIT = True
+
+# ถ้ามี Model Bundle (python model_bundle.py build) จะโหลดเวอร์ชันล่าสุดจากที่นี่แทนไฟล์โมเดลที่วางแยกกัน
+MODEL_BUNDLE_DIR = BUNDLE_ROOT
+
+# Hot Reload: วาง Bundle ใหม่ลง MODEL_BUNDLE_DIR ระหว่างที่ Server รันอยู่ได้เลย
+# โหลด + Warm-up ใน Thread แยก แล้วสลับเข้ามาตอนว่างระหว่างท่า; ถ้าโมเดลใหม่พังใน PROBATION_GESTURES ท่าแรกจะ Rollback
+HOT_RELOAD = True
+RELOAD_POLL_SEC = 2.0
+PROBATION_GESTURES = 3
+PROBE_GESTURES = 8  # จำนวนท่าล่าสุดที่ใช้ทดสอบโมเดลใหม่ก่อนสลับ
 
-# ชื่อไฟล์โมเดลทั้ง 2 ตัวที่ได้จากการเทรน
-PYTORCH_MODEL_PATH = "gesture_model_best_cnnlstm.pth"
-XGB_MODEL_PATH = "gesture_model_best_xgb.json"
-LABELS_FILE = "labels_map.json"
+# Sentence Mode (--sentence): เก็บ Probability ของทุกท่าแล้วถอดเป็นวลีด้วย Beam Search + Bigram (sentence_decoder.py)
+# พูดทั้งวลีครั้งเดียวเมื่อหยุดทำท่าเกิน SENTENCE_TIMEOUT วินาที
+SENTENCE_MODE = False
+SENTENCE_TIMEOUT = 2.5
+# บันทึกท่าที่ทายได้ลง USAGE_LOG ไว้สร้าง Bigram จากการใช้งานจริง (python sentence_decoder.py build)
+LOG_USAGE = True
+
+# Profiler / tracemalloc เปิดได้ระหว่างรัน: python profiling_hooks.py profile start (None = ปิด Control Socket)
+PROFILING_PORT = 50550
 
 TRANSLATION_DICT = {
     "come_here": "มา", "father": "พ่อ", "go": "ไป", "hello": "สวัสดี",
@@ -49,116 +79,310 @@ def speak_thai(text):
         print(f"Voice Error: {e}")
 
 # ======================================================
-# 3. Model Architecture & Load Weights
-# ======================================================
-class CNNLSTM(nn.Module):
-    def __init__(self, num_classes):
-        super(CNNLSTM, self).__init__()
-        self.conv1 = nn.Conv1d(in_channels=22, out_channels=64, kernel_size=3, padding=1)
-        self.bn1 = nn.BatchNorm1d(64)
-        self.pool1 = nn.MaxPool1d(2)
-        
-        self.conv2 = nn.Conv1d(in_channels=64, out_channels=128, kernel_size=3, padding=1)
-        self.bn2 = nn.BatchNorm1d(128)
-        self.pool2 = nn.MaxPool1d(2)
-        
-        self.relu = nn.ReLU()
-        self.dropout = nn.Dropout(0.3)
-        self.lstm = nn.LSTM(input_size=128, hidden_size=64, num_layers=2, batch_first=True, dropout=0.3)
-        self.fc = nn.Linear(64, num_classes)
-
-    def forward(self, x):
-        x = x.permute(0, 2, 1) 
-        x = self.pool1(self.relu(self.bn1(self.conv1(x))))
-        x = self.pool2(self.relu(self.bn2(self.conv2(x))))
-        x = x.permute(0, 2, 1)
-        lstm_out, _ = self.lstm(x)
-        out = self.fc(self.dropout(lstm_out[:, -1, :]))
-        return out
-
+# 3. Load Backend
+# ======================================================
 try:
-    with open(LABELS_FILE, "r", encoding="utf-8") as f:
-        loaded_labels = json.load(f)
-        LABELS_MAP = {int(k): v for k, v in loaded_labels.items()}
-        
-    # โหลด CNN-LSTM
-    cnn_model = CNNLSTM(num_classes=len(LABELS_MAP))
-    cnn_model.load_state_dict(torch.load(PYTORCH_MODEL_PATH, map_location=torch.device('cpu')))
-    cnn_model.eval()
-    
-    # โหลด XGBoost
-    xgb_model = xgb.XGBClassifier()
-    xgb_model.load_model(XGB_MODEL_PATH)
-    
-    print(f"--- Models Loaded Successfully ---")
-    print(f"[1] {PYTORCH_MODEL_PATH}")
-    print(f"[2] {XGB_MODEL_PATH}")
+    load_start = time.perf_counter()
+    # Template Store เป็นไฟล์เดียวที่แก้ได้ตลอด (enroll) ไม่ได้อยู่ใน Model Bundle
+    if BACKEND != "dtw" and find_latest_bundle(MODEL_BUNDLE_DIR):
+        # Bundle มี Label Map ของตัวเอง ไม่ต้องพึ่ง labels_map.json ที่อาจถูก Trainer ตัวอื่นเขียนทับ
+        bundle = load_bundle(root=MODEL_BUNDLE_DIR)
+        LABELS_MAP = bundle.labels_map
+        backend = bundle.load_backend(BACKEND, early_exit=EARLY_EXIT, cascade=CASCADE_MODE)
+        print(f"[Bundle] {bundle.path} (v{bundle.version})")
+    else:
+        bundle = None
+        LABELS_MAP = load_labels_map(LABELS_FILE)
+        if BACKEND == "calibrated":
+            backend = load_calibrated_backend(LABELS_MAP, early_exit=EARLY_EXIT, cascade=CASCADE_MODE)
+        else:
+            backend = load_backend(BACKEND, LABELS_MAP)
+        LABELS_MAP = getattr(backend, "labels_map", LABELS_MAP)
+    INV_LABELS_MAP = {v: k for k, v in LABELS_MAP.items()}
+    warm_up(backend, len(LABELS_MAP))
+
+    print(f"--- Models Loaded Successfully ({(time.perf_counter()-load_start)*1000:.0f} ms) ---")
+    print(f"[Backend] {BACKEND}" + (f" ({' -> '.join(backend.stage_names)})" if hasattr(backend, "stage_names") else ""))
 except Exception as e:
     print(f"Error loading models: {e}")
     exit()
 
 # ======================================================
-# 4. Core Prediction Logic (Ensemble)
+# 4. Core Prediction Logic
 # ======================================================
+class StageStats:
+    """Counts which cascade stage answered each gesture and the average latency."""
+    def __init__(self):
+        self.counts = {}
+        self.total_ms = 0.0
+        self.gestures = 0
+
+    def record(self, stage, latency_ms):
+        self.counts[stage] = self.counts.get(stage, 0) + 1
+        self.total_ms += latency_ms
+        self.gestures += 1
+
+    def summary(self):
+        if self.gestures == 0:
+            return "no gestures yet"
+        stages = " | ".join(f"{name} {count/self.gestures*100:.1f}%" for name, count in self.counts.items())
+        return f"{stages} | avg {self.total_ms/self.gestures:.2f} ms ({self.gestures} gestures)"
+
+stage_stats = StageStats()
+recent_gestures = deque(maxlen=PROBE_GESTURES)
+
 def resample_and_predict(data):
-    data_np = np.array(data)
-    current_len = data_np.shape[0]
-    
-    x_old = np.linspace(0, 1, current_len)
-    x_new = np.linspace(0, 1, TARGET_FRAMES)
-    
-    resampled_data = []
-    for col in range(22):
-        f = interp1d(x_old, data_np[:, col], kind='linear', fill_value="extrapolate")
-        resampled_data.append(f(x_new))
-    
-    resampled_np = np.array(resampled_data).T  # Shape: (70, 22)
-    
-    # ทำ Zero-Starting เพื่อให้ตรงกับตอนเทรน
-    normalized_np = resampled_np - resampled_np[0]
-    
-    # --------------------------------------------------
-    # ส่วนที่ 1: ดึงค่า Probability จาก CNN-LSTM
-    # --------------------------------------------------
-    tensor_3d = torch.tensor(normalized_np, dtype=torch.float32).unsqueeze(0) # Shape: (1, 70, 22)
-    with torch.no_grad():
-        cnn_out = cnn_model(tensor_3d)
-        cnn_probs = torch.softmax(cnn_out, dim=1)[0].numpy()
-        
-    # --------------------------------------------------
-    # ส่วนที่ 2: ดึงค่า Probability จาก XGBoost
-    # --------------------------------------------------
-    vector_2d = normalized_np.flatten().reshape(1, -1) # Shape: (1, 1540)
-    xgb_probs = xgb_model.predict_proba(vector_2d)[0]
-    
-    # --------------------------------------------------
-    # ส่วนที่ 3: ทำ Soft Voting Ensemble
-    # --------------------------------------------------
-    ensemble_probs = (cnn_probs + xgb_probs) / 2.0
-    
-    best_idx = np.argmax(ensemble_probs)
-    final_conf = ensemble_probs[best_idx]
-    
-    return LABELS_MAP[best_idx], final_conf
-
-# ======================================================
-# 5. Main Serial Loop
+    start = time.perf_counter()
+    resampled_np = resample_gesture(data, target=TARGET_FRAMES)  # Shape: (70, 22)
+    if resampled_np is None:
+        return None, 0.0, None, None
+    batch = resampled_np[np.newaxis].astype(np.float32)
+    recent_gestures.append(batch[0])
+
+    # Backend ทำ Zero-Starting เองให้ตรงกับตอนเทรน
+    if hasattr(backend, "predict_staged"):
+        probs, stage_of = backend.predict_staged(batch)
+        stage = backend.stage_names[stage_of[0]]
+    else:
+        probs = backend.predict_proba(batch)
+        stage = backend.name
+    probs = probs[0]
+    stage_stats.record(stage, (time.perf_counter() - start) * 1000)
+
+    best_idx = int(np.argmax(probs))
+    final_conf = probs[best_idx]
+
+    return LABELS_MAP[best_idx], final_conf, stage, probs
+
+def speak_threshold(label_en, stage):
+    # ด่านก่อนสุดท้ายของ Cascade จะ Exit ได้ก็ต่อเมื่อผ่าน Threshold ที่เข้มกว่าอยู่แล้ว
+    if hasattr(backend, "stage_names") and stage != backend.stage_names[-1]:
+        return 0.0
+    class_thresholds = getattr(backend, "class_thresholds", None)
+    if class_thresholds is None or label_en is None:
+        return CONF_THRESHOLD
+    return class_thresholds[INV_LABELS_MAP[label_en]]
+
+# ======================================================
+# 5. Hot Reload (Swap / Rollback)
+# ======================================================
+class ReloadState:
+    """Keeps the previous models for rollback and counts swaps, rollbacks and dropped gestures."""
+    def __init__(self):
+        self.previous = None
+        self.probation = 0
+        self.swaps = 0
+        self.rollbacks = 0
+        self.dropped = 0
+
+    def summary(self):
+        version = bundle.version if bundle is not None else "loose files"
+        return f"v{version} | swaps {self.swaps} | rollbacks {self.rollbacks} | dropped {self.dropped}"
+
+reload_state = ReloadState()
+
+def install_models(new_bundle, new_backend):
+    # สลับแค่ Reference ทั้งชุดในครั้งเดียว (เรียกจาก Serial Loop เท่านั้น จึงไม่ชนกับการ Predict)
+    global bundle, backend, LABELS_MAP, INV_LABELS_MAP, stage_stats
+    bundle, backend = new_bundle, new_backend
+    LABELS_MAP = new_bundle.labels_map
+    INV_LABELS_MAP = {v: k for k, v in LABELS_MAP.items()}
+    stage_stats = StageStats()
+
+def swap_if_ready(watcher):
+    ready = watcher.take_ready()
+    if ready is None:
+        return
+    new_bundle, new_backend, load_ms = ready
+    old_version = bundle.version if bundle is not None else "loose files"
+    start = time.perf_counter()
+    reload_state.previous = (bundle, backend, LABELS_MAP)
+    install_models(new_bundle, new_backend)
+    swap_ms = (time.perf_counter() - start) * 1000
+    if current_user is not None:
+        login(current_user)  # Head เดิมใช้ได้เฉพาะถ้า Backbone ของโมเดลใหม่ยังเหมือนเดิม
+    reload_state.probation = PROBATION_GESTURES
+    reload_state.swaps += 1
+    print(f"\n[RELOAD] v{old_version} -> v{new_bundle.version} | load + warm-up {load_ms:.0f} ms (background) "
+          f"| swap {swap_ms:.3f} ms | dropped gestures {reload_state.dropped}")
+
+def rollback(watcher, error):
+    global bundle, backend, LABELS_MAP, INV_LABELS_MAP, stage_stats
+    failed_version = bundle.version
+    watcher.reject(failed_version)
+    bundle, backend, LABELS_MAP = reload_state.previous
+    INV_LABELS_MAP = {v: k for k, v in LABELS_MAP.items()}
+    stage_stats = StageStats()
+    reload_state.previous = None
+    reload_state.probation = 0
+    reload_state.rollbacks += 1
+    old_version = bundle.version if bundle is not None else "loose files"
+    print(f"\n[RELOAD] v{failed_version} failed ({error}), rolled back to v{old_version}")
+
+def refresh_templates():
+    """DTW backend: picks up gestures enrolled into the template store since the last gesture."""
+    global LABELS_MAP, INV_LABELS_MAP
+    try:
+        if not backend.refresh():
+            return
+    except Exception as e:
+        print(f"\n[TEMPLATES] reload failed, keeping the current store ({e})")
+        return
+    LABELS_MAP = backend.labels_map
+    INV_LABELS_MAP = {v: k for k, v in LABELS_MAP.items()}
+    print(f"\n[TEMPLATES] reloaded: {len(backend.store.labels)} templates, {len(LABELS_MAP)} gestures")
+
+def predict_gesture(data, watcher):
+    """resample_and_predict with rollback: a failure right after a swap restores the previous models."""
+    try:
+        result = resample_and_predict(data)
+    except Exception as e:
+        reload_state.dropped += 1
+        if reload_state.probation > 0 and reload_state.previous is not None:
+            rollback(watcher, e)
+        else:
+            print(f"\n[!] Prediction Error: {e}")
+        return None, 0.0, None, None
+    if reload_state.probation > 0:
+        reload_state.probation -= 1
+    if watcher is not None:
+        watcher.probe = np.array(recent_gestures, dtype=np.float32)
+    return result
+
+# ======================================================
+# 6. Per-user Head (adapt_user.py)
+# ======================================================
+current_user = None
+
+def login(user):
+    """Swaps the user's adapted CNN-LSTM head in (base head when there is none or user is None)."""
+    global current_user
+    current_user = user
+    cnns = [b for b in iter_backends(backend) if isinstance(b, CNNLSTMBackend)]
+    if not cnns:
+        return
+    for b in cnns:
+        b.reset_head()
+    if user is None:
+        print("\n[USER] logged out, base model")
+        return
+    path = head_path(user)
+    if not os.path.exists(path):
+        print(f"\n[USER] {user}: no adapted head ({path}), base model")
+        return
+    try:
+        head = load_head(path, LABELS_MAP, backbone_fingerprint(cnns[0].model))
+    except Exception as e:
+        print(f"\n[USER] {user}: {e}, base model")
+        return
+    for b in cnns:
+        b.set_head(head)
+    print(f"\n[USER] {user}: adapted head loaded")
+
+# ======================================================
+# 7. Sentence Mode & Usage Log
+# ======================================================
+def thai_text(label_en):
+    # ท่าที่ enroll เพิ่มอาจมีข้อความของตัวเองใน Template Store
+    return TRANSLATION_DICT.get(label_en) or getattr(backend, "texts", {}).get(label_en, "ไม่ทราบท่าทางค่ะ")
+
+def record_usage(entry):
+    if not LOG_USAGE:
+        return
+    try:
+        log_usage({**entry, "user": current_user}, USAGE_LOG)
+    except OSError as e:
+        print(f"\n[!] Usage log error: {e}")
+
+class Sentence:
+    """Feeds every gesture's probabilities to one BeamDecoder and speaks the phrase once after a pause."""
+    def __init__(self):
+        self.decoder = None
+        self.labels_map = None
+        self.last_gesture = 0.0
+
+    def add(self, probs):
+        if self.labels_map is not LABELS_MAP:
+            # Label Map เปลี่ยน (Hot Reload / Enroll) -> จบวลีเดิมด้วย Map เดิม แล้วสร้าง Bigram ใหม่ให้ตรงคลาส
+            self.end()
+            self.decoder = BeamDecoder(lm_matrix(load_lm(), LABELS_MAP))
+            self.labels_map = LABELS_MAP
+        start = time.perf_counter()
+        self.decoder.step(probs)
+        step_ms = (time.perf_counter() - start) * 1000
+        self.last_gesture = time.time()
+        partial, _ = self.decoder.best()
+        print(f" [SENTENCE] {' '.join(thai_text(self.labels_map[i]) for i in partial)} ({step_ms:.3f} ms)")
+        if len(self.decoder) >= self.decoder.max_words:
+            self.end()
+
+    def poll(self):
+        if self.decoder is not None and len(self.decoder) and time.time() - self.last_gesture > SENTENCE_TIMEOUT:
+            self.end()
+
+    def end(self):
+        if self.decoder is None or len(self.decoder) == 0:
+            return
+        labels = [self.labels_map[i] for i in self.decoder.finish()]
+        text = " ".join(thai_text(label) for label in labels)
+        print(f"\n" + "="*40)
+        print(f" SENTENCE: {text} ({' '.join(labels)})")
+        print("="*40)
+        speak_thai(text)
+        # บันทึกวลีที่ถอดแล้ว (ผ่าน Bigram) ไม่ใช่ argmax ทีละท่า
+        for label in labels:
+            record_usage({"label": label})
+        record_usage({"event": "end"})
+
+sentence = Sentence()
+
+# ======================================================
+# 8. Main Serial Loop
 # ======================================================
 def main():
+    global SENTENCE_MODE
+    parser = argparse.ArgumentParser(description="Real-time gesture inference from the glove")
+    parser.add_argument("--user", help="wearer whose adapted head (adapt_user.py) to use")
+    parser.add_argument("--sentence", action="store_true", help="decode whole phrases and speak them after a pause")
+    args = parser.parse_args()
+    if args.user:
+        login(args.user)
+    SENTENCE_MODE = SENTENCE_MODE or args.sentence
+    hooks = ProfilingHooks("inference", PROFILING_PORT).install()
+
     try:
         ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
         ser.flushInput()
-        print(f"\n--- Ensemble Inference Server Ready on {SERIAL_PORT} ---")
+        print(f"\n--- {BACKEND} Inference Server Ready on {SERIAL_PORT}" + (" (sentence mode)" if SENTENCE_MODE else "") + " ---")
         print("Waiting for gesture signal...")
 
+        watcher = None
+        if HOT_RELOAD and BACKEND != "dtw":
+            watcher = BundleWatcher(MODEL_BUNDLE_DIR, BACKEND, bundle.version if bundle is not None else "",
+                                    RELOAD_POLL_SEC, early_exit=EARLY_EXIT, cascade=CASCADE_MODE).start()
+            print(f"[RELOAD] Watching '{MODEL_BUNDLE_DIR}' for new bundles")
+
         gesture_buffer = []
         is_collecting = False
 
         while True:
             line = ser.readline().decode('utf-8', errors='ignore').strip()
+            # สลับโมเดลเฉพาะตอนไม่ได้เก็บท่า (readline timeout 1 วิ จึงสลับได้แม้ไม่มีท่าเข้ามา)
+            if watcher is not None and not is_collecting:
+                swap_if_ready(watcher)
+            if hasattr(backend, "refresh") and not is_collecting:
+                refresh_templates()
+            if SENTENCE_MODE and not is_collecting:
+                sentence.poll()
             if not line: continue
 
-            if "START_SIGNAL" in line:
+            # เปลี่ยนผู้ใช้ระหว่างท่า: "LOGIN <name>" / "LOGOUT"
+            if line.startswith("LOGIN ") and not is_collecting:
+                login(line.split(maxsplit=1)[1])
+            elif line == "LOGOUT" and not is_collecting:
+                login(None)
+
+            elif "START_SIGNAL" in line:
                 print("\n[*] Detecting...", end="", flush=True)
                 gesture_buffer = []
                 is_collecting = True
@@ -169,9 +393,9 @@ def main():
                 gesture_buffer = []
 
             elif is_collecting and (line.startswith("S ") or (line and line[0].isdigit())):
-                parts = [x for x in line.split() if x not in ["S", "E"]]
-                if len(parts) == 22:
-                    gesture_buffer.append([float(x) for x in parts])
+                frame = parse_frame_line(line)
+                if frame is not None:
+                    gesture_buffer.append(frame)
                     print(".", end="", flush=True)
 
             elif "SUCCESS_SIGNAL" in line:
@@ -179,18 +403,24 @@ def main():
                 print(f" Done ({actual_frames} frames)")
                 
                 if actual_frames >= 10:
-                    label_en, conf = resample_and_predict(gesture_buffer)
-                    thai_text = TRANSLATION_DICT.get(label_en, "ไม่ทราบท่าทางค่ะ")
+                    label_en, conf, stage, probs = predict_gesture(gesture_buffer, watcher)
+                    text = thai_text(label_en)
                     
                     print(f"\n" + "="*40)
-                    print(f" RESULT  : {thai_text} ({label_en})")
-                    print(f" CONF    : {conf*100:.2f}% (Ensemble)")
+                    print(f" RESULT  : {text} ({label_en})")
+                    print(f" CONF    : {conf*100:.2f}% ({stage})")
                     print("="*40)
+                    print(f" [STAGES] {stage_stats.summary()}")
                     
-                    # คุณอาจจะต้องปรับ Threshold ตรงนี้ (ของเดิม 0.45) 
-                    # เพราะพอเฉลี่ย 2 โมเดล ค่าความมั่นใจอาจจะไม่โดดทะลุ 90% บ่อยเหมือนตอนใช้โมเดลเดียว
-                    if conf > 0.45:
-                        speak_thai(thai_text)
+                    if SENTENCE_MODE:
+                        # ท่าที่ไม่มั่นใจก็ส่งเข้า Beam Search ด้วย ให้ Bigram ช่วยตัดสินจากคำรอบข้าง
+                        if probs is not None:
+                            sentence.add(probs)
+                    # Backend "calibrated" มี Threshold ต่อคลาสจาก calibrate_ensemble.py
+                    # ที่เหลือใช้ CONF_THRESHOLD (ของเดิม 0.45)
+                    elif conf > speak_threshold(label_en, stage):
+                        speak_thai(text)
+                        record_usage({"label": label_en, "conf": round(float(conf), 4)})
                     else:
                         print("[!] Confidence too low to speak.")
                 else:
@@ -200,9 +430,14 @@ def main():
                 print("\nReady for next gesture...")
 
     except KeyboardInterrupt:
-        print("\nServer Exit...")
+        sentence.end()
+        print(f"\n[STAGES] {stage_stats.summary()}")
+        print(f"[RELOAD] {reload_state.summary()}")
+        print("Server Exit...")
     except Exception as e:
         print(f"\nSerial/Main Error: {e}")
+    finally:
+        hooks.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
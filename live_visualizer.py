@@ -0,0 +1,283 @@
+import os
+import time
+import argparse
+import threading
+from collections import deque
+import numpy as np
+import serial
+import matplotlib.pyplot as plt
+from matplotlib.animation import FuncAnimation
+
+from gesture_utils import NUM_FEATURES, parse_frame_line, read_take
+from simulation import CAPTURE_HZ, ORIENTATION_FUSION, create_hand_artists, hand_artists, set_pose, take_poses
+from orientation import OrientationFilter, angles_by_hand
+
+# ======================================================
+# 1. Configuration
+# ======================================================
+# python live_visualizer.py --port COM3                    -> ภาพมือสดจากถุงมือ
+# python live_visualizer.py --replay a.csv b.csv           -> เล่นไฟล์ผ่าน Stream จำลอง (ไม่ต้องมีถุงมือ)
+SERIAL_PORT = "COM3"
+BAUD_RATE = 115200
+DISPLAY_HZ = 60          # วาดเร็วสุดเท่านี้ (วาดเฉพาะเฟรมล่าสุด เฟรมที่เก่ากว่าถูกข้าม)
+RING_CAPACITY = 256      # ~5 วินาทีที่ 50 Hz
+STATS_WINDOW = 120       # คำนวณ FPS / Lag จากกี่เฟรมที่วาดล่าสุด
+REOPEN_DELAY = 3.0
+REPLAY_GAP = 1.0         # วินาทีระหว่าง Take ตอน Replay
+
+# ======================================================
+# 2. Ring Buffer (ผู้เขียน 1 Thread, ผู้อ่าน 1 Thread, ไม่ใช้ Lock)
+# ======================================================
+class FrameRing:
+    """
+    Fixed-size ring of decoded frames. The reader thread is the only writer; the renderer
+    only ever asks for the newest frame. Each slot carries the sequence number written last,
+    cleared while the slot is being overwritten, so a torn read is detected and retried
+    instead of locking the producer.
+    """
+    def __init__(self, capacity=RING_CAPACITY, width=NUM_FEATURES):
+        self.capacity = capacity
+        self.frames = np.zeros((capacity, width))
+        self.stamps = np.zeros(capacity)
+        self.seqs = np.full(capacity, -1, dtype=np.int64)
+        self.written = 0
+
+    def push(self, frame, stamp):
+        seq = self.written
+        slot = seq % self.capacity
+        self.seqs[slot] = -1
+        self.frames[slot] = frame
+        self.stamps[slot] = stamp
+        self.seqs[slot] = seq
+        self.written = seq + 1  # ประกาศเฟรมใหม่หลังเขียนเสร็จ
+
+    def latest(self):
+        """-> (seq, frame copy, arrival time) of the newest frame, or None before the first one."""
+        while True:
+            seq = self.written - 1
+            if seq < 0:
+                return None
+            slot = seq % self.capacity
+            frame, stamp = self.frames[slot].copy(), self.stamps[slot]
+            if self.seqs[slot] == seq:
+                return seq, frame, stamp
+
+# ======================================================
+# 3. Sources
+# ======================================================
+def open_serial(port, baud_rate=BAUD_RATE):
+    ser = serial.Serial(port, baud_rate, timeout=1)
+    ser.reset_input_buffer()
+    return ser
+
+class ReplaySerial:
+    """
+    Stands in for the glove: replays take CSVs as the firmware's serial lines
+    (START_SIGNAL, 'S ...' / '...' / '... E' frames, SUCCESS_SIGNAL) paced at `rate` Hz.
+    """
+    def __init__(self, takes, rate=CAPTURE_HZ, loop=True, gap=REPLAY_GAP):
+        self.takes, self.rate, self.loop, self.gap = takes, rate, loop, gap
+        self._lines = self._generate()
+        self._next = time.perf_counter()
+
+    def _generate(self):
+        while True:
+            for take in self.takes:
+                yield "START_SIGNAL", 0.0
+                for i, row in enumerate(take):
+                    line = " ".join(f"{v:g}" for v in row)
+                    if i == 0:
+                        line = "S " + line
+                    if i == len(take) - 1:
+                        line += " E"
+                    yield line, 1.0 / self.rate
+                yield "SUCCESS_SIGNAL", self.gap
+            if not self.loop:
+                return
+
+    def readline(self):
+        try:
+            line, delay = next(self._lines)
+        except StopIteration:
+            time.sleep(0.1)
+            return b""
+        # ตั้งเวลาจากกำหนดการ (ไม่สะสม Drift จาก sleep)
+        self._next += delay
+        wait = self._next - time.perf_counter()
+        if wait > 0:
+            time.sleep(wait)
+        return (line + "\n").encode("utf-8")
+
+    def close(self):
+        pass
+
+# ======================================================
+# 4. Reader Thread
+# ======================================================
+class SerialReader:
+    """
+    Decodes lines on its own thread and pushes frames into the ring; reopens the port if it drops.
+    With fusion, every frame also goes through the orientation filter here (it needs all frames,
+    not only the ones that get drawn) and the 6 angles are stored after the 22 channels.
+    """
+    def __init__(self, open_source, ring, fusion=False):
+        self.open_source, self.ring = open_source, ring
+        self.filter = OrientationFilter() if fusion else None
+        self.status = "connecting"
+        self.recording = False
+        self.bad_lines = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="serial-reader", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=2.0)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                source = self.open_source()
+            except Exception as e:
+                self.status = f"error: {e}"
+                self._stop.wait(REOPEN_DELAY)
+                continue
+            self.status = "online"
+            try:
+                while not self._stop.is_set():
+                    self.handle_line(source.readline().decode('utf-8', errors='ignore').strip())
+            except Exception as e:
+                self.status = f"lost: {e}"
+                self._stop.wait(REOPEN_DELAY)
+            finally:
+                source.close()
+
+    def handle_line(self, line):
+        if not line:
+            return
+        if "START_SIGNAL" in line:
+            self.recording = True
+            if self.filter is not None:
+                self.filter.reset()  # yaw นับจากต้นท่า
+        elif "SUCCESS_SIGNAL" in line or "CANCEL_SIGNAL" in line or "DISCARD_SIGNAL" in line:
+            self.recording = False
+        elif line.startswith("S ") or line[0].isdigit() or line.startswith("-"):
+            frame = parse_frame_line(line)
+            if frame is None:
+                self.bad_lines += 1
+            elif self.filter is not None:
+                self.ring.push(np.concatenate([frame, self.filter.update(frame).ravel()]), time.perf_counter())
+            else:
+                self.ring.push(frame, time.perf_counter())
+
+# ======================================================
+# 5. Live View
+# ======================================================
+class LiveView:
+    """
+    Renders the newest frame at display rate. Frames that arrived between two draws are
+    skipped (counted as dropped) so the picture never falls behind the glove.
+    """
+    def __init__(self, ring, reader, display_hz=DISPLAY_HZ, blit=True):
+        self.ring, self.reader, self.display_hz, self.blit = ring, reader, display_hz, blit
+        self.fig = plt.figure(figsize=(9, 7))
+        self.ax = self.fig.add_subplot(111, projection='3d')
+        self.lines = create_hand_artists(self.ax, "Live Glove")
+        self.status_label = self.ax.text2D(0.02, 0.97, "", transform=self.ax.transAxes, fontsize=8, va='top')
+
+        self.last_seq = -1
+        self.rendered = 0
+        self.dropped = 0
+        self.draw_times = deque(maxlen=STATS_WINDOW)
+        self.lags_ms = deque(maxlen=STATS_WINDOW)
+        self.pose_ms = deque(maxlen=STATS_WINDOW)
+        self.arrivals = deque(maxlen=STATS_WINDOW)
+
+    def update(self, _frame=None):
+        now = time.perf_counter()
+        self.draw_times.append(now)
+        latest = self.ring.latest()
+        if latest is not None and latest[0] != self.last_seq:
+            seq, frame, stamp = latest
+            start = time.perf_counter()
+            angles = angles_by_hand(frame[NUM_FEATURES:].reshape(1, 2, 3)) if len(frame) > NUM_FEATURES else None
+            set_pose(self.lines, take_poses(frame[np.newaxis, :NUM_FEATURES], angles), 0)
+            self.pose_ms.append((time.perf_counter() - start) * 1000)
+            if self.last_seq >= 0:
+                self.dropped += max(0, seq - self.last_seq - 1)
+            self.lags_ms.append((now - stamp) * 1000)
+            self.arrivals.append((now, self.ring.written))
+            self.last_seq = seq
+            self.rendered += 1
+        self.status_label.set_text(self.status_text())
+        return hand_artists(self.lines) + [self.status_label]
+
+    def stats(self):
+        fps = (len(self.draw_times) - 1) / (self.draw_times[-1] - self.draw_times[0]) if len(self.draw_times) > 1 else 0.0
+        input_hz = 0.0
+        if len(self.arrivals) > 1 and self.arrivals[-1][0] > self.arrivals[0][0]:
+            input_hz = (self.arrivals[-1][1] - self.arrivals[0][1]) / (self.arrivals[-1][0] - self.arrivals[0][0])
+        lags = np.array(self.lags_ms) if self.lags_ms else np.zeros(1)
+        return {"render_fps": fps, "input_hz": input_hz, "lag_p50_ms": float(np.percentile(lags, 50)),
+                "lag_p95_ms": float(np.percentile(lags, 95)), "pose_ms": float(np.mean(self.pose_ms)) if self.pose_ms else 0.0,
+                "frames": self.ring.written, "rendered": self.rendered, "dropped": self.dropped,
+                "bad_lines": self.reader.bad_lines}
+
+    def status_text(self):
+        s = self.stats()
+        state = "REC" if self.reader.recording else "idle"
+        return (f"{self.reader.status} | {state} | input {s['input_hz']:.0f} Hz | render {s['render_fps']:.0f} FPS\n"
+                f"lag p50 {s['lag_p50_ms']:.1f} ms / p95 {s['lag_p95_ms']:.1f} ms | pose {s['pose_ms']:.2f} ms\n"
+                f"frames {s['frames']} | drawn {s['rendered']} | dropped {s['dropped']} | bad {s['bad_lines']}")
+
+    def report(self, _event=None):
+        print("--- " + self.status_text().replace("\n", " | ") + " ---")
+
+    def run(self):
+        self.animation = FuncAnimation(self.fig, self.update, interval=1000 / self.display_hz, blit=self.blit,
+                                       cache_frame_data=False)
+        self.fig.canvas.mpl_connect('close_event', self.report)
+        plt.show()
+
+# ======================================================
+# 6. CLI
+# ======================================================
+def main():
+    parser = argparse.ArgumentParser(description="Live 3D view of the glove from the serial port or a replayed take")
+    parser.add_argument("--port", default=SERIAL_PORT)
+    parser.add_argument("--baud", type=int, default=BAUD_RATE)
+    parser.add_argument("--replay", nargs="+", help="replay these take CSVs instead of reading the serial port")
+    parser.add_argument("--rate", type=float, default=CAPTURE_HZ, help="replay rate in frames per second")
+    parser.add_argument("--display-hz", type=float, default=DISPLAY_HZ)
+    parser.add_argument("--no-blit", action="store_true")
+    parser.add_argument("--accel-only", action="store_true", help="tilt from the accelerometer only (no gyro, yaw = 0)")
+    args = parser.parse_args()
+
+    if args.replay:
+        takes = []
+        for path in args.replay:
+            if not os.path.exists(path):
+                print(f"[!] ไม่พบไฟล์ {path} ครับ")
+                continue
+            takes.append(read_take(path))
+        if not takes:
+            return
+        open_source = lambda: ReplaySerial(takes, rate=args.rate)
+        print(f"--- Replaying {len(takes)} takes at {args.rate:g} Hz ---")
+    else:
+        open_source = lambda: open_serial(args.port, args.baud)
+        print(f"--- Live view on {args.port} ---")
+
+    fusion = ORIENTATION_FUSION and not args.accel_only
+    ring = FrameRing(width=NUM_FEATURES + 6 if fusion else NUM_FEATURES)
+    reader = SerialReader(open_source, ring, fusion).start()
+    try:
+        LiveView(ring, reader, args.display_hz, blit=not args.no_blit).run()
+    finally:
+        reader.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import mmap
+import argparse
+import threading
+from datetime import datetime
+import numpy as np
+import torch
+import joblib
+
+from gesture_utils import EXPECTED_FRAMES, NUM_FEATURES, COLUMNS, LABELS_FILE, PREPROCESSING_VERSION, load_labels_map
+from gesture_backends import DEFAULT_PATHS, load_backend, load_calibrated_backend, load_xgb_file, calibration_requires
+
+# ======================================================
+# 1. Configuration
+# ======================================================
+BUNDLE_ROOT = "model_bundles"
+MANIFEST_FILE = "manifest.json"
+BUNDLE_FORMAT = 1
+
+# ชื่อไฟล์ภายใน Bundle (ไม่ขึ้นกับว่า Trainer ตัวไหนตั้งชื่อไฟล์ไว้ยังไง)
+BUNDLE_FILES = {
+    "cnnlstm": "cnnlstm.pth",
+    "xgb": "xgb.json",
+    "rf": "rf.pkl",
+    "student": "student.pth",
+    "calibration": "calibration.json",
+}
+METRICS_FILES = ["gesture_model_ensemble_metrics.json", "gesture_model_student_metrics.json"]
+
+# Input ที่แต่ละโมเดลคาดหวัง (หลัง resample_gesture)
+FEATURE_SPEC = {
+    "channels": COLUMNS,
+    "num_features": NUM_FEATURES,
+    "inputs": {
+        "cnnlstm": "zero_start (70, 22)",
+        "xgb": "zero_start flattened (1540,)",
+        "student": "zero_start (70, 22)",
+        "rf": "extract_advanced_features (110,)",
+    },
+}
+
+class BundleError(ValueError):
+    pass
+
+# ======================================================
+# 2. Checksums & Validation Helpers
+# ======================================================
+def file_sha256(path):
+    # อ่านผ่าน mmap: หน้าที่ถูก Hash แล้วอยู่ใน Page Cache ให้ตอนโหลดโมเดลต่อได้ทันที
+    if os.path.getsize(path) == 0:
+        return hashlib.sha256().hexdigest()
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return hashlib.sha256(mm).hexdigest()
+
+def bundle_checksum(manifest):
+    # Checksum รวมของทั้ง Bundle: ครอบคลุมทุกไฟล์ + Label Map + Spec
+    payload = {k: manifest[k] for k in ("version", "labels", "expected_frames", "preprocessing_version", "feature_spec")}
+    payload["files"] = {name: info["sha256"] for name, info in sorted(manifest["files"].items())}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def count_classes(name, path):
+    if name in ("cnnlstm", "student"):
+        return torch.load(path, map_location="cpu", weights_only=True)["fc.weight"].shape[0]
+    if name == "xgb":
+        return int(load_xgb_file(path).n_classes_)
+    if name == "rf":
+        return int(max(joblib.load(path).classes_) + 1)
+    if name == "calibration":
+        with open(path, "r", encoding="utf-8") as f:
+            return len(json.load(f)["labels"])
+    raise BundleError(f"Unknown artifact '{name}'")
+
+def artifact_labels(name, path):
+    """Label map stored inside the artifact itself (only the calibration file has one), else None."""
+    if name == "calibration":
+        with open(path, "r", encoding="utf-8") as f:
+            return {int(k): v for k, v in json.load(f)["labels"].items()}
+    return None
+
+def check_labels(labels_map, sources, metrics):
+    # ตรวจว่าทุกโมเดลใช้ Label Map ชุดเดียวกัน (กันปัญหา labels_map.json โดน Trainer ตัวอื่นเขียนทับ)
+    # จำนวนคลาสเช็คจาก Weights ได้ทุกไฟล์ ส่วนชื่อ Label เช็คได้จาก Calibration และ Metrics ที่ Trainer บันทึกไว้
+    for name, path in sources.items():
+        n = count_classes(name, path)
+        if n != len(labels_map):
+            raise BundleError(f"{path} has {n} classes but the label map has {len(labels_map)}")
+        labels = artifact_labels(name, path)
+        if labels is not None and labels != labels_map:
+            raise BundleError(f"{path} was built for a different label map")
+    for source, values in (metrics or {}).items():
+        if "labels" in values and {int(k): v for k, v in values["labels"].items()} != labels_map:
+            raise BundleError(f"{source} was trained on a different label map")
+
+# ======================================================
+# 3. Build
+# ======================================================
+def build_bundle(labels_map, sources=None, root=BUNDLE_ROOT, version=None, metrics=None):
+    """
+    Copies the given artifacts ({name: path}, default: every existing model file in DEFAULT_PATHS)
+    into root/<version>/ together with a manifest. The bundle is written to a hidden temp
+    directory first and renamed into place, so a watcher never sees a half-written bundle.
+    """
+    if sources is None:
+        # Template Store ของ DTW ไม่อยู่ใน Bundle (enroll ท่าใหม่ได้ระหว่าง Server รัน) จึงเลือกเฉพาะไฟล์ใน BUNDLE_FILES
+        sources = {name: path for name, path in DEFAULT_PATHS.items() if name in BUNDLE_FILES and os.path.exists(path)}
+    if not any(name in sources for name in ("cnnlstm", "xgb", "rf", "student")):
+        raise BundleError("No model files to bundle")
+    check_labels(labels_map, sources, metrics)
+    if "calibration" in sources:
+        with open(sources["calibration"], "r", encoding="utf-8") as f:
+            missing = [n for n in calibration_requires(json.load(f)) if n not in sources]
+        if missing:
+            raise BundleError(f"Calibration uses {', '.join(missing)} which would not be in the bundle")
+
+    version = version or datetime.now().strftime("%Y%m%d-%H%M%S")
+    final_dir = os.path.join(root, version)
+    tmp_dir = os.path.join(root, f".{version}.tmp")
+    if os.path.exists(final_dir):
+        raise BundleError(f"Bundle {final_dir} already exists")
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    files = {}
+    for name, path in sources.items():
+        target = os.path.join(tmp_dir, BUNDLE_FILES[name])
+        shutil.copyfile(path, target)
+        files[name] = {"file": BUNDLE_FILES[name], "size": os.path.getsize(target),
+                       "sha256": file_sha256(target), "source": os.path.basename(path)}
+
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "version": version,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "labels": {str(k): v for k, v in labels_map.items()},
+        "expected_frames": EXPECTED_FRAMES,
+        "preprocessing_version": PREPROCESSING_VERSION,
+        "feature_spec": FEATURE_SPEC,
+        "files": files,
+        "metrics": metrics or {},
+    }
+    manifest["bundle_sha256"] = bundle_checksum(manifest)
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=4)
+
+    os.replace(tmp_dir, final_dir)
+    return final_dir
+
+def collect_metrics():
+    metrics = {}
+    for path in METRICS_FILES:
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                metrics[os.path.splitext(path)[0]] = json.load(f)
+    return metrics
+
+# ======================================================
+# 4. Load & Validate
+# ======================================================
+def list_bundles(root=BUNDLE_ROOT):
+    if not os.path.isdir(root):
+        return []
+    # Version เป็น Timestamp จึงเรียงตามตัวอักษรได้เลย; ข้าม .tmp ที่ยังเขียนไม่เสร็จ
+    return sorted(d for d in os.listdir(root)
+                  if not d.startswith(".") and os.path.exists(os.path.join(root, d, MANIFEST_FILE)))
+
+def find_latest_bundle(root=BUNDLE_ROOT):
+    versions = list_bundles(root)
+    return os.path.join(root, versions[-1]) if versions else None
+
+def verify_bundle(path, checksums=True):
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        raise BundleError(f"{path} has no {MANIFEST_FILE}")
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    if manifest.get("format") != BUNDLE_FORMAT:
+        raise BundleError(f"Unsupported bundle format {manifest.get('format')}")
+    if manifest["expected_frames"] != EXPECTED_FRAMES:
+        raise BundleError(f"Bundle expects {manifest['expected_frames']} frames, code uses {EXPECTED_FRAMES}")
+    if manifest["preprocessing_version"] != PREPROCESSING_VERSION:
+        raise BundleError(f"Bundle preprocessing v{manifest['preprocessing_version']}, code is v{PREPROCESSING_VERSION}")
+    if manifest.get("bundle_sha256") != bundle_checksum(manifest):
+        raise BundleError("Manifest checksum mismatch")
+
+    for name, info in manifest["files"].items():
+        file_path = os.path.join(path, info["file"])
+        if not os.path.exists(file_path) or os.path.getsize(file_path) != info["size"]:
+            raise BundleError(f"{info['file']} is missing or has the wrong size")
+        if checksums and file_sha256(file_path) != info["sha256"]:
+            raise BundleError(f"{info['file']} checksum mismatch")
+    return manifest
+
+class ModelBundle:
+    def __init__(self, path, verify=True):
+        self.path = path
+        self.manifest = verify_bundle(path, checksums=verify)
+        self.version = self.manifest["version"]
+        self.labels_map = {int(k): v for k, v in self.manifest["labels"].items()}
+        self.metrics = self.manifest["metrics"]
+        self.paths = {name: os.path.join(path, info["file"]) for name, info in self.manifest["files"].items()}
+
+    def load_backend(self, name, early_exit=True, cascade=True):
+        """Loads only files from this bundle (strict): nothing falls back to the loose files in the working directory."""
+        needed = {"ensemble": ["cnnlstm", "xgb"], "calibrated": ["calibration"]}.get(name, [name])
+        if name == "calibrated" and "calibration" in self.paths:
+            with open(self.paths["calibration"], "r", encoding="utf-8") as f:
+                needed += calibration_requires(json.load(f), cascade)
+        missing = [n for n in needed if n not in self.paths]
+        if missing:
+            raise BundleError(f"Bundle {self.version} has no {', '.join(missing)} for backend '{name}'")
+        if name == "calibrated":
+            return load_calibrated_backend(self.labels_map, paths=self.paths, mmap=True,
+                                           early_exit=early_exit, cascade=cascade, strict=True)
+        return load_backend(name, self.labels_map, paths=self.paths, mmap=True, strict=True)
+
+def load_bundle(path=None, root=BUNDLE_ROOT, verify=True):
+    """One call: picks the latest bundle under root (unless path is given) and validates it."""
+    path = path or find_latest_bundle(root)
+    if path is None:
+        raise BundleError(f"No model bundle found in '{root}'")
+    return ModelBundle(path, verify=verify)
+
+def warm_up(backend, num_classes, batch=None):
+    """Runs one dummy gesture (or the given real batch) through the backend and checks the output."""
+    if batch is None:
+        batch = np.zeros((1, EXPECTED_FRAMES, NUM_FEATURES), dtype=np.float32)
+    probs = backend.predict_proba(batch)
+    if probs.shape != (len(batch), num_classes) or not np.all(np.isfinite(probs)):
+        raise BundleError(f"Backend returned {probs.shape}, expected ({len(batch)}, {num_classes})")
+
+# ======================================================
+# 5. Hot Reload
+# ======================================================
+class BundleWatcher:
+    """
+    Watches the bundle root on a background thread. When a newer version appears it is
+    validated, loaded and warmed up off the serial loop; the loop then picks it up with
+    take_ready() between gestures, so the swap itself is just a reference assignment.
+    A version that fails validation is remembered and never retried (the running
+    models stay in place). Set `probe` to a (N, 70, 22) batch of recent real gestures to
+    validate on those as well as on the dummy input.
+    """
+    def __init__(self, root, backend_name, current_version, poll_interval=2.0, **backend_kwargs):
+        self.root = root
+        self.backend_name = backend_name
+        self.backend_kwargs = backend_kwargs
+        self.poll_interval = poll_interval
+        self.latest_seen = current_version
+        self.failed = set()
+        self.probe = None
+        self._ready = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="bundle-watcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def reject(self, version):
+        # ใช้ตอน Rollback หลัง Swap: ไม่ต้องโหลดเวอร์ชันนี้ซ้ำอีก
+        self.failed.add(version)
+
+    def take_ready(self):
+        """Returns (bundle, backend, load_ms) once per new version, otherwise None."""
+        with self._lock:
+            ready, self._ready = self._ready, None
+        return ready
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            versions = list_bundles(self.root)
+            if not versions:
+                continue
+            version = versions[-1]
+            if version <= self.latest_seen or version in self.failed:
+                continue
+            start = time.perf_counter()
+            try:
+                bundle = ModelBundle(os.path.join(self.root, version))
+                backend = bundle.load_backend(self.backend_name, **self.backend_kwargs)
+                warm_up(backend, len(bundle.labels_map))
+                if self.probe is not None and len(self.probe):
+                    warm_up(backend, len(bundle.labels_map), self.probe)
+            except Exception as e:
+                print(f"\n[RELOAD] Bundle {version} rejected, keeping current models: {e}")
+                self.failed.add(version)
+                continue
+            with self._lock:
+                self._ready = (bundle, backend, (time.perf_counter() - start) * 1000)
+            self.latest_seen = version
+
+# ======================================================
+# 6. CLI
+# ======================================================
+def main():
+    parser = argparse.ArgumentParser(description="Build, verify and list versioned model bundles")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="bundle the trained model files in the current directory")
+    build.add_argument("--root", default=BUNDLE_ROOT)
+    build.add_argument("--version")
+    build.add_argument("--labels", default=LABELS_FILE)
+    build.add_argument("--models", nargs="+", choices=list(BUNDLE_FILES), help="artifacts to include (default: all found)")
+
+    verify = sub.add_parser("verify", help="check manifest and checksums, then load and warm up every backend")
+    verify.add_argument("path", nargs="?")
+    verify.add_argument("--root", default=BUNDLE_ROOT)
+
+    lst = sub.add_parser("list")
+    lst.add_argument("--root", default=BUNDLE_ROOT)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        sources = None
+        if args.models:
+            sources = {name: DEFAULT_PATHS[name] for name in args.models}
+        path = build_bundle(load_labels_map(args.labels), sources, args.root, args.version, collect_metrics())
+        print(f"[DONE] Bundle saved as '{path}'")
+
+    elif args.command == "verify":
+        start = time.perf_counter()
+        bundle = load_bundle(args.path, args.root)
+        print(f"[OK] {bundle.path} (v{bundle.version}) manifest + checksums in {(time.perf_counter()-start)*1000:.1f} ms")
+        for name in ("cnnlstm", "xgb", "rf", "student", "ensemble", "calibrated"):
+            try:
+                start = time.perf_counter()
+                backend = bundle.load_backend(name)
+                warm_up(backend, len(bundle.labels_map))
+                print(f"   {name:10s}: loaded + warmed up in {(time.perf_counter()-start)*1000:.1f} ms")
+            except BundleError as e:
+                print(f"   {name:10s}: skipped ({e})")
+
+    elif args.command == "list":
+        for version in list_bundles(args.root):
+            with open(os.path.join(args.root, version, MANIFEST_FILE), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            print(f"{version}: {len(manifest['labels'])} labels | {', '.join(manifest['files'])}")
+
+if __name__ == "__main__":
+    main()
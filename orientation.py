@@ -0,0 +1,199 @@
+import os
+import time
+import argparse
+import numpy as np
+
+from gesture_utils import DATA_DIR, EXPECTED_FRAMES, detect_labels, load_dataset
+
+# ======================================================
+# 1. Configuration
+# ======================================================
+# Complementary Filter: Gyro (เร็ว แต่ Drift) + มุมจาก Accel (ช้า/มี Noise แต่ไม่ Drift)
+# Yaw ไม่มี Magnetometer ช่วย จึงเป็นมุมสะสมจาก Gyro นับจากเฟรมแรกของ Take
+CAPTURE_HZ = 50
+DT = 1.0 / CAPTURE_HZ    # ช่วงเวลาระหว่างเฟรมของ Take ดิบ; Take ที่ Resample แล้วใช้ resampled_dt() แทน
+ALPHA = 0.98             # น้ำหนักของ Gyro ต่อเฟรม (1 - ALPHA = น้ำหนักมุมจาก Accel)
+ACCEL_TRUST_BAND = 0.5   # |a| ห่างจาก 1 g เกินเท่านี้ = มือกำลังเร่ง ไม่ใช้ Accel แก้มุม
+
+# คอลัมน์ตาม COLUMNS: L_Ax/Ay/Az = 5-7, L_Gx/Gy/Gz = 8-10, R_Ax/Ay/Az = 16-18, R_Gx/Gy/Gz = 19-21
+ACCEL_COLS = np.r_[5:8, 16:19]
+GYRO_COLS = np.r_[8:11, 19:22]
+HANDS = ["left", "right"]
+
+# ======================================================
+# 2. Filter Step (ใช้ร่วมกันทั้งแบบ Batch และแบบทีละเฟรม)
+# ======================================================
+def wrap(angle):
+    return (angle + np.pi) % (2 * np.pi) - np.pi
+
+def accel_angles(accel):
+    """(..., 3) accel in g -> (..., 2) roll, pitch (same convention as simulation.py)."""
+    ax_, ay_, az_ = accel[..., 0], accel[..., 1], accel[..., 2]
+    return np.stack([np.arctan2(ay_, az_), np.arctan2(-ax_, np.sqrt(ay_ ** 2 + az_ ** 2))], axis=-1)
+
+def accel_trust(accel, band=ACCEL_TRUST_BAND):
+    # 1 เมื่อ |a| = 1 g (มีแต่แรงโน้มถ่วง) ลดลงเป็น 0 เมื่อห่างเกิน band
+    return np.clip(1.0 - np.abs(np.linalg.norm(accel, axis=-1) - 1.0) / band, 0.0, 1.0)
+
+def step(state, gyro, acc_rp, trust, dt=DT, alpha=ALPHA):
+    """
+    One filter update for any batch shape. state (..., 3) roll/pitch/yaw, gyro (..., 3) in rad/s,
+    acc_rp (..., 2) accel roll/pitch, trust (...,), dt scalar or broadcastable to (...,).
+    """
+    roll, pitch, yaw = state[..., 0], state[..., 1], state[..., 2]
+    gx, gy, gz = gyro[..., 0], gyro[..., 1], gyro[..., 2]
+    sr, cr = np.sin(roll), np.cos(roll)
+    cp = np.cos(pitch)
+    cp = np.where(np.abs(cp) < 1e-6, 1e-6, cp)  # Gimbal lock ที่ pitch = ±90°
+    tp = np.sin(pitch) / cp
+
+    # อัตราการหมุนของตัวมือ -> อัตราเปลี่ยนมุม Euler
+    roll = roll + dt * (gx + sr * tp * gy + cr * tp * gz)
+    pitch = pitch + dt * (cr * gy - sr * gz)
+    yaw = yaw + dt * (sr * gy + cr * gz) / cp
+
+    k = (1.0 - alpha) * trust
+    roll = wrap(roll + k * wrap(acc_rp[..., 0] - roll))
+    pitch = wrap(pitch + k * wrap(acc_rp[..., 1] - pitch))
+    return np.stack([roll, pitch, wrap(yaw)], axis=-1)
+
+def initial_state(acc_rp):
+    return np.concatenate([acc_rp, np.zeros(acc_rp.shape[:-1] + (1,))], axis=-1)
+
+def split_hands(X):
+    """(..., 22) -> accel (..., 2, 3) in g and gyro (..., 2, 3) in rad/s."""
+    accel = X[..., ACCEL_COLS].reshape(X.shape[:-1] + (2, 3))
+    gyro = np.radians(X[..., GYRO_COLS]).reshape(X.shape[:-1] + (2, 3))
+    return accel, gyro
+
+# ======================================================
+# 3. Batch (ทั้ง Dataset)
+# ======================================================
+def resampled_dt(lengths, target=EXPECTED_FRAMES, hz=CAPTURE_HZ):
+    """
+    Per-take time step after resampling: a take of `length` frames (after trim_idle, see
+    load_dataset(..., return_lengths=True)) spans (length - 1) / hz seconds over target - 1 steps.
+    """
+    return (np.asarray(lengths, dtype=np.float64) - 1) / hz / (target - 1)
+
+def fuse(X, dt=DT, alpha=ALPHA):
+    """
+    (N, T, 22) or (T, 22) takes -> (N, T, 2, 3) roll/pitch/yaw in radians per hand (left, right).
+    Loops over the T time steps only; every take and both hands update together.
+    `dt` can be a scalar or one value per take (resampled_dt(lengths) for resampled takes).
+    """
+    X = np.asarray(X, dtype=np.float64)
+    single = X.ndim == 2
+    if single:
+        X = X[np.newaxis]
+    accel, gyro = split_hands(X)
+    acc_rp = accel_angles(accel)
+    trust = accel_trust(accel)
+    dt = np.asarray(dt, dtype=np.float64)
+    if dt.ndim == 1:
+        dt = dt[:, np.newaxis]  # (N, 1) -> กระจายไปทั้งสองมือ
+
+    angles = np.empty(X.shape[:2] + (2, 3))
+    state = initial_state(acc_rp[:, 0])
+    angles[:, 0] = state
+    for t in range(1, X.shape[1]):
+        state = step(state, gyro[:, t], acc_rp[:, t], trust[:, t], dt, alpha)
+        angles[:, t] = state
+    return angles[0] if single else angles
+
+def orientation_features(X, dt=DT, alpha=ALPHA):
+    """
+    (N, T, 22) -> (N, T, 9) per-frame features: sin/cos of roll and pitch per hand (continuous
+    across ±180°) and the left-right yaw difference in degrees (each hand's yaw alone is only
+    relative to the take's first frame). Opt-in: the shipped trainers and backends still use the
+    22 raw channels only (model_bundle.FEATURE_SPEC); append these to train a 31-channel model,
+    with dt=resampled_dt(lengths) since the training takes are resampled.
+    """
+    angles = fuse(X, dt, alpha)
+    rp = angles[..., :2]
+    feats = np.concatenate([np.sin(rp).reshape(angles.shape[:-2] + (4,)), np.cos(rp).reshape(angles.shape[:-2] + (4,))], axis=-1)
+    yaw_spread = np.degrees(wrap(angles[..., 0, 2] - angles[..., 1, 2]))[..., np.newaxis]  # มือซ้ายเทียบมือขวา
+    return np.concatenate([feats, yaw_spread], axis=-1).astype(np.float32)
+
+def angles_by_hand(angles):
+    """(T, 2, 3) -> {"left": (roll, pitch, yaw), "right": ...} for simulation.take_poses."""
+    return {hand: tuple(angles[:, h, i] for i in range(3)) for h, hand in enumerate(HANDS)}
+
+# ======================================================
+# 4. Streaming (O(1) ต่อเฟรม สำหรับ Server / Live View)
+# ======================================================
+class OrientationFilter:
+    """
+    Same filter as fuse(), one frame at a time, on raw frames at CAPTURE_HZ. reset() at START_SIGNAL
+    makes yaw relative to the gesture. Used by live_visualizer.py; the inference servers only need
+    it once a model trained on orientation_features is deployed.
+    """
+    def __init__(self, dt=DT, alpha=ALPHA):
+        self.dt, self.alpha = dt, alpha
+        self.state = None
+        self.last_time = None
+
+    def reset(self):
+        self.state = None
+        self.last_time = None
+
+    def update(self, frame, timestamp=None):
+        """22 values -> (2, 3) roll/pitch/yaw per hand. With timestamps, dt is measured (capped at 5x nominal)."""
+        accel, gyro = split_hands(np.asarray(frame, dtype=np.float64))
+        acc_rp = accel_angles(accel)
+        if self.state is None:
+            self.state = initial_state(acc_rp)
+        else:
+            dt = self.dt
+            if timestamp is not None and self.last_time is not None:
+                dt = min(max(timestamp - self.last_time, 0.0), 5 * self.dt)
+            self.state = step(self.state, gyro, acc_rp, accel_trust(accel), dt, self.alpha)
+        self.last_time = timestamp
+        return self.state
+
+# ======================================================
+# 5. CLI (Benchmark ทั้ง Dataset)
+# ======================================================
+def main():
+    parser = argparse.ArgumentParser(description="Fuse accel + gyro into per-hand orientation for a whole dataset")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--repeat", type=int, default=1, help="tile the dataset this many times for a larger benchmark")
+    parser.add_argument("--alpha", type=float, default=ALPHA)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.data_dir):
+        print(f"[!] ไม่พบโฟลเดอร์ {args.data_dir} ครับ")
+        return
+
+    X, _, _, lengths = load_dataset(detect_labels(args.data_dir), args.data_dir, return_files=True, return_lengths=True)
+    X = np.tile(X, (args.repeat, 1, 1))
+    # Take ถูก Resample เป็น EXPECTED_FRAMES เฟรม ระยะเวลาต่อเฟรมจึงไม่เท่ากับ DT และต่างกันทุก Take
+    dt = np.tile(resampled_dt(lengths, X.shape[1]), args.repeat)
+    start = time.perf_counter()
+    angles = fuse(X, dt, alpha=args.alpha)
+    batch_s = time.perf_counter() - start
+
+    filt = OrientationFilter(alpha=args.alpha)
+    frames = X[:min(len(X), 200)].reshape(-1, X.shape[-1])
+    start = time.perf_counter()
+    for i, frame in enumerate(frames):
+        if i % X.shape[1] == 0:
+            filt.reset()
+            filt.dt = dt[i // X.shape[1]]
+        filt.update(frame)
+    stream_us = (time.perf_counter() - start) / len(frames) * 1e6
+
+    # แบบ Batch และแบบทีละเฟรมต้องได้ผลเดียวกัน
+    check = fuse(X[0], dt[0], alpha=args.alpha)
+    filt.reset()
+    filt.dt = dt[0]
+    stream = np.array([filt.update(f) for f in X[0]])
+    print(f"--- {len(X)} takes x {X.shape[1]} frames fused in {batch_s*1000:.1f} ms "
+          f"({len(X) * X.shape[1] / batch_s:,.0f} frames/s) | streaming {stream_us:.1f} us/frame "
+          f"| batch == stream: {np.allclose(check, stream)} ---")
+    spread = np.degrees(np.abs(wrap(angles[:, -1] - angles[:, 0]))).mean(axis=0)
+    for h, hand in enumerate(HANDS):
+        print(f"   {hand:5s}: mean change over a take  roll {spread[h, 0]:6.1f}°  pitch {spread[h, 1]:6.1f}°  yaw {spread[h, 2]:6.1f}°")
+
+if __name__ == "__main__":
+    main()
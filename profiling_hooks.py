@@ -0,0 +1,294 @@
+import os
+import sys
+import time
+import socket
+import signal
+import argparse
+import threading
+import tracemalloc
+from collections import Counter
+
+# ======================================================
+# 1. Configuration
+# ======================================================
+# Server ที่รันนาน ๆ (inference_server_sv_xg_cl.py, data_collector.py, collector_server.py) เปิด Control Socket ไว้
+# สั่งจากอีก Terminal ได้โดยไม่ต้องหยุด Serial Loop:
+# python profiling_hooks.py profile start            -> เริ่ม Sampling Profiler (ทุก Thread, wall-clock)
+# python profiling_hooks.py profile stop             -> หยุดแล้วเขียน profiles/<server>_<time>.folded (flamegraph.pl / speedscope)
+# python profiling_hooks.py mem start                -> เริ่ม tracemalloc (งาน numpy ช้าลง ~3-4 เท่าระหว่างเปิด ปิดด้วย mem stop)
+# python profiling_hooks.py mem snapshot             -> เขียนจุดที่จองหน่วยความจำมากสุด + ที่โตขึ้นตั้งแต่ Snapshot ก่อน
+# python profiling_hooks.py status --port 50551      -> Server อื่น (Collector)
+# Linux/macOS ใช้ Signal แทนได้: kill -USR1 <pid> = เปิด/ปิด Profiler, kill -USR2 <pid> = เริ่ม tracemalloc / Snapshot
+PROFILE_DIR = "profiles"
+CONTROL_HOST = "127.0.0.1"   # รับคำสั่งจากเครื่องตัวเองเท่านั้น
+DEFAULT_PORT = 50550
+SAMPLE_INTERVAL = 0.005      # 200 Hz
+MAX_DEPTH = 64
+MEM_FRAMES = 1               # ความลึก Traceback ของ tracemalloc (มากขึ้น = ช้าลง + กิน RAM มากขึ้น)
+MEM_TOP = 25
+
+# ======================================================
+# 2. Sampling Profiler (Folded Stacks)
+# ======================================================
+class SamplingProfiler:
+    """
+    Wall-clock sampler on a background thread: every `interval` it reads every other thread's
+    current stack from sys._current_frames() and counts it. Nothing is hooked into the
+    interpreter, so the profiled threads run unchanged and there is no cost while stopped.
+    """
+    def __init__(self, interval=SAMPLE_INTERVAL, max_depth=MAX_DEPTH, ignore=()):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.ignore = set(ignore)   # Thread ident ที่ไม่ต้องเก็บ (เช่น Control Socket)
+        self.stacks = Counter()
+        self.samples = 0
+        self.sample_seconds = 0.0
+        self.started = None
+        self._names = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return self
+        self.stacks, self.samples, self.sample_seconds = Counter(), 0, 0.0
+        self.started = time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+        self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            start = time.perf_counter()
+            threads = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or ident in self.ignore:
+                    continue
+                codes = []
+                while frame is not None and len(codes) < self.max_depth:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                # เก็บเป็น Code Object ไว้ก่อน แปลงเป็นข้อความตอน Dump เท่านั้น
+                self.stacks[(threads.get(ident, str(ident)), tuple(codes))] += 1
+            self.samples += 1
+            self.sample_seconds += time.perf_counter() - start
+
+    def _label(self, code):
+        label = self._names.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._names[code] = label
+        return label
+
+    def folded(self):
+        """Lines "thread;outer;...;inner count", the collapsed format of flamegraph.pl and speedscope."""
+        merged = Counter()
+        for (thread, codes), count in list(self.stacks.items()):
+            merged[";".join([thread] + [self._label(c) for c in reversed(codes)])] += count
+        return [f"{stack} {count}" for stack, count in merged.most_common()]
+
+    def summary(self):
+        if self.started is None:
+            return "profiler: never started"
+        elapsed = time.time() - self.started
+        cost = self.sample_seconds / self.samples * 1e6 if self.samples else 0.0
+        state = "running" if self.running else "stopped"
+        return f"profiler: {state}, {self.samples} samples over {elapsed:.1f} s ({cost:.0f} us per sample)"
+
+# ======================================================
+# 3. Memory Snapshots (tracemalloc)
+# ======================================================
+class MemoryTracker:
+    """tracemalloc on demand; each report lists the top allocation sites and what grew since the last one."""
+    def __init__(self, frames=MEM_FRAMES, top=MEM_TOP):
+        self.frames = frames
+        self.top = top
+        self.previous = None
+
+    @property
+    def running(self):
+        return tracemalloc.is_tracing()
+
+    def start(self, frames=None):
+        if not self.running:
+            tracemalloc.start(frames or self.frames)
+            self.previous = None
+
+    def stop(self):
+        tracemalloc.stop()
+        self.previous = None
+
+    def report(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ])
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"# {time.strftime('%Y-%m-%d %H:%M:%S')} | traced {current / 1e6:.2f} MB (peak {peak / 1e6:.2f} MB) "
+                 f"| tracemalloc overhead {tracemalloc.get_tracemalloc_memory() / 1e6:.2f} MB", "",
+                 f"## Top {self.top} allocation sites (live memory)"]
+        lines += [f"{s.size / 1024:10.1f} KiB {s.count:8d} blocks  {s.traceback}" for s in snapshot.statistics("lineno")[:self.top]]
+        if self.previous is not None:
+            lines += ["", f"## Top {self.top} growth since the previous snapshot"]
+            diffs = [d for d in snapshot.compare_to(self.previous, "lineno") if d.size_diff > 0][:self.top]
+            lines += [f"{d.size_diff / 1024:+10.1f} KiB {d.count_diff:+8d} blocks  {d.traceback}" for d in diffs]
+        self.previous = snapshot
+        return lines, current
+
+# ======================================================
+# 4. Control (Socket + Signals)
+# ======================================================
+def write_lines(path, lines):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
+
+class ProfilingHooks:
+    """
+    Profiler + memory tracker for one server, driven by one-line commands from the control
+    socket (127.0.0.1:port), SIGUSR1/SIGUSR2 where the OS has them, or command() directly.
+    Files are written by the thread that received the command, never by the serial loop.
+    """
+    COMMANDS = ["profile start [interval_ms]", "profile stop", "profile dump", "mem start [frames]",
+                "mem snapshot", "mem stop", "status"]
+
+    def __init__(self, name, port=DEFAULT_PORT, out_dir=PROFILE_DIR):
+        self.name = name
+        self.port = port
+        self.out_dir = out_dir
+        self.profiler = SamplingProfiler()
+        self.memory = MemoryTracker()
+        self._lock = threading.Lock()
+        self._socket = None
+        self._thread = None
+
+    def install(self):
+        if self.port:
+            try:
+                self._socket = socket.create_server((CONTROL_HOST, self.port))
+            except OSError as e:
+                print(f"[PROFILE] ไม่สามารถเปิด Control Socket {CONTROL_HOST}:{self.port} ได้ครับ ({e})")
+            else:
+                self._thread = threading.Thread(target=self._serve, name="profiling-control", daemon=True)
+                self._thread.start()
+                self.profiler.ignore.add(self._thread.ident)
+        # signal.signal ใช้ได้เฉพาะ Main Thread และไม่มี SIGUSR บน Windows
+        if hasattr(signal, "SIGUSR1") and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGUSR1, lambda *_: self._in_background("profile stop" if self.profiler.running else "profile start"))
+            signal.signal(signal.SIGUSR2, lambda *_: self._in_background("mem snapshot" if self.memory.running else "mem start"))
+        return self
+
+    def close(self):
+        """Stops everything; a profile or memory trace still running is written out first."""
+        if self.profiler.running:
+            print(self.command("profile stop"))
+        if self.memory.running:
+            print(self.command("mem snapshot"))
+            self.memory.stop()
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def _in_background(self, text):
+        # Signal Handler รันบน Main Thread (Serial Loop) -> ส่งงานเขียนไฟล์ไป Thread อื่น
+        threading.Thread(target=lambda: print(self.command(text)), daemon=True).start()
+
+    def _serve(self):
+        while self._socket is not None:
+            try:
+                conn, _ = self._socket.accept()
+            except OSError:
+                return  # close()
+            with conn:
+                try:
+                    conn.settimeout(5.0)
+                    text = conn.makefile("r", encoding="utf-8").readline().strip()
+                    reply = self.command(text)
+                    print(reply)
+                    conn.sendall((reply + "\n").encode("utf-8"))
+                except OSError:
+                    pass
+
+    def _path(self, kind, ext):
+        return os.path.join(self.out_dir, f"{self.name}_{kind}_{time.strftime('%Y%m%d-%H%M%S')}.{ext}")
+
+    def command(self, text):
+        """Runs one command and returns a one-line reply."""
+        words = text.split()
+        with self._lock:
+            try:
+                return "[PROFILE] " + self._command(words)
+            except Exception as e:
+                return f"[PROFILE] error: {e}"
+
+    def _command(self, words):
+        action = " ".join(words[:2])
+        if action == "profile start":
+            if self.profiler.running:
+                return "profiler already running"
+            if len(words) > 2:
+                self.profiler.interval = float(words[2]) / 1000
+            self.profiler.start()
+            return f"profiler started ({self.profiler.interval * 1000:.1f} ms interval)"
+        if action in ("profile stop", "profile dump"):
+            if action == "profile stop":
+                self.profiler.stop()
+            if not self.profiler.samples:
+                return "no samples (profile start first)"
+            path = self._path("profile", "folded")
+            write_lines(path, self.profiler.folded())
+            return f"{self.profiler.summary()} -> {path}"
+        if action == "mem start":
+            self.memory.start(int(words[2]) if len(words) > 2 else None)
+            return f"tracemalloc started ({tracemalloc.get_traceback_limit()} frames)"
+        if action == "mem snapshot":
+            if not self.memory.running:
+                return "tracemalloc is not running (mem start first)"
+            lines, current = self.memory.report()
+            path = self._path("mem", "txt")
+            write_lines(path, lines)
+            return f"traced {current / 1e6:.2f} MB -> {path}"
+        if action == "mem stop":
+            self.memory.stop()
+            return "tracemalloc stopped"
+        if action == "status":
+            memory = f"tracemalloc {tracemalloc.get_traced_memory()[0] / 1e6:.2f} MB" if self.memory.running else "tracemalloc off"
+            return f"{self.name} (pid {os.getpid()}) | {self.profiler.summary()} | {memory}"
+        return "commands: " + ", ".join(self.COMMANDS)
+
+# ======================================================
+# 5. CLI (ส่งคำสั่งไปยัง Server ที่รันอยู่)
+# ======================================================
+def send_command(text, port=DEFAULT_PORT, host=CONTROL_HOST, timeout=30.0):
+    with socket.create_connection((host, port), timeout=timeout) as conn:
+        conn.sendall((text + "\n").encode("utf-8"))
+        return conn.makefile("r", encoding="utf-8").readline().strip()
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile or snapshot the memory of a running server")
+    parser.add_argument("command", nargs="+", help=" | ".join(ProfilingHooks.COMMANDS))
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="inference 50550, collector 50551")
+    parser.add_argument("--host", default=CONTROL_HOST)
+    args = parser.parse_args()
+    try:
+        print(send_command(" ".join(args.command), args.port, args.host))
+    except OSError as e:
+        print(f"[!] ติดต่อ Server ที่ {args.host}:{args.port} ไม่ได้ครับ ({e})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import os
+import time
+import argparse
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import matplotlib
+matplotlib.use("Agg")  # ไม่เปิดหน้าต่าง (ต้องเรียกก่อน import pyplot / simulation)
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib import animation
+from PIL import Image
+
+from gesture_utils import DATA_DIR, parse_take_name, read_take
+from simulation import CAPTURE_HZ, ORIENTATION_FUSION, create_hand_artists, hand_artists, set_pose, take_poses
+from orientation import fuse, angles_by_hand
+
+# ======================================================
+# 1. Configuration
+# ======================================================
+# python render_takes.py dataset_cf/hello                     -> GIF ทุก Take ในโฟลเดอร์ hello
+# python render_takes.py dataset_cf --format png --frames 8   -> Contact Sheet ทุก Take ทุกท่า
+OUTPUT_DIR = "renders"
+FORMATS = ["gif", "mp4", "png"]
+FIG_SIZE = (4.8, 4.0)
+DPI = 80
+SHEET_FRAMES = 6         # จำนวนเฟรมตัวอย่างต่อ Take ใน Contact Sheet
+GIF_COLORS = 64
+
+# ======================================================
+# 2. Worker (1 Figure ต่อ Process ใช้ซ้ำทุก Take)
+# ======================================================
+# แกน 3D ไม่เปลี่ยน จึงวาดพื้นหลังครั้งเดียวต่อ Process แล้ววาดเฉพาะเส้นมือทับทุกเฟรม (Blitting)
+_fig, _lines, _label, _background, _options = None, None, None, None, None
+
+def _init_worker(options):
+    global _fig, _lines, _label, _background, _options
+    _options = options
+    _fig = plt.figure(figsize=FIG_SIZE, dpi=options["dpi"])
+    ax = _fig.add_subplot(111, projection='3d')
+    _lines = create_hand_artists(ax)
+    _label = ax.text2D(0.02, 0.97, "", transform=ax.transAxes, fontsize=7, va='top')
+    _fig.canvas.draw()
+    _background = _fig.canvas.copy_from_bbox(_fig.bbox)
+
+def _poses(frames):
+    return take_poses(frames, angles_by_hand(fuse(frames)) if _options["fusion"] else None)
+
+def _frame_images(poses, indices, title, total):
+    """Yields an RGB array per frame index, redrawing only the hand artists and the label."""
+    canvas = _fig.canvas
+    for f in indices:
+        set_pose(_lines, poses, f)
+        _label.set_text(f"{title}\nframe {f + 1}/{total}")
+        canvas.restore_region(_background)
+        for artist in hand_artists(_lines) + [_label]:
+            artist.axes.draw_artist(artist)
+        yield np.asarray(canvas.buffer_rgba())[..., :3].copy()
+
+def _save_gif(images, path, fps):
+    # ภาพมีสีไม่กี่สี: ทำ Palette ครั้งเดียวจากเฟรมแรกแล้วใช้กับทุกเฟรม (เร็วกว่าให้ Pillow หา Palette ใหม่ทุกเฟรมมาก)
+    frames = [Image.fromarray(img) for img in images]
+    palette = frames[0].quantize(colors=GIF_COLORS, method=Image.Quantize.FASTOCTREE)
+    frames = [f.quantize(palette=palette, dither=Image.Dither.NONE) for f in frames]
+    frames[0].save(path, format="GIF", save_all=True, append_images=frames[1:], duration=int(round(1000 / fps)), loop=0)
+
+def _save_mp4(images, path, fps):
+    images = iter(images)
+    first = next(images)
+    height, width = first.shape[:2]
+    cmd = [matplotlib.rcParams["animation.ffmpeg_path"], "-y", "-loglevel", "error", "-f", "rawvideo",
+           "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", f"{fps:g}", "-i", "-",
+           "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-c:v", "libx264", "-pix_fmt", "yuv420p", "-f", "mp4", path]
+    with subprocess.Popen(cmd, stdin=subprocess.PIPE) as proc:
+        proc.stdin.write(first.tobytes())
+        for img in images:
+            proc.stdin.write(img.tobytes())
+        proc.stdin.close()
+        if proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg exited with code {proc.returncode}")
+
+def render_take(path, out_path):
+    """Renders one take with the worker's figure. Returns (out_path, frames, seconds) or raises."""
+    start = time.perf_counter()
+    frames = read_take(path)
+    poses = _poses(frames)
+    title = os.path.basename(path)
+    fmt, step = _options["format"], _options["step"]
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+
+    if fmt == "png":
+        # Contact Sheet: เฟรมตัวอย่างเรียงต่อกันในภาพเดียว
+        indices = np.unique(np.linspace(0, len(frames) - 1, _options["sheet_frames"]).round().astype(int))
+        images = list(_frame_images(poses, indices, title, len(frames)))
+        Image.fromarray(np.hstack(images)).save(out_path)
+    else:
+        indices = range(0, len(frames), step)
+        images = _frame_images(poses, indices, title, len(frames))
+        tmp = out_path + ".part"
+        (_save_mp4 if fmt == "mp4" else _save_gif)(images, tmp, _options["fps"] / step)
+        os.replace(tmp, out_path)  # ไม่มีไฟล์ครึ่งๆ กลางๆ ถ้าถูกหยุดกลางคัน
+    return out_path, len(indices), time.perf_counter() - start
+
+# ======================================================
+# 3. Jobs
+# ======================================================
+def collect_jobs(paths, out_dir, fmt, force=False):
+    """(source, output) for every take CSV under the given files/folders; skips outputs newer than their source."""
+    ext = "png" if fmt == "png" else fmt
+    sources = []
+    for path in paths:
+        if os.path.isfile(path):
+            sources.append(path)
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith(("_", ".")))
+            gesture = os.path.basename(root)
+            sources += [os.path.join(root, f) for f in sorted(files)
+                        if f.endswith(".csv") and parse_take_name(f, gesture) is not None]
+    jobs, skipped = [], 0
+    for src in sources:
+        gesture = os.path.basename(os.path.dirname(os.path.abspath(src)))
+        dst = os.path.join(out_dir, gesture, os.path.splitext(os.path.basename(src))[0] + "." + ext)
+        if not force and os.path.exists(dst) and os.path.getmtime(dst) >= os.path.getmtime(src):
+            skipped += 1
+            continue
+        jobs.append((src, dst))
+    return jobs, skipped
+
+def render_all(jobs, options, workers=None):
+    done, failed, frames = 0, [], 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(options,)) as pool:
+        futures = {pool.submit(render_take, src, dst): src for src, dst in jobs}
+        for future in as_completed(futures):
+            src = futures[future]
+            try:
+                out_path, drawn, seconds = future.result()
+                done += 1
+                frames += drawn
+                print(f"   [{done + len(failed)}/{len(jobs)}] {out_path} ({drawn} frames, {seconds:.1f} s)")
+            except Exception as e:
+                failed.append((src, str(e)))
+                print(f"   [ERROR] {src}: {e}")
+    return done, failed, frames
+
+# ======================================================
+# 4. CLI
+# ======================================================
+def main():
+    parser = argparse.ArgumentParser(description="Render takes headlessly to GIF / MP4 / PNG contact sheets")
+    parser.add_argument("paths", nargs="*", default=[DATA_DIR], help="take CSVs, gesture folders or the dataset folder")
+    parser.add_argument("--format", choices=FORMATS, default="gif")
+    parser.add_argument("--out", default=OUTPUT_DIR)
+    parser.add_argument("--fps", type=float, default=CAPTURE_HZ)
+    parser.add_argument("--step", type=int, default=1, help="render every n-th frame (faster, playback speed unchanged)")
+    parser.add_argument("--frames", type=int, default=SHEET_FRAMES, help="frames per contact sheet")
+    parser.add_argument("--dpi", type=int, default=DPI)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--force", action="store_true", help="re-render outputs that are already up to date")
+    parser.add_argument("--accel-only", action="store_true", help="tilt from the accelerometer only (no gyro, yaw = 0)")
+    args = parser.parse_args()
+
+    missing = [p for p in args.paths if not os.path.exists(p)]
+    if missing:
+        print(f"[!] ไม่พบ {', '.join(missing)} ครับ")
+        return
+    if args.format == "mp4" and not animation.FFMpegWriter.isAvailable():
+        print("[!] ไม่พบ ffmpeg ในเครื่อง ติดตั้งก่อน หรือใช้ --format gif แทนครับ")
+        return
+
+    jobs, skipped = collect_jobs(args.paths, args.out, args.format, args.force)
+    print(f"--- {len(jobs)} takes to render as {args.format} ({skipped} up to date) ---")
+    if not jobs:
+        return
+
+    options = {"format": args.format, "fps": args.fps, "step": max(1, args.step), "sheet_frames": args.frames,
+               "dpi": args.dpi, "fusion": ORIENTATION_FUSION and not args.accel_only}
+    start = time.perf_counter()
+    done, failed, frames = render_all(jobs, options, args.workers)
+    elapsed = time.perf_counter() - start
+    print(f"\n[DONE] {done} takes, {frames} frames in {elapsed:.1f} s ({frames / max(elapsed, 1e-9):.0f} frames/s) -> '{args.out}'")
+    if failed:
+        print(f"[!] {len(failed)} takes failed (see errors above)")
+
+if __name__ == "__main__":
+    main()
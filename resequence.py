@@ -0,0 +1,304 @@
+import os
+import re
+import json
+import time
+import argparse
+from datetime import datetime
+
+from gesture_utils import DATA_DIR, PACK_EXT
+from take_index import TakeIndex
+from take_catalog import CATALOG_FILE, TakeCatalog
+from take_writer import fsync_dir
+
+# ======================================================
+# 1. Configuration
+# ======================================================
+# แทน edit_file.py: เรียง seq ใหม่เป็น 001, 002, ... ต่อ (ผู้ใช้, ท่าทาง) ทั้ง Dataset ในครั้งเดียว
+# ห้ามรันพร้อมกับ data_collector / collector_server (จะได้ seq ชนกัน)
+JOURNAL_FILE = ".resequence_journal.jsonl"  # อยู่ใน DATA_DIR ระหว่างทำงาน ลบทิ้งเมื่อเสร็จ
+JOURNAL_VERSION = 1
+TEMP_PREFIX = ".reseq_"                     # ชื่อชั่วคราว (ขึ้นต้นด้วย "." จึงไม่ถูกนับเป็น Take)
+TAKE_EXTENSIONS = [".csv", PACK_EXT]        # ไฟล์ทุกนามสกุลของ Take เดียวกันถูกเปลี่ยนชื่อไปด้วยกัน
+ORDERS = ["name", "mtime"]
+
+# ======================================================
+# 2. Scan & Plan
+# ======================================================
+def scan(data_dir):
+    """
+    One scandir per gesture folder -> {gesture: {stem: {"user", "date", "seq", "exts", "mtime"}}}.
+    A stem is '{name}_{gesture}_{mmddyy}_{seq}'; every extension in TAKE_EXTENSIONS sharing it is one take.
+    """
+    ext_pattern = "|".join(re.escape(e) for e in TAKE_EXTENSIONS)
+    listing = {}
+    with os.scandir(data_dir) as it:
+        gestures = [e.name for e in it if e.is_dir() and not e.name.startswith(("_", "."))]
+    for gesture in gestures:
+        pattern = re.compile(rf"((.+)_{re.escape(gesture)}_(\d{{6}})_(\d+))({ext_pattern})")
+        takes = {}
+        with os.scandir(os.path.join(data_dir, gesture)) as it:
+            for entry in it:
+                match = pattern.fullmatch(entry.name)
+                if match is None or not entry.is_file():
+                    continue
+                stem, user, date, seq, ext = match.groups()
+                take = takes.setdefault(stem, {"user": user, "date": date, "seq": int(seq), "exts": [], "mtime": None})
+                take["exts"].append(ext)
+                if ext == ".csv" or take["mtime"] is None:
+                    take["mtime"] = entry.stat().st_mtime_ns
+        listing[gesture] = takes
+    return listing
+
+def recording_order(order):
+    if order == "mtime":
+        # เวลาที่ไฟล์ถูกเขียน (ใช้ได้ถ้าไม่เคยคัดลอกไฟล์แบบไม่รักษาเวลา)
+        return lambda item: (item[1]["mtime"], item[0])
+    # mmddyy -> yymmdd และ seq เป็นตัวเลข: ชื่อไฟล์เรียงตามตัวอักษรไม่ตรงกับลำดับที่อัด
+    # (ข้ามปี, seq >= 1000) จึงไม่ใช้ sort ชื่อไฟล์ตรงๆ แบบ edit_file.py
+    return lambda item: (item[1]["date"][4:] + item[1]["date"][:4], item[1]["seq"], item[0])
+
+def plan(listing, order="name"):
+    """
+    -> (moves, index_listing). moves is [(gesture, old_name, new_name), ...] for files whose name changes;
+    index_listing is the TakeIndex view of the dataset after the moves.
+    """
+    moves = []
+    index_listing = {}
+    key = recording_order(order)
+    for gesture, takes in listing.items():
+        by_user = {}
+        for item in takes.items():
+            by_user.setdefault(item[1]["user"], []).append(item)
+        users = index_listing.setdefault(gesture, {})
+        for user, items in by_user.items():
+            items.sort(key=key)
+            for seq, (stem, take) in enumerate(items, start=1):
+                new_stem = f"{user}_{gesture}_{take['date']}_{seq:03d}"
+                if ".csv" in take["exts"]:
+                    users.setdefault(user, []).append((seq, new_stem + ".csv"))
+                if new_stem != stem:
+                    moves += [(gesture, stem + ext, new_stem + ext) for ext in take["exts"]]
+    return moves, index_listing
+
+def split_phases(moves):
+    """
+    Renames whose target is free happen in one step. A target that is still another take's
+    current name (A->B while B->C) goes through a temporary name in a second phase.
+    """
+    sources = {(g, old) for g, old, _ in moves}
+    phase1, phase2 = [], []
+    for gesture, old, new in moves:
+        if (gesture, new) in sources:
+            temp = TEMP_PREFIX + new
+            phase1.append((gesture, old, temp))
+            phase2.append((gesture, temp, new))
+        else:
+            phase1.append((gesture, old, new))
+    return phase1, phase2
+
+# ======================================================
+# 3. Journal
+# ======================================================
+class Journal:
+    """
+    Line 1: the full plan. Following lines: {"phase": n} markers, appended and fsynced when a phase
+    completes. Every rename is idempotent given the marker (source present -> not done yet,
+    target present -> done), so an interrupted run can be resumed or rolled back from the file alone.
+    """
+    def __init__(self, data_dir):
+        self.path = os.path.join(data_dir, JOURNAL_FILE)
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def create(self, data_dir, order, phase1, phase2):
+        header = {"version": JOURNAL_VERSION, "data_dir": os.path.abspath(data_dir), "order": order,
+                  "created": datetime.now().isoformat(timespec="seconds"), "phase1": phase1, "phase2": phase2}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps(header, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        fsync_dir(os.path.dirname(self.path))
+
+    def mark(self, phase):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"phase": phase}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def load(self):
+        """-> (header, completed phases)."""
+        with open(self.path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        header = json.loads(lines[0])
+        if header.get("version") != JOURNAL_VERSION:
+            raise ValueError(f"unsupported journal version {header.get('version')}")
+        done = set()
+        for line in lines[1:]:
+            try:
+                done.add(json.loads(line)["phase"])
+            except (ValueError, KeyError):
+                break  # บรรทัดสุดท้ายเขียนไม่จบตอนเครื่องดับ
+        return header, done
+
+    def remove(self):
+        os.remove(self.path)
+        fsync_dir(os.path.dirname(self.path))
+
+# ======================================================
+# 4. Execute / Resume / Rollback
+# ======================================================
+def apply(data_dir, ops, reverse=False):
+    """Runs one phase (or undoes it); ops already applied are skipped. Returns the number of renames."""
+    renamed = 0
+    touched = set()
+    for gesture, src, dst in (reversed(ops) if reverse else ops):
+        if reverse:
+            src, dst = dst, src
+        folder = os.path.join(data_dir, gesture)
+        try:
+            os.rename(os.path.join(folder, src), os.path.join(folder, dst))
+            renamed += 1
+            touched.add(folder)
+        except FileNotFoundError:
+            if not os.path.exists(os.path.join(folder, dst)):
+                raise RuntimeError(f"{gesture}/{src} and {gesture}/{dst} are both missing") from None
+    for folder in touched:
+        fsync_dir(folder)
+    return renamed
+
+def update_index(data_dir, index_listing=None, gestures=()):
+    # ได้รายชื่อจากการสแกนครั้งเดียวอยู่แล้ว ไม่ต้องให้ TakeIndex สแกนซ้ำ
+    index = TakeIndex(data_dir, scan=index_listing is None)
+    if index_listing is not None:
+        for gesture, users in index_listing.items():
+            index.set_gesture(gesture, users)
+    else:
+        for gesture in gestures:
+            index.refresh(gesture)
+    index.save()
+
+def update_catalog(data_dir, moves=None, gestures=()):
+    # อัปเดตเฉพาะเมื่อมี Catalog อยู่แล้ว (ไม่สร้างใหม่ให้)
+    if not os.path.exists(os.path.join(data_dir, CATALOG_FILE)):
+        return
+    catalog = TakeCatalog(data_dir)
+    try:
+        if moves is not None:
+            catalog.rename([(f"{g}/{old}", f"{g}/{new}") for g, old, new in moves if new.endswith(".csv")])
+        else:
+            catalog.rescan(sorted(gestures))
+    finally:
+        catalog.close()
+
+def run_phases(data_dir, journal, header, done):
+    renamed = 0
+    for phase in (1, 2):
+        if phase not in done:
+            renamed += apply(data_dir, header[f"phase{phase}"])
+            journal.mark(phase)
+    return renamed
+
+def resequence(data_dir=DATA_DIR, order="name", dry_run=False):
+    """Plans every rename from one scan, then executes it under a journal. Returns a summary dict."""
+    journal = Journal(data_dir)
+    if journal.exists():
+        raise RuntimeError(f"unfinished run found ({journal.path}); resume or roll it back first")
+
+    timings = {}
+    start = time.perf_counter()
+    listing = scan(data_dir)
+    timings["scan_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    moves, index_listing = plan(listing, order)
+    phase1, phase2 = split_phases(moves)
+    timings["plan_s"] = time.perf_counter() - start
+    summary = {"takes": sum(len(t) for t in listing.values()), "renames": len(moves), "two_step": len(phase2),
+               "moves": moves, **timings}
+    if dry_run or not moves:
+        return summary
+
+    start = time.perf_counter()
+    journal.create(data_dir, order, phase1, phase2)
+    run_phases(data_dir, journal, {"phase1": phase1, "phase2": phase2}, set())
+    update_index(data_dir, index_listing)
+    update_catalog(data_dir, moves)
+    journal.remove()
+    summary["execute_s"] = time.perf_counter() - start
+    return summary
+
+def resume(data_dir=DATA_DIR):
+    journal = Journal(data_dir)
+    header, done = journal.load()
+    renamed = run_phases(data_dir, journal, header, done)
+    gestures = {g for g, _, _ in header["phase1"]}
+    update_index(data_dir, gestures=gestures)
+    update_catalog(data_dir, gestures=gestures)
+    journal.remove()
+    return renamed
+
+def rollback(data_dir=DATA_DIR):
+    journal = Journal(data_dir)
+    header, done = journal.load()
+    renamed = 0
+    # Phase 2 ย้อนได้ก็ต่อเมื่อเริ่มไปแล้ว (Phase 1 เสร็จ) ไม่งั้นชื่อปลายทางยังเป็นไฟล์ต้นฉบับอยู่
+    if 1 in done:
+        renamed += apply(data_dir, header["phase2"], reverse=True)
+    renamed += apply(data_dir, header["phase1"], reverse=True)
+    gestures = {g for g, _, _ in header["phase1"]}
+    update_index(data_dir, gestures=gestures)
+    update_catalog(data_dir, gestures=gestures)
+    journal.remove()
+    return renamed
+
+# ======================================================
+# 5. CLI
+# ======================================================
+def main():
+    parser = argparse.ArgumentParser(description="Renumber every user's takes per gesture as 001, 002, ... in recording order")
+    parser.add_argument("data_dir", nargs="?", default=DATA_DIR)
+    parser.add_argument("--order", choices=ORDERS, default="name",
+                        help="name: by date then old sequence number; mtime: by file modification time")
+    parser.add_argument("--dry-run", action="store_true", help="print the plan without renaming")
+    parser.add_argument("--resume", action="store_true", help="finish an interrupted run")
+    parser.add_argument("--rollback", action="store_true", help="undo an interrupted run")
+    parser.add_argument("--verbose", action="store_true", help="list every rename")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.data_dir):
+        print(f"[!] ไม่พบโฟลเดอร์ '{args.data_dir}' ครับ")
+        return
+
+    journal = Journal(args.data_dir)
+    if args.resume or args.rollback:
+        if not journal.exists():
+            print("[!] ไม่มีงานที่ค้างอยู่ครับ")
+            return
+        renamed = resume(args.data_dir) if args.resume else rollback(args.data_dir)
+        print(f"[DONE] {'Resumed' if args.resume else 'Rolled back'}: {renamed} renames")
+        return
+    if journal.exists():
+        print(f"[!] พบงานที่ค้างอยู่ ({JOURNAL_FILE}) ใช้ --resume เพื่อทำต่อ หรือ --rollback เพื่อย้อนกลับก่อนครับ")
+        return
+
+    summary = resequence(args.data_dir, args.order, args.dry_run)
+    if args.verbose or args.dry_run:
+        for gesture, old, new in summary["moves"][:None if args.verbose else 20]:
+            print(f"  [RENAME] {gesture}/{old}  ->  {new}")
+        if not args.verbose and len(summary["moves"]) > 20:
+            print(f"  ... {len(summary['moves']) - 20} more")
+    print(f"\n--- {summary['takes']} takes | {summary['renames']} renames ({summary['two_step']} via temp name) | "
+          f"scan {summary['scan_s']:.2f} s, plan {summary['plan_s']:.2f} s"
+          + (f", execute {summary['execute_s']:.2f} s" if "execute_s" in summary else "") + " ---")
+    if args.dry_run:
+        print("[DRY RUN] ยังไม่ได้เปลี่ยนชื่อไฟล์ใดๆ ครับ")
+    elif summary["renames"] == 0:
+        print("[✔] ลำดับถูกต้องอยู่แล้วครับ")
+    else:
+        print("[✔] เสร็จสิ้นการเปลี่ยนชื่อไฟล์ทั้งหมดแล้วครับ!")
+
+if __name__ == "__main__":
+    main()
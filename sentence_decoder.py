@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+
+from gesture_utils import LABELS_FILE, load_labels_map
+
+# ======================================================
+# 1. Configuration
+# ======================================================
+# python sentence_decoder.py build   -> สร้าง Bigram จากวลีตั้งต้น + ประวัติการใช้งานจริง (usage_log.jsonl)
+# python sentence_decoder.py eval    -> เทียบ Beam Search + Bigram กับการเลือกคำที่มั่นใจสุดทีละท่า (ข้อมูลจำลอง)
+USAGE_LOG = "usage_log.jsonl"   # Server เขียนทุกท่าที่ทายได้ (เวลา, ผู้ใช้, Label, ความมั่นใจ, จบประโยค)
+LM_FILE = "phrase_lm.json"
+SENTENCE_GAP_SEC = 4.0          # ท่าในประวัติที่ห่างกันเกินนี้ถือเป็นคนละประโยค
+SEED_WEIGHT = 3.0               # วลีตั้งต้นนับเท่ากับเห็นในประวัติกี่ครั้ง
+INTERPOLATION = 0.7             # P(w|v) = 0.7 * Bigram + 0.3 * Unigram (ไม่มีคู่ไหนเป็น 0)
+BEAM_WIDTH = 8
+LM_WEIGHT = 0.3                 # น้ำหนัก Language Model เทียบกับ log-prob ของโมเดลท่าทาง (มากไปจะดึงวลีที่ไม่เคยเห็นผิด)
+MAX_WORDS = 12
+
+# วลีที่ใช้บ่อย (Label ของ Dataset) ใช้เป็นฐานก่อนมีประวัติการใช้งานมากพอ
+SEED_PHRASES = [
+    ["hello"], ["thanks"], ["sorry"], ["help"], ["wait"], ["yes"], ["no"],
+    ["hello", "me", "hungry"], ["me", "hungry"], ["me", "i_am_full"], ["me", "hurt"], ["me", "go", "toilet"],
+    ["me", "go", "home"], ["you", "go", "home"], ["you", "hungry"], ["you", "hurt"], ["mother", "come_here"],
+    ["father", "come_here"], ["mother", "help"], ["me", "water"], ["help", "me"], ["wait", "me"],
+    ["thanks", "mother"], ["thanks", "father"], ["sorry", "mother"], ["me", "telephone", "mother"],
+    ["you", "come_here"], ["toilet"], ["water"], ["yes", "thanks"], ["no", "thanks"],
+]
+
+# ======================================================
+# 2. Usage Log
+# ======================================================
+def log_usage(entry, path=USAGE_LOG):
+    """Appends one event ({"label", "conf", "user"} or {"event": "end"}) with a timestamp."""
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"t": round(time.time(), 3), **entry}, ensure_ascii=False) + "\n")
+
+def logged_sentences(path=USAGE_LOG, gap=SENTENCE_GAP_SEC):
+    """Label sequences from the usage log, split at "end" events and at pauses longer than gap."""
+    if not os.path.exists(path):
+        return []
+    sentences, current, last_t = [], [], None
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # บรรทัดท้ายที่เขียนไม่จบ
+            if last_t is not None and entry["t"] - last_t > gap and current:
+                sentences.append(current)
+                current = []
+            last_t = entry["t"]
+            if entry.get("event") == "end":
+                if current:
+                    sentences.append(current)
+                current = []
+            elif "label" in entry:
+                current.append(entry["label"])
+    if current:
+        sentences.append(current)
+    return sentences
+
+# ======================================================
+# 3. Bigram Language Model
+# ======================================================
+BOS, EOS = "<s>", "</s>"
+
+def count_bigrams(sentences, weight=1.0, counts=None):
+    counts = counts if counts is not None else {}
+    for sentence in sentences:
+        tokens = [BOS] + list(sentence) + [EOS]
+        for prev, word in zip(tokens, tokens[1:]):
+            counts.setdefault(prev, {})
+            counts[prev][word] = counts[prev].get(word, 0.0) + weight
+    return counts
+
+def build_lm(sentences, seed=SEED_PHRASES, seed_weight=SEED_WEIGHT):
+    counts = count_bigrams(seed, seed_weight)
+    count_bigrams(sentences, 1.0, counts)
+    return {"counts": counts, "sentences": len(sentences), "built": time.strftime("%Y-%m-%d %H:%M:%S")}
+
+def save_lm(lm, path=LM_FILE):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(lm, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+def load_lm(path=LM_FILE):
+    """Saved counts, or the seed phrases alone when no model has been built yet."""
+    if not os.path.exists(path):
+        return build_lm([])
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def lm_matrix(lm, labels_map, interpolation=INTERPOLATION):
+    """
+    log P(word | prev) as a dense (C + 1, C + 1) array for the current label map: rows are the
+    previous class (row C = sentence start), columns the next class (column C = sentence end).
+    Interpolated with an add-one unigram so gestures never seen together still get a score.
+    """
+    names = [labels_map[i] for i in range(len(labels_map))]
+    index = {name: i for i, name in enumerate(names)}
+    index[BOS] = index[EOS] = len(names)
+    size = len(names) + 1
+    bigram = np.zeros((size, size))
+    for prev, nexts in lm["counts"].items():
+        if prev not in index:
+            continue
+        for word, count in nexts.items():
+            if word in index:
+                bigram[index[prev], index[word]] += count
+    unigram = bigram.sum(axis=0) + 1.0
+    unigram /= unigram.sum()
+    rows = bigram.sum(axis=1, keepdims=True)
+    conditional = np.divide(bigram, rows, out=np.zeros_like(bigram), where=rows > 0)
+    weight = np.where(rows > 0, interpolation, 0.0)
+    return np.log(weight * conditional + (1 - weight) * unigram)
+
+# ======================================================
+# 4. Incremental Beam Search
+# ======================================================
+class BeamDecoder:
+    """
+    Keeps the best `beam` label sequences while gestures arrive. Each step scores every
+    (hypothesis, class) pair in one (beam, classes) array: hypothesis score + log p(class)
+    + LM_WEIGHT * log P(class | last label). finish() adds the end-of-sentence score.
+    """
+    def __init__(self, log_lm, beam=BEAM_WIDTH, lm_weight=LM_WEIGHT, max_words=MAX_WORDS):
+        self.log_lm = log_lm * lm_weight
+        self.num_classes = log_lm.shape[0] - 1
+        self.beam, self.max_words = beam, max_words
+        self.reset()
+
+    def reset(self):
+        self.scores = np.zeros(1)
+        self.last = np.array([self.num_classes])  # ทุกสมมติฐานเริ่มจาก <s>
+        self.sequences = [()]
+
+    def __len__(self):
+        return len(self.sequences[0])
+
+    def step(self, probs):
+        """Extends every hypothesis with one gesture's probability vector (num_classes,)."""
+        log_p = np.log(np.clip(probs, 1e-8, 1.0))
+        candidates = self.scores[:, np.newaxis] + self.log_lm[self.last, :self.num_classes] + log_p
+        flat = candidates.ravel()
+        k = min(self.beam, flat.size)
+        top = np.argpartition(-flat, k - 1)[:k]
+        top = top[np.argsort(-flat[top])]
+        rows, cols = np.divmod(top, self.num_classes)
+        self.scores, self.last = flat[top], cols
+        self.sequences = [self.sequences[r] + (int(c),) for r, c in zip(rows, cols)]
+
+    def best(self, final=False):
+        """(label indices, score) of the best hypothesis; final=True includes P(</s> | last)."""
+        scores = self.scores + (self.log_lm[self.last, self.num_classes] if final else 0.0)
+        i = int(np.argmax(scores))
+        return list(self.sequences[i]), float(scores[i])
+
+    def finish(self):
+        sequence, _ = self.best(final=True)
+        self.reset()
+        return sequence
+
+# ======================================================
+# 5. Evaluation (จำลองโมเดลที่ทายผิดบ้าง)
+# ======================================================
+def simulate_probs(rng, label, num_classes, accuracy, confusion):
+    """A probability vector from a classifier that is right `accuracy` of the time and otherwise
+    prefers one of the class's `confusion` look-alikes."""
+    logits = rng.normal(0, 0.5, num_classes)
+    target = label if rng.random() < accuracy else confusion[label][rng.integers(len(confusion[label]))]
+    logits[target] += 2.5
+    logits[label] += 1.2 if target != label else 0.0
+    probs = np.exp(logits - logits.max())
+    return probs / probs.sum()
+
+def word_errors(reference, hypothesis):
+    """Levenshtein distance between two label sequences."""
+    d = np.arange(len(hypothesis) + 1)
+    for i, r in enumerate(reference, 1):
+        prev, d[0] = d[0], i
+        for j, h in enumerate(hypothesis, 1):
+            prev, d[j] = d[j], min(d[j] + 1, d[j - 1] + 1, prev + (r != h))
+    return int(d[-1])
+
+def evaluate(labels_map, lm, trials=2000, accuracy=0.8, novel=False, seed=0):
+    """
+    Word error rate of greedy argmax vs the decoder on phrases from the seed list and log, or
+    (novel=True) on random 1-4 gesture sequences the language model has never seen.
+    """
+    rng = np.random.default_rng(seed)
+    index = {v: k for k, v in labels_map.items()}
+    num_classes = len(labels_map)
+    if novel:
+        phrases = [list(rng.integers(num_classes, size=rng.integers(1, 5))) for _ in range(500)]
+    else:
+        phrases = [[index[w] for w in p] for p in SEED_PHRASES + logged_sentences() if all(w in index for w in p)]
+    confusion = {c: list(rng.choice([x for x in range(num_classes) if x != c], 2, replace=False)) for c in range(num_classes)}
+    decoder = BeamDecoder(lm_matrix(lm, labels_map))
+    errors = {"greedy": 0, "beam": 0}
+    words, step_times = 0, []
+    for _ in range(trials):
+        phrase = phrases[rng.integers(len(phrases))]
+        greedy = []
+        for label in phrase:
+            probs = simulate_probs(rng, label, num_classes, accuracy, confusion)
+            greedy.append(int(np.argmax(probs)))
+            start = time.perf_counter()
+            decoder.step(probs)
+            step_times.append((time.perf_counter() - start) * 1e6)
+        errors["greedy"] += word_errors(phrase, greedy)
+        errors["beam"] += word_errors(phrase, decoder.finish())
+        words += len(phrase)
+    return {k: v / words for k, v in errors.items()}, np.array(step_times)
+
+# ======================================================
+# 6. CLI
+# ======================================================
+def main():
+    parser = argparse.ArgumentParser(description="Bigram phrase model and beam-search sentence decoding")
+    parser.add_argument("command", choices=["build", "eval"])
+    parser.add_argument("--log", default=USAGE_LOG)
+    parser.add_argument("--out", default=LM_FILE)
+    parser.add_argument("--accuracy", type=float, default=0.8, help="eval: simulated per-gesture accuracy")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        sentences = logged_sentences(args.log)
+        lm = build_lm(sentences)
+        save_lm(lm, args.out)
+        print(f"[DONE] {len(SEED_PHRASES)} seed phrases + {len(sentences)} logged sentences -> '{args.out}'")
+        return
+
+    if not os.path.exists(LABELS_FILE):
+        print(f"[!] ไม่พบ {LABELS_FILE} ครับ")
+        return
+    labels_map = load_labels_map(LABELS_FILE)
+    lm = load_lm(args.out)
+    print(f"[EVAL] simulated accuracy {args.accuracy * 100:.0f}% per gesture, {len(labels_map)} classes, beam {BEAM_WIDTH}")
+    for novel in (False, True):
+        error_rates, step_us = evaluate(labels_map, lm, accuracy=args.accuracy, novel=novel)
+        print(f"   {'unseen random phrases' if novel else 'known phrases'}: word error rate greedy {error_rates['greedy'] * 100:.1f}% "
+              f"-> beam + bigram {error_rates['beam'] * 100:.1f}%")
+    print(f"   decode step: p50 {np.percentile(step_us, 50):.1f} us / p99 {np.percentile(step_us, 99):.1f} us")
+
+if __name__ == "__main__":
+    main()
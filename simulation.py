@@ -1,128 +1,225 @@
-import pandas as pd
+import os
+import time
+import argparse
+from collections import deque
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
 
+from gesture_utils import read_take
+from orientation import fuse, angles_by_hand
+
 # ==========================================
-# 1. ตั้งค่าและโหลดไฟล์ CSV
+# 1. ตั้งค่า
 # ==========================================
+# python simulation.py                              -> เล่นไฟล์ CSV_FILE
+# python simulation.py a.csv b.csv c.csv            -> เล่นหลาย Take พร้อมกันเทียบข้างๆ กัน
 CSV_FILE = 'dataset_cf/sim/pon_sim_022326_004.csv'  # อิงจากไฟล์ที่คุณเพิ่งอัปโหลดมาล่าสุด
-df = pd.read_csv(CSV_FILE)
+CAPTURE_HZ = 50          # ความถี่ที่ถุงมือส่งข้อมูล (เล่นด้วยความเร็วเท่าตอนอัด)
+MAX_COLUMNS = 3          # จำนวน Take ต่อแถว
+FPS_WINDOW = 50          # คำนวณ FPS จากกี่เฟรมล่าสุด
+ORIENTATION_FUSION = True  # มุมมือจาก Accel + Gyro (orientation.py) แทน Accel อย่างเดียวที่ yaw = 0 เสมอ
 
-# ตั้งค่า Figure สำหรับ 3D
-fig = plt.figure(figsize=(10, 8))
-ax = fig.add_subplot(111, projection='3d')
-ax.set_title("Both Hands 3D Simulation from CSV")
+# คอลัมน์ตาม COLUMNS: 0-4 L_F, 5-7 L_A, 11-15 R_F, 16-18 R_A
+HANDS = {
+    "left":  {"flex": slice(0, 5),   "accel": slice(5, 8),   "offset": np.array([-2.5, 0, 0]), "color": 'blue',    "marker": 'o'},
+    "right": {"flex": slice(11, 16), "accel": slice(16, 19), "offset": np.array([ 2.5, 0, 0]), "color": 'darkred', "marker": '^'},
+}
+FINGER_COLORS = ['red', 'green', 'orange', 'purple', 'cyan']
 
 # ==========================================
-# 2. ฟังก์ชันคณิตศาสตร์ 3D
+# 2. รูปทรงมือ
+# ==========================================
+# พิกัดฝ่ามือ (สี่เหลี่ยม ปิดกลับจุดเริ่ม)
+PALM = np.array([[-1, 0, 0], [1, 0, 0], [1, 2, 0], [-1, 2, 0], [-1, 0, 0]], dtype=np.float64)
+
+# พิกัดโคนนิ้วทั้ง 5 (โป้ง ชี้ กลาง นาง ก้อย) มือขวากลับด้านให้สมจริง
+FINGER_BASES = {
+    "left":  np.array([[-1.2, 1.0, 0], [-0.8, 2.0, 0], [-0.3, 2.0, 0], [0.3, 2.0, 0], [0.8, 2.0, 0]]),
+    "right": np.array([[1.2, 1.0, 0], [0.8, 2.0, 0], [0.3, 2.0, 0], [-0.3, 2.0, 0], [-0.8, 2.0, 0]]),
+}
+FINGER_LENGTH = 1.5
+FLEX_FULL_SCALE = 2000.0  # *หมายเหตุ: หากตอน Calibrate สเกลเกิน 2000 สามารถปรับตัวเลขตรงนี้ได้
+MAX_BEND = np.pi / 1.5
+
 # ==========================================
+# 3. คณิตศาสตร์ 3D (ทีละ Take ทุกเฟรมพร้อมกัน)
+# ==========================================
+def euler_to_matrices(roll, pitch, yaw):
+    """Arrays of N Euler angles -> (N, 3, 3) rotation matrices Rz @ Ry @ Rx."""
+    roll, pitch, yaw = np.broadcast_arrays(*(np.atleast_1d(np.asarray(a, dtype=np.float64)) for a in (roll, pitch, yaw)))
+    cr, sr, cp, sp, cy, sy = np.cos(roll), np.sin(roll), np.cos(pitch), np.sin(pitch), np.cos(yaw), np.sin(yaw)
+    # ผลคูณ Rz @ Ry @ Rx แบบกระจายไว้แล้ว (ไม่ต้องคูณเมทริกซ์ทีละเฟรม)
+    R = np.empty(roll.shape + (3, 3))
+    R[..., 0, 0] = cy * cp
+    R[..., 0, 1] = cy * sp * sr - sy * cr
+    R[..., 0, 2] = cy * sp * cr + sy * sr
+    R[..., 1, 0] = sy * cp
+    R[..., 1, 1] = sy * sp * sr + cy * cr
+    R[..., 1, 2] = sy * sp * cr - cy * sr
+    R[..., 2, 0] = -sp
+    R[..., 2, 1] = cp * sr
+    R[..., 2, 2] = cp * cr
+    return R
+
 def euler_to_matrix(roll, pitch, yaw):
     """แปลงมุมเอียง (Euler) เป็นเมทริกซ์การหมุน 3D"""
-    Rx = np.array([[1, 0, 0], [0, np.cos(roll), -np.sin(roll)], [0, np.sin(roll), np.cos(roll)]])
-    Ry = np.array([[np.cos(pitch), 0, np.sin(pitch)], [0, 1, 0], [-np.sin(pitch), 0, np.cos(pitch)]])
-    Rz = np.array([[np.cos(yaw), -np.sin(yaw), 0], [np.sin(yaw), np.cos(yaw), 1], [0, 0, 1]])
-    return Rz @ Ry @ Rx
-
-def get_hand_model(accel_x, accel_y, accel_z, flex_raw, is_right=False, offset=np.array([0, 0, 0])):
-    """สร้างพิกัด 3D ของฝ่ามือและนิ้ว โดยมี Offset เพื่อแยกซ้ายขวา"""
-    pitch = np.arctan2(-accel_x, np.sqrt(accel_y**2 + accel_z**2))
-    roll = np.arctan2(accel_y, accel_z)
-    yaw = 0  
-    
-    R = euler_to_matrix(roll, pitch, yaw)
-
-    # พิกัดฝ่ามือ (สี่เหลี่ยม)
-    palm = np.array([
-        [-1, 0, 0],  
-        [ 1, 0, 0],  
-        [ 1, 2, 0],  
-        [-1, 2, 0],  
-        [-1, 0, 0]   
-    ])
-    
-    # หมุนและเลื่อนตำแหน่งมือ (Offset)
-    palm_rotated = (R @ palm.T).T + offset
-
-    # พิกัดโคนนิ้วทั้ง 5 (กลับด้านมือขวาให้สมจริง)
-    if is_right:
-        finger_bases = np.array([
-            [ 1.2, 1.0, 0], # โป้งขวาอยู่ขวา
-            [ 0.8, 2.0, 0], # ชี้
-            [ 0.3, 2.0, 0], # กลาง
-            [-0.3, 2.0, 0], # นาง
-            [-0.8, 2.0, 0]  # ก้อย
-        ])
-    else:
-        finger_bases = np.array([
-            [-1.2, 1.0, 0], # โป้งซ้ายอยู่ซ้าย
-            [-0.8, 2.0, 0], # ชี้
-            [-0.3, 2.0, 0], # กลาง
-            [ 0.3, 2.0, 0], # นาง
-            [ 0.8, 2.0, 0]  # ก้อย
-        ])
-        
-    finger_bases_rotated = (R @ finger_bases.T).T + offset
-    
-    # จำลองการงอนิ้ว
-    fingers_rotated = []
-    for i in range(5):
-        # *หมายเหตุ: หากตอน Calibrate สเกลเกิน 2000 สามารถปรับตัวเลขตรงนี้ได้
-        bend_angle = np.clip(flex_raw[i] / 2000.0 * (np.pi/1.5), 0, np.pi/1.5) 
-        
-        finger_vec = np.array([0, np.cos(bend_angle), -np.sin(bend_angle)])
-        finger_vec_rotated = R @ finger_vec * 1.5 
-        
-        tip = finger_bases_rotated[i] + finger_vec_rotated
-        fingers_rotated.append((finger_bases_rotated[i], tip))
-
-    return palm_rotated, fingers_rotated
+    return euler_to_matrices(roll, pitch, yaw)[0]
+
+def accel_angles(accel):
+    """(N, 3) accelerometer -> roll, pitch, yaw arrays (yaw is unobservable from gravity, so 0)."""
+    ax_, ay_, az_ = accel[:, 0], accel[:, 1], accel[:, 2]
+    pitch = np.arctan2(-ax_, np.sqrt(ay_ ** 2 + az_ ** 2))
+    roll = np.arctan2(ay_, az_)
+    return roll, pitch, np.zeros_like(roll)
+
+def hand_poses(R, flex, hand, offset):
+    """
+    (N, 3, 3) rotations + (N, 5) flex -> palm (N, 5, 3) and fingers (N, 5, 2, 3) (base, tip),
+    all frames in one pass.
+    """
+    palm = np.einsum('nij,kj->nki', R, PALM) + offset
+    bases = np.einsum('nij,kj->nki', R, FINGER_BASES[hand]) + offset
+    bend = np.clip(flex / FLEX_FULL_SCALE * MAX_BEND, 0, MAX_BEND)
+    finger_vec = np.stack([np.zeros_like(bend), np.cos(bend), -np.sin(bend)], axis=-1)
+    tips = bases + np.einsum('nij,nkj->nki', R, finger_vec) * FINGER_LENGTH
+    return palm, np.stack([bases, tips], axis=2)
+
+def take_poses(frames, angles=None):
+    """
+    (N, 22) take -> {hand: (palm, fingers)}. `angles` can supply {hand: (roll, pitch, yaw)}
+    from a better orientation estimate; otherwise they come from the accelerometer.
+    """
+    frames = np.asarray(frames, dtype=np.float64)
+    poses = {}
+    for hand, cfg in HANDS.items():
+        roll, pitch, yaw = angles[hand] if angles else accel_angles(frames[:, cfg["accel"]])
+        poses[hand] = hand_poses(euler_to_matrices(roll, pitch, yaw), frames[:, cfg["flex"]], hand, cfg["offset"])
+    return poses
 
 # ==========================================
-# 3. ฟังก์ชันอัปเดต Animation
+# 4. Player (Artist ชุดเดียว อัปเดตเฉพาะข้อมูล + Blitting)
 # ==========================================
-def update(frame):
-    ax.clear()
-    
-    # ขยายขอบเขตแกน X เพื่อให้วางได้ 2 มือ
+def create_hand_artists(ax, title=""):
+    """Sets up a 3D axes once and returns {hand: (palm_line, [finger_line x5])} with empty data."""
+    # ขยายขอบเขตแกน X เพื่อให้วางได้ 2 มือ (ตั้งครั้งเดียว ไม่ clear แกนทุกเฟรม)
     ax.set_xlim([-5, 5])
     ax.set_ylim([-3, 3])
     ax.set_zlim([-3, 3])
     ax.set_xlabel('X')
     ax.set_ylabel('Y')
     ax.set_zlabel('Z')
-    
-    row = df.iloc[frame]
-    
-    # ดึงข้อมูลมือซ้าย
-    L_ax, L_ay, L_az = row['L_Ax'], row['L_Ay'], row['L_Az']
-    L_flex = [row['L_F1'], row['L_F2'], row['L_F3'], row['L_F4'], row['L_F5']]
-    
-    # ดึงข้อมูลมือขวา
-    R_ax, R_ay, R_az = row['R_Ax'], row['R_Ay'], row['R_Az']
-    R_flex = [row['R_F1'], row['R_F2'], row['R_F3'], row['R_F4'], row['R_F5']]
-    
-    # คำนวณพิกัด 3D โดยเลื่อนมือซ้ายไป X=-2.5 และเลื่อนมือขวาไป X=+2.5
-    L_palm, L_fingers = get_hand_model(L_ax, L_ay, L_az, L_flex, is_right=False, offset=np.array([-2.5, 0, 0]))
-    R_palm, R_fingers = get_hand_model(R_ax, R_ay, R_az, R_flex, is_right=True, offset=np.array([ 2.5, 0, 0]))
-    
-    # วาดฝ่ามือซ้าย (สีน้ำเงิน) และขวา (สีแดงเข้ม)
-    ax.plot(L_palm[:,0], L_palm[:,1], L_palm[:,2], color='blue', linewidth=3)
-    ax.plot(R_palm[:,0], R_palm[:,1], R_palm[:,2], color='darkred', linewidth=3)
-    
-    # วาดนิ้วมือ
-    colors = ['red', 'green', 'orange', 'purple', 'cyan']
-    for i in range(5):
-        # นิ้วมือซ้าย
-        lb_base, lb_tip = L_fingers[i]
-        ax.plot([lb_base[0], lb_tip[0]], [lb_base[1], lb_tip[1]], [lb_base[2], lb_tip[2]], color=colors[i], linewidth=4, marker='o')
-        
-        # นิ้วมือขวา
-        rb_base, rb_tip = R_fingers[i]
-        ax.plot([rb_base[0], rb_tip[0]], [rb_base[1], rb_tip[1]], [rb_base[2], rb_tip[2]], color=colors[i], linewidth=4, marker='^')
-
-    ax.text2D(0.05, 0.95, f"Frame: {frame}/{len(df)}", transform=ax.transAxes)
-
-# เล่น Animation
-ani = FuncAnimation(fig, update, frames=len(df), interval=20, blit=False)
-plt.show()
\ No newline at end of file
+    ax.set_title(title, fontsize=9)
+    lines = {}
+    for hand, cfg in HANDS.items():
+        palm, = ax.plot([], [], [], color=cfg["color"], linewidth=3)
+        fingers = [ax.plot([], [], [], color=c, linewidth=4, marker=cfg["marker"])[0] for c in FINGER_COLORS]
+        lines[hand] = (palm, fingers)
+    return lines
+
+def set_pose(lines, poses, f):
+    """Moves the artists to frame f of precomputed poses (only the line data changes)."""
+    for hand, (palm_line, finger_lines) in lines.items():
+        palm, fingers = poses[hand]
+        palm_line.set_data_3d(palm[f, :, 0], palm[f, :, 1], palm[f, :, 2])
+        for line, seg in zip(finger_lines, fingers[f]):
+            line.set_data_3d(seg[:, 0], seg[:, 1], seg[:, 2])
+
+def hand_artists(lines):
+    return [a for palm, fingers in lines.values() for a in (palm, *fingers)]
+
+class HandPlayer:
+    """
+    Plays one or more takes side by side. Poses are precomputed per take; each frame only moves
+    the data of persistent Line3D artists, and with blitting only those artists are redrawn.
+    """
+    def __init__(self, takes, titles=None, fps=CAPTURE_HZ, blit=True, loop=True, fusion=ORIENTATION_FUSION):
+        self.titles = titles or [f"Take {i + 1}" for i in range(len(takes))]
+        self.fps, self.blit, self.loop = fps, blit, loop
+
+        start = time.perf_counter()
+        self.poses = [take_poses(t, angles_by_hand(fuse(t)) if fusion else None) for t in takes]
+        self.lengths = [len(t) for t in takes]
+        self.precompute_ms = (time.perf_counter() - start) * 1000
+        self.num_frames = max(self.lengths)
+
+        cols = min(len(takes), MAX_COLUMNS)
+        rows = (len(takes) + cols - 1) // cols
+        self.fig = plt.figure(figsize=(6 * cols, 5 * rows))
+        self.axes, self.artists, self.labels = [], [], []
+        for i, title in enumerate(self.titles):
+            ax = self.fig.add_subplot(rows, cols, i + 1, projection='3d')
+            lines = create_hand_artists(ax, title)
+            self.axes.append(ax)
+            self.artists.append(lines)
+            self.labels.append(ax.text2D(0.05, 0.95, "", transform=ax.transAxes))
+        self.fps_label = self.axes[0].text2D(0.05, 0.90, "", transform=self.axes[0].transAxes)
+
+        self.frame_times = deque(maxlen=FPS_WINDOW)
+        self.drawn = 0
+        self.started = None
+
+    def set_frame(self, frame):
+        for poses, lines, label, length in zip(self.poses, self.artists, self.labels, self.lengths):
+            f = min(frame, length - 1)  # Take ที่สั้นกว่าค้างที่เฟรมสุดท้าย
+            set_pose(lines, poses, f)
+            label.set_text(f"Frame: {f + 1}/{length}")
+
+    def update(self, frame):
+        now = time.perf_counter()
+        if self.started is None:
+            self.started = now
+        self.frame_times.append(now)
+        self.drawn += 1
+        self.set_frame(frame)
+        if len(self.frame_times) > 1:
+            fps = (len(self.frame_times) - 1) / (self.frame_times[-1] - self.frame_times[0])
+            self.fps_label.set_text(f"FPS: {fps:.1f} / {self.fps}")
+        return [a for lines in self.artists for a in hand_artists(lines)] + self.labels + [self.fps_label]
+
+    def achieved_fps(self):
+        if self.started is None or self.drawn < 2:
+            return 0.0
+        return (self.drawn - 1) / (self.frame_times[-1] - self.started)
+
+    def report(self, _event=None):
+        print(f"--- Precomputed {sum(self.lengths)} frames in {self.precompute_ms:.1f} ms | "
+              f"played {self.drawn} frames at {self.achieved_fps():.1f} FPS (target {self.fps}) ---")
+
+    def play(self):
+        self.animation = FuncAnimation(self.fig, self.update, frames=self.num_frames, interval=1000 / self.fps,
+                                       blit=self.blit, repeat=self.loop)
+        self.fig.canvas.mpl_connect('close_event', self.report)
+        plt.show()
+
+# ==========================================
+# 5. CLI
+# ==========================================
+def main():
+    parser = argparse.ArgumentParser(description="3D playback of recorded takes (both hands)")
+    parser.add_argument("files", nargs="*", default=[CSV_FILE], help="one or more take CSV files")
+    parser.add_argument("--speed", type=float, default=1.0, help="playback speed relative to the capture rate")
+    parser.add_argument("--no-blit", action="store_true", help="redraw the whole figure (for backends without blitting)")
+    parser.add_argument("--once", action="store_true", help="stop at the end instead of looping")
+    parser.add_argument("--accel-only", action="store_true", help="tilt from the accelerometer only (no gyro, yaw = 0)")
+    args = parser.parse_args()
+
+    takes, titles = [], []
+    for path in args.files:
+        if not os.path.exists(path):
+            print(f"[!] ไม่พบไฟล์ {path} ครับ")
+            continue
+        try:
+            takes.append(read_take(path))
+            titles.append(os.path.basename(path))
+        except Exception as e:
+            print(f"[!] อ่านไฟล์ {path} ไม่ได้: {e}")
+    if not takes:
+        return
+
+    player = HandPlayer(takes, titles, fps=CAPTURE_HZ * args.speed, blit=not args.no_blit, loop=not args.once,
+                        fusion=ORIENTATION_FUSION and not args.accel_only)
+    player.play()
+
+if __name__ == "__main__":
+    main()
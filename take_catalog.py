@@ -0,0 +1,288 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from gesture_utils import DATA_DIR, parse_take_name, read_take
+
+# ======================================================
+# 1. Configuration
+# ======================================================
+# python take_catalog.py rescan                                          -> สร้าง/อัปเดต Catalog จากไฟล์บน Disk
+# python take_catalog.py query --gesture hello --users iq pon --since 2026-02-01 --min-frames 20
+CATALOG_FILE = ".catalog.sqlite"   # อยู่ใน DATA_DIR (ขึ้นต้นด้วย "." จึงไม่ถูกนับเป็นท่าทาง)
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS takes (
+    path           TEXT PRIMARY KEY,   -- '<gesture>/<file>.csv' relative to the data folder
+    user           TEXT NOT NULL,
+    gesture        TEXT NOT NULL,
+    date           TEXT NOT NULL,      -- ISO yyyy-mm-dd (ชื่อไฟล์เป็น mmddyy ซึ่งเทียบช่วงวันที่ไม่ได้)
+    seq            INTEGER NOT NULL,
+    frames         INTEGER,
+    ch_min         TEXT,               -- JSON list, 22 values
+    ch_max         TEXT,
+    quality_ok     INTEGER,            -- NULL = not checked
+    quality_issues TEXT,               -- comma separated, '' when ok
+    hash           TEXT,               -- sha256 of the float64 frame values (same as dedupe_dataset.py)
+    mtime_ns       INTEGER,            -- NULL = queued in the writer, not on disk yet
+    size           INTEGER,
+    updated        TEXT
+);
+CREATE INDEX IF NOT EXISTS takes_gesture_user_date ON takes (gesture, user, date);
+CREATE INDEX IF NOT EXISTS takes_user_date ON takes (user, date);
+CREATE INDEX IF NOT EXISTS takes_hash ON takes (hash);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+COLUMNS_SQL = "path, user, gesture, date, seq, frames, ch_min, ch_max, quality_ok, quality_issues, hash, mtime_ns, size, updated"
+
+def iso_date(mmddyy):
+    return f"20{mmddyy[4:6]}-{mmddyy[0:2]}-{mmddyy[2:4]}"
+
+def describe_take(rel_path, frames, report=None, stat=None):
+    """One catalog row for a take. `report` is a QualityGate.check() result, `stat` an os.stat_result."""
+    gesture, filename = rel_path.split("/", 1)
+    parsed = parse_take_name(filename, gesture)
+    if parsed is None:
+        raise ValueError(f"'{rel_path}' is not a take path")
+    user, date, seq = parsed
+    frames = np.ascontiguousarray(frames, dtype=np.float64)
+    return (rel_path, user, gesture, iso_date(date), seq, len(frames),
+            json.dumps(np.round(frames.min(axis=0), 4).tolist()) if len(frames) else None,
+            json.dumps(np.round(frames.max(axis=0), 4).tolist()) if len(frames) else None,
+            None if report is None else int(report["ok"]),
+            None if report is None else ",".join(report["issues"]),
+            hashlib.sha256(frames.tobytes()).hexdigest(),
+            stat.st_mtime_ns if stat else None, stat.st_size if stat else None,
+            datetime.now().isoformat(timespec="seconds"))
+
+# ======================================================
+# 2. Catalog
+# ======================================================
+class TakeCatalog:
+    """
+    SQLite catalog of every take. The collector adds rows as it saves (add/committed/remove),
+    rescan() reconciles with the disk (only new or changed files are read), and query()
+    answers subset questions from the indexes without touching the data folder.
+    """
+    def __init__(self, data_dir=DATA_DIR, db_file=CATALOG_FILE):
+        self.data_dir = data_dir
+        self.path = os.path.join(data_dir, db_file)
+        os.makedirs(data_dir, exist_ok=True)
+        # ใช้จาก Thread ของ Writer และ Serial Loop ได้ (ทุกคำสั่งอยู่ใต้ Lock เดียวกัน)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        with self._lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SCHEMA)
+            self.conn.execute("INSERT OR IGNORE INTO meta VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),))
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def rel(self, path):
+        return os.path.relpath(path, self.data_dir).replace(os.sep, "/")
+
+    # ---------- Collector hooks ----------
+    def add(self, rel_path, frames, report=None):
+        """Registers a take as it is queued for writing (mtime is filled in by committed())."""
+        row = describe_take(rel_path, frames, report)
+        with self._lock, self.conn:
+            self.conn.execute(f"INSERT OR REPLACE INTO takes ({COLUMNS_SQL}) VALUES ({','.join('?' * 14)})", row)
+
+    def committed(self, paths):
+        """Writer callback: the files are on disk now."""
+        updates = []
+        for p in paths:
+            try:
+                st = os.stat(p)
+            except FileNotFoundError:
+                continue
+            updates.append((st.st_mtime_ns, st.st_size, self.rel(p)))
+        with self._lock, self.conn:
+            self.conn.executemany("UPDATE takes SET mtime_ns = ?, size = ? WHERE path = ?", updates)
+
+    def remove(self, rel_path):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM takes WHERE path = ?", (rel_path,))
+
+    def rename(self, moves):
+        """[(old_rel, new_rel), ...] in one transaction; swaps and chains (A->B, B->C) are fine."""
+        rows = []
+        for old, new in moves:
+            gesture, filename = new.split("/", 1)
+            parsed = parse_take_name(filename, gesture)
+            if parsed is not None:
+                rows.append((old, new, parsed[2], iso_date(parsed[1])))
+        with self._lock, self.conn:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS moves (old TEXT PRIMARY KEY, new TEXT, seq INTEGER, date TEXT)")
+            self.conn.execute("DELETE FROM moves")
+            self.conn.executemany("INSERT INTO moves VALUES (?, ?, ?, ?)", rows)
+            # ย้ายออกไปชื่อที่ไม่มีทางชนก่อน (path จริงไม่ขึ้นต้นด้วย "//") แล้วค่อยตั้งชื่อใหม่
+            self.conn.execute("UPDATE takes SET path = '//' || path WHERE path IN (SELECT old FROM moves)")
+            self.conn.execute("""
+                UPDATE takes SET (path, seq, date) = (SELECT new, seq, date FROM moves WHERE '//' || old = takes.path)
+                WHERE path LIKE '//%'""")
+            self.conn.execute("DELETE FROM moves")
+
+    # ---------- Rescan ----------
+    def rescan(self, gestures=None, quality=None, workers=None):
+        """
+        Reconciles with the disk: new/changed files (by mtime and size) are read, missing ones deleted.
+        `quality` (a QualityGate) also scores the files that are read. Returns a counts dict.
+        """
+        start = time.perf_counter()
+        if gestures is None:
+            with os.scandir(self.data_dir) as it:
+                gestures = sorted(e.name for e in it if e.is_dir() and not e.name.startswith(("_", ".")))
+        on_disk = {}
+        for gesture in gestures:
+            folder = os.path.join(self.data_dir, gesture)
+            if not os.path.isdir(folder):
+                continue
+            with os.scandir(folder) as it:
+                for entry in it:
+                    if entry.is_file() and parse_take_name(entry.name, gesture) is not None:
+                        on_disk[f"{gesture}/{entry.name}"] = entry.stat()
+
+        with self._lock:
+            marks = ",".join("?" * len(gestures))
+            known = {r[0]: (r[1], r[2]) for r in self.conn.execute(
+                f"SELECT path, mtime_ns, size FROM takes WHERE gesture IN ({marks})", list(gestures))}
+        stale = [p for p in known if p not in on_disk]
+        changed = [p for p, st in on_disk.items() if known.get(p) != (st.st_mtime_ns, st.st_size)]
+
+        def describe(rel_path):
+            try:
+                frames = read_take(os.path.join(self.data_dir, rel_path))
+                report = quality.check(rel_path.split("/", 1)[0], frames) if quality is not None else None
+                return describe_take(rel_path, frames, report, on_disk[rel_path])
+            except Exception as e:
+                print(f"      [ERROR] reading {rel_path}: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            rows = [r for r in pool.map(describe, changed, chunksize=256) if r is not None]
+        with self._lock, self.conn:
+            self.conn.executemany("DELETE FROM takes WHERE path = ?", [(p,) for p in stale])
+            self.conn.executemany(f"INSERT OR REPLACE INTO takes ({COLUMNS_SQL}) VALUES ({','.join('?' * 14)})", rows)
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('last_rescan', ?)", (datetime.now().isoformat(timespec="seconds"),))
+        return {"on_disk": len(on_disk), "read": len(rows), "removed": len(stale),
+                "unchanged": len(on_disk) - len(changed), "seconds": time.perf_counter() - start}
+
+    # ---------- Queries ----------
+    def query(self, gestures=None, users=None, since=None, until=None, min_frames=None, max_frames=None,
+              quality_ok=None, issue=None, order="gesture, user, date, seq"):
+        """
+        Rows (sqlite3.Row) matching every given filter. Dates are ISO strings, inclusive.
+        quality_ok=True/False filters on the stored check; `issue` matches one flagged issue name.
+        """
+        where, params = [], []
+        for column, values in (("gesture", gestures), ("user", users)):
+            if values:
+                values = [values] if isinstance(values, str) else list(values)
+                where.append(f"{column} IN ({','.join('?' * len(values))})")
+                params += values
+        for clause, value in (("date >= ?", since), ("date <= ?", until),
+                              ("frames >= ?", min_frames), ("frames <= ?", max_frames)):
+            if value is not None:
+                where.append(clause)
+                params.append(value)
+        if quality_ok is not None:
+            where.append("quality_ok = ?")
+            params.append(int(quality_ok))
+        if issue:
+            where.append("(',' || quality_issues || ',') LIKE ?")
+            params.append(f"%,{issue},%")
+        sql = f"SELECT {COLUMNS_SQL} FROM takes" + (" WHERE " + " AND ".join(where) if where else "")
+        with self._lock:
+            return self.conn.execute(sql + f" ORDER BY {order}", params).fetchall()
+
+    def paths(self, **filters):
+        """Absolute paths of the matching takes."""
+        return [os.path.join(self.data_dir, *r["path"].split("/")) for r in self.query(**filters)]
+
+    def duplicates(self):
+        """Groups of paths with identical frame content."""
+        with self._lock:
+            rows = self.conn.execute("""SELECT hash, group_concat(path, '|') FROM takes WHERE hash IN
+                                        (SELECT hash FROM takes GROUP BY hash HAVING count(*) > 1) GROUP BY hash""").fetchall()
+        return [r[1].split("|") for r in rows]
+
+    def summary(self):
+        with self._lock:
+            return self.conn.execute("""SELECT gesture, user, count(*) AS takes, min(date) AS first, max(date) AS last,
+                                        avg(frames) AS frames, sum(quality_ok = 0) AS flagged
+                                        FROM takes GROUP BY gesture, user ORDER BY gesture, user""").fetchall()
+
+# ======================================================
+# 3. CLI
+# ======================================================
+def main():
+    parser = argparse.ArgumentParser(description="SQLite catalog of the dataset's takes")
+    parser.add_argument("command", choices=["rescan", "query", "summary", "duplicates"])
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--gesture", nargs="+")
+    parser.add_argument("--users", nargs="+")
+    parser.add_argument("--since", help="yyyy-mm-dd (inclusive)")
+    parser.add_argument("--until", help="yyyy-mm-dd (inclusive)")
+    parser.add_argument("--min-frames", type=int)
+    parser.add_argument("--max-frames", type=int)
+    parser.add_argument("--flagged", action="store_true", help="only takes with quality issues")
+    parser.add_argument("--issue", help="only takes flagged with this issue (e.g. padding)")
+    parser.add_argument("--quality", action="store_true", help="rescan: also run the quality gate on files that are read")
+    parser.add_argument("--count", action="store_true", help="query: print only the number of matches")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.data_dir):
+        print(f"[!] ไม่พบโฟลเดอร์ {args.data_dir} ครับ")
+        return
+    catalog = TakeCatalog(args.data_dir)
+
+    if args.command == "rescan":
+        gate = None
+        if args.quality:
+            from take_quality import QualityGate
+            gate = QualityGate(args.data_dir)
+        r = catalog.rescan(args.gesture, gate)
+        print(f"[DONE] {r['on_disk']} takes on disk | {r['read']} read | {r['removed']} removed | "
+              f"{r['unchanged']} unchanged | {r['seconds']:.2f} s")
+
+    elif args.command == "query":
+        start = time.perf_counter()
+        rows = catalog.query(gestures=args.gesture, users=args.users, since=args.since, until=args.until,
+                             min_frames=args.min_frames, max_frames=args.max_frames,
+                             quality_ok=False if args.flagged else None, issue=args.issue)
+        ms = (time.perf_counter() - start) * 1000
+        if not args.count:
+            for r in rows:
+                flags = f"  [{r['quality_issues']}]" if r["quality_issues"] else ""
+                print(f"{r['path']}  {r['date']}  {r['frames']} frames{flags}")
+        print(f"--- {len(rows)} takes ({ms:.1f} ms) ---")
+
+    elif args.command == "summary":
+        print(f" {'GESTURE':14s} {'USER':10s} {'TAKES':>6s} {'FIRST':>11s} {'LAST':>11s} {'FRAMES':>7s} {'FLAGGED':>8s}")
+        for r in catalog.summary():
+            print(f" {r['gesture']:14s} {r['user']:10s} {r['takes']:6d} {r['first']:>11s} {r['last']:>11s} "
+                  f"{r['frames'] or 0:7.1f} {r['flagged'] or 0:8d}")
+
+    elif args.command == "duplicates":
+        groups = catalog.duplicates()
+        for g in groups:
+            print("  " + "  ==  ".join(g))
+        print(f"--- {len(groups)} groups of identical takes ---")
+    catalog.close()
+
+if __name__ == "__main__":
+    main()
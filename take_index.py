@@ -0,0 +1,163 @@
+import os
+import json
+import threading
+
+from gesture_utils import DATA_DIR, parse_take_name
+
+# ======================================================
+# 1. Configuration
+# ======================================================
+INDEX_FILE = ".take_index.json"  # Sidecar อยู่ใน DATA_DIR (ขึ้นต้นด้วย "." จึงไม่ถูกนับเป็นท่าทาง)
+INDEX_VERSION = 1
+
+# ======================================================
+# 2. Take Index
+# ======================================================
+class TakeIndex:
+    """
+    In-memory map of (user, gesture) -> takes sorted by sequence number, so the collector
+    gets the next sequence and the latest take without listing the folder.
+
+    Each gesture folder's mtime is remembered; whenever a folder is looked up and its mtime
+    has changed behind our back (files copied in, deleted by hand, ...), only that folder is
+    rescanned. Changes made through add()/remove()/committed() keep the mtime in sync.
+    `pending` (e.g. TakeWriter.pending) lists files that are queued but not on disk yet.
+    With scan=False nothing is read at start; folders are scanned on first lookup.
+    """
+    def __init__(self, data_dir=DATA_DIR, sidecar=INDEX_FILE, pending=None, scan=True):
+        self.data_dir = data_dir
+        self.sidecar = os.path.join(data_dir, sidecar) if sidecar else None
+        self.pending = pending
+        self.takes = {}   # gesture -> {user: [(seq, filename), ...]}
+        self.mtimes = {}  # gesture -> st_mtime_ns ตอนสแกนครั้งล่าสุด
+        self.rescans = 0
+        self._lock = threading.RLock()
+        if scan:
+            self._load()
+
+    # ---------- Scan / Reconcile ----------
+    def _dir_mtime(self, gesture):
+        try:
+            return os.stat(os.path.join(self.data_dir, gesture)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _scan(self, gesture):
+        path = os.path.join(self.data_dir, gesture)
+        users = {}
+        names = []
+        if os.path.isdir(path):
+            with os.scandir(path) as it:
+                names = [e.name for e in it if e.is_file()]
+        if self.pending is not None:
+            names += [os.path.basename(p) for p in self.pending(path)]
+        for filename in set(names):
+            parsed = parse_take_name(filename, gesture)
+            if parsed:
+                users.setdefault(parsed[0], []).append((parsed[2], filename))
+        for entries in users.values():
+            entries.sort()
+        self.takes[gesture] = users
+        self.mtimes[gesture] = self._dir_mtime(gesture)
+        self.rescans += 1
+
+    def _load(self):
+        cached = {}
+        if self.sidecar and os.path.exists(self.sidecar):
+            try:
+                with open(self.sidecar, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == INDEX_VERSION:
+                    cached = data["gestures"]
+            except (OSError, ValueError, KeyError):
+                cached = {}
+
+        gestures = []
+        if os.path.isdir(self.data_dir):
+            gestures = [d for d in os.listdir(self.data_dir) if os.path.isdir(os.path.join(self.data_dir, d))]
+        for gesture in gestures:
+            entry = cached.get(gesture)
+            # ใช้ค่าจาก Sidecar ได้ก็ต่อเมื่อโฟลเดอร์ไม่ถูกแก้ไขหลังจากบันทึก
+            if entry and entry["mtime"] == self._dir_mtime(gesture):
+                self.takes[gesture] = {user: [tuple(t) for t in takes] for user, takes in entry["takes"].items()}
+                self.mtimes[gesture] = entry["mtime"]
+            else:
+                self._scan(gesture)
+
+    def refresh(self, gesture):
+        with self._lock:
+            if gesture not in self.takes or self._dir_mtime(gesture) != self.mtimes.get(gesture):
+                self._scan(gesture)
+
+    def save(self):
+        if not self.sidecar:
+            return
+        with self._lock:
+            data = {"version": INDEX_VERSION, "gestures": {
+                g: {"mtime": self.mtimes[g], "takes": users} for g, users in self.takes.items()
+                if self.mtimes.get(g) is not None}}
+        os.makedirs(self.data_dir, exist_ok=True)
+        tmp = self.sidecar + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, self.sidecar)
+
+    # ---------- Lookups ----------
+    def _entries(self, user, gesture):
+        self.refresh(gesture)
+        return self.takes[gesture].get(user, [])
+
+    def count(self, user, gesture):
+        with self._lock:
+            return len(self._entries(user, gesture))
+
+    def next_seq(self, user, gesture):
+        # max + 1 (ไม่ใช่จำนวนไฟล์ + 1) เพื่อไม่ให้เขียนทับไฟล์เดิมเมื่อมีการลบไฟล์ตรงกลาง
+        with self._lock:
+            entries = self._entries(user, gesture)
+            return entries[-1][0] + 1 if entries else 1
+
+    def last_take(self, user, gesture):
+        with self._lock:
+            entries = self._entries(user, gesture)
+            return os.path.join(self.data_dir, gesture, entries[-1][1]) if entries else None
+
+    # ---------- Updates ----------
+    def add(self, user, gesture, filename):
+        """Registers a take that was just written (or queued for writing)."""
+        parsed = parse_take_name(filename, gesture)
+        if parsed is None:
+            raise ValueError(f"'{filename}' is not a take name for '{gesture}'")
+        with self._lock:
+            self.refresh(gesture)
+            entries = self.takes[gesture].setdefault(user, [])
+            if (parsed[2], filename) not in entries:  # อาจถูกสแกนเจอจาก pending ไปแล้ว
+                entries.append((parsed[2], filename))
+                entries.sort()
+
+    def reserve(self, user, gesture, date_str):
+        """Atomically picks the next sequence and registers it (several stations may share a user)."""
+        with self._lock:
+            seq = self.next_seq(user, gesture)
+            filename = f"{user}_{gesture}_{date_str}_{seq:03d}.csv"
+            self.add(user, gesture, filename)
+            return seq, filename
+
+    def set_gesture(self, gesture, users):
+        """Replaces a gesture's takes with a listing the caller already has ({user: [(seq, filename)]})."""
+        with self._lock:
+            self.takes[gesture] = {user: sorted(entries) for user, entries in users.items()}
+            self.mtimes[gesture] = self._dir_mtime(gesture)
+
+    def remove(self, user, gesture, filename):
+        with self._lock:
+            entries = self.takes.get(gesture, {}).get(user, [])
+            self.takes.get(gesture, {})[user] = [e for e in entries if e[1] != filename]
+            self.mtimes[gesture] = self._dir_mtime(gesture)
+
+    def committed(self, paths):
+        """Writer callback: our own files landed on disk, so the new folder mtime is expected."""
+        with self._lock:
+            for gesture in {os.path.basename(os.path.dirname(p)) for p in paths}:
+                if gesture in self.takes:
+                    self.mtimes[gesture] = self._dir_mtime(gesture)
@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+import pandas as pd
+
+from gesture_utils import DATA_DIR, EXPECTED_FRAMES, NUM_FEATURES, parse_take_name, fast_resample
+
+# ======================================================
+# 1. Configuration
+# ======================================================
+QUALITY_CONFIG_FILE = "take_quality.json"      # Threshold ต่อท่าทาง (ไม่มีไฟล์ = ใช้ DEFAULT_THRESHOLDS)
+PROFILE_FILE = ".quality_profiles.json"        # Centroid ของแต่ละท่า เก็บไว้ใน DATA_DIR
+
+# คอลัมน์ตาม COLUMNS: 0-4 L_F, 5-7 L_A, 8-10 L_G, 11-15 R_F, 16-18 R_A, 19-21 R_G
+FLEX_COLS = np.r_[0:5, 11:16]
+ACCEL_COLS = np.r_[5:8, 16:19]
+GYRO_COLS = np.r_[8:11, 19:22]
+HANDS = {"left": np.r_[0:11], "right": np.r_[11:22]}
+
+# ขีดจำกัดของ Firmware: MPU9250 ±16 g, Gyro * 100 ถูกเก็บใน int16 จึงตันที่ ±327.67 dps
+ACCEL_LIMIT = 15.9
+GYRO_LIMIT = 327.0
+
+# ค่า Std ขั้นต่ำต่อช่องตอนวัดระยะห่างจาก Centroid (กันไม่ให้ช่องที่แทบไม่ขยับมีน้ำหนักมากเกิน)
+STD_FLOOR = np.empty(NUM_FEATURES)
+STD_FLOOR[FLEX_COLS], STD_FLOOR[ACCEL_COLS], STD_FLOOR[GYRO_COLS] = 40.0, 0.1, 5.0
+
+MIN_PROFILE_TAKES = 5  # ต้องมี Take เดิมอย่างน้อยเท่านี้ถึงจะเช็คความยาว/Centroid
+
+# มือที่ Gyro แทบไม่ขยับ (Std ทุกแกนต่ำกว่านี้, dps) ในช่วงก่อน Padding = มือที่ว่างในท่ามือเดียว ไม่นับ Padding ของมือนั้น
+IDLE_HAND_GYRO_STD = 5.0
+
+DEFAULT_THRESHOLDS = {
+    "max_dead_flex": 6,         # จำนวนช่อง Flex ที่ไม่ขยับเลยทั้ง Take
+    "max_dead_imu": 0,          # ช่อง IMU ที่ค่าคงที่ตลอด = Sensor หลุด
+    "max_saturation": 0.05,     # สัดส่วนค่า IMU ที่ชนขีดจำกัด
+    "max_padding": 0.30,        # สัดส่วนเฟรมท้ายที่ Firmware เติมซ้ำ (bufL.back() / zeroData) ของมือที่ขยับ
+    "max_length_z": 4.0,        # ความยาวห่างจากค่าเฉลี่ยของท่านี้กี่ Std
+    "max_centroid_dist": 3.0,   # ระยะ RMS (หน่วย Std) จาก Centroid ของท่านี้
+    # ที่เหลือแค่เตือน (Flag) แต่ยังบันทึก: มือที่ว่างในท่ามือเดียวมี Padding ~90% และ IMU นิ่งเป็นปกติ
+    # จึงไม่ Reject ด้วย padding / dead_imu โดยอัตโนมัติ
+    "reject": ["saturation"],
+}
+
+# ======================================================
+# 2. Vectorized Helpers
+# ======================================================
+def padded_from(hand):
+    # Firmware เติมมือที่เฟรมน้อยกว่าด้วยเฟรมสุดท้ายซ้ำๆ (หรือ zeroData ถ้าไม่มีเลย)
+    # และเก็บเฟรมเฉพาะตอนที่ขยับ จึงไม่มีเฟรมซ้ำติดกันในข้อมูลจริง
+    changed = np.flatnonzero(np.any(hand[1:] != hand[:-1], axis=1))
+    return changed[-1] + 1 if len(changed) else 0
+
+def padding_ratio(hand):
+    return (len(hand) - 1 - padded_from(hand)) / len(hand)
+
+def hand_padding(frames):
+    """Largest padding ratio over the hands that actually move; the idle hand of a one-handed sign is skipped."""
+    ratios = [0.0]
+    for cols in HANDS.values():
+        hand = frames[:, cols]
+        active = hand[:padded_from(hand) + 1]
+        gyro = active[:, np.isin(cols, GYRO_COLS)]
+        if len(active) > 1 and np.max(np.std(gyro, axis=0)) >= IDLE_HAND_GYRO_STD:
+            ratios.append(padding_ratio(hand))
+    return float(max(ratios))
+
+# ======================================================
+# 3. Quality Gate
+# ======================================================
+class QualityGate:
+    """
+    Scores a take as it arrives: dead channels, IMU saturation, firmware padding,
+    length outliers and distance to the gesture's centroid. Each gesture keeps a running
+    profile (sum / sum of squares of the zero-started resampled take, plus lengths),
+    so checking and updating are a handful of vector ops (well under 1 ms).
+    """
+    def __init__(self, data_dir=DATA_DIR, config_path=QUALITY_CONFIG_FILE, profile_file=PROFILE_FILE):
+        self.data_dir = data_dir
+        self.profile_path = os.path.join(data_dir, profile_file)
+        self.config = {"default": {}, "gestures": {}}
+        if config_path and os.path.exists(config_path):
+            with open(config_path, "r", encoding="utf-8") as f:
+                self.config.update(json.load(f))
+        self.profiles = {}
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()  # หลาย Station อาจขอ Profile ท่าเดียวกันพร้อมกัน -> สร้างครั้งเดียว
+        self._load_profiles()
+
+    def thresholds(self, gesture):
+        return {**DEFAULT_THRESHOLDS, **self.config["default"], **self.config["gestures"].get(gesture, {})}
+
+    # ---------- Profiles ----------
+    def _load_profiles(self):
+        if os.path.exists(self.profile_path):
+            try:
+                with open(self.profile_path, "r", encoding="utf-8") as f:
+                    saved = json.load(f)
+                self.profiles = {g: {"n": p["n"], "sum": np.array(p["sum"]), "sumsq": np.array(p["sumsq"]),
+                                     "len_sum": p["len_sum"], "len_sumsq": p["len_sumsq"]}
+                                 for g, p in saved.items()}
+            except (OSError, ValueError, KeyError):
+                self.profiles = {}
+
+    def save(self):
+        with self._lock:
+            data = {g: {"n": p["n"], "sum": p["sum"].round(4).tolist(), "sumsq": p["sumsq"].round(4).tolist(),
+                        "len_sum": p["len_sum"], "len_sumsq": p["len_sumsq"]} for g, p in self.profiles.items()}
+        os.makedirs(self.data_dir, exist_ok=True)
+        tmp = self.profile_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.profile_path)
+
+    def profile(self, gesture):
+        """The gesture's profile, built from disk by exactly one thread the first time it is needed."""
+        with self._lock:
+            profile = self.profiles.get(gesture)
+        if profile is not None:
+            return profile
+        with self._build_lock:
+            with self._lock:
+                profile = self.profiles.get(gesture)
+            return profile if profile is not None else self.build_profile(gesture)
+
+    def build_profile(self, gesture):
+        """Builds a gesture's profile from the takes already on disk (once, then kept up to date by add())."""
+        path = os.path.join(self.data_dir, gesture)
+        profile = {"n": 0, "sum": np.zeros(EXPECTED_FRAMES * NUM_FEATURES), "sumsq": np.zeros(EXPECTED_FRAMES * NUM_FEATURES),
+                   "len_sum": 0, "len_sumsq": 0}
+        if os.path.isdir(path):
+            for file in os.listdir(path):
+                if parse_take_name(file, gesture) is None:
+                    continue
+                try:
+                    self._accumulate(profile, pd.read_csv(os.path.join(path, file)).values.astype(np.float64))
+                except Exception as e:
+                    print(f"      [ERROR] reading {file}: {e}")
+        with self._lock:
+            self.profiles[gesture] = profile
+        return profile
+
+    def _accumulate(self, profile, frames):
+        resampled = fast_resample(frames)
+        if resampled is None:
+            return
+        x = (resampled - resampled[:1]).ravel()
+        profile["n"] += 1
+        profile["sum"] += x
+        profile["sumsq"] += x * x
+        profile["len_sum"] += len(frames)
+        profile["len_sumsq"] += len(frames) ** 2
+
+    def add(self, gesture, frames):
+        """Adds an accepted take to the gesture's profile."""
+        profile = self.profile(gesture)
+        with self._lock:
+            self._accumulate(profile, np.asarray(frames, dtype=np.float64))
+
+    # ---------- Check ----------
+    def check(self, gesture, frames):
+        """
+        Returns {"ok", "reject", "issues", "scores", "ms"}. `issues` lists every check over its
+        threshold; `reject` is True when one of them is in the gesture's "reject" list.
+        """
+        start = time.perf_counter()
+        th = self.thresholds(gesture)
+        frames = np.asarray(frames, dtype=np.float64)
+        ptp = np.ptp(frames, axis=0)
+
+        scores = {
+            "frames": len(frames),
+            "dead_flex": int(np.sum(ptp[FLEX_COLS] == 0)),
+            "dead_imu": int(np.sum(ptp[np.r_[ACCEL_COLS, GYRO_COLS]] == 0)),
+            "saturation": float(np.mean(np.concatenate([np.abs(frames[:, ACCEL_COLS]).ravel() >= ACCEL_LIMIT,
+                                                        np.abs(frames[:, GYRO_COLS]).ravel() >= GYRO_LIMIT]))),
+            "padding": hand_padding(frames),
+        }
+
+        profile = self.profile(gesture)
+        with self._lock:
+            # อ่านค่าทั้งชุดใต้ Lock (Station อื่นอาจกำลัง add() เข้า Profile เดียวกัน)
+            n, len_sum, len_sumsq = profile["n"], profile["len_sum"], profile["len_sumsq"]
+            if n >= MIN_PROFILE_TAKES:
+                mean = profile["sum"] / n
+                sumsq_mean = profile["sumsq"] / n
+        if n >= MIN_PROFILE_TAKES:
+            len_mean = len_sum / n
+            len_std = np.sqrt(max(len_sumsq / n - len_mean ** 2, 1.0))
+            scores["length_z"] = float(abs(len(frames) - len_mean) / len_std)
+
+            resampled = fast_resample(frames)
+            if resampled is not None:
+                std = np.sqrt(np.maximum(sumsq_mean - mean ** 2, 0.0))
+                std = np.maximum(std.reshape(EXPECTED_FRAMES, NUM_FEATURES), STD_FLOOR)
+                z = ((resampled - resampled[:1]) - mean.reshape(EXPECTED_FRAMES, NUM_FEATURES)) / std
+                scores["centroid_dist"] = float(np.sqrt(np.mean(z * z)))
+
+        limits = {"dead_flex": th["max_dead_flex"], "dead_imu": th["max_dead_imu"], "saturation": th["max_saturation"],
+                  "padding": th["max_padding"], "length_z": th["max_length_z"], "centroid_dist": th["max_centroid_dist"]}
+        issues = [name for name, limit in limits.items() if name in scores and scores[name] > limit]
+        reject = any(name in th["reject"] for name in issues)
+        return {"ok": not issues, "reject": reject, "issues": issues, "scores": scores,
+                "ms": (time.perf_counter() - start) * 1000}
+
+def describe(report):
+    s = report["scores"]
+    parts = []
+    for name in report["issues"]:
+        value = s[name]
+        parts.append(f"{name}={value:.2f}" if isinstance(value, float) else f"{name}={value}")
+    return ", ".join(parts) if parts else "ok"
@@ -0,0 +1,213 @@
+import os
+import time
+import argparse
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from gesture_utils import (DATA_DIR, EXPECTED_FRAMES, NUM_FEATURES, PACK_EXT, PACK_SCALES, detect_labels, parse_take_name,
+                           read_take, encode_packed, decode_packed_int16, read_packed, take_files, fast_resample, load_dataset)
+from take_writer import encode_csv
+
+# ======================================================
+# 1. Configuration
+# ======================================================
+# python take_store.py pack      -> สร้าง .gpk คู่กับทุก CSV (ตรวจว่าถอดกลับได้ค่าเดิมทุกบิตก่อนเขียน)
+# python take_store.py report    -> เทียบขนาดไฟล์ / เวลาโหลด / RAM ตอนโหลด Dataset ระหว่าง CSV กับ .gpk
+# python take_store.py unpack    -> สร้าง CSV คืนจาก .gpk (กรณีเก็บเฉพาะ .gpk ไว้)
+COMMANDS = ["pack", "unpack", "verify", "report"]
+
+# ======================================================
+# 2. In-memory Store (int16 ทั้ง Dataset แปลงเป็น float32 เฉพาะตอนใช้)
+# ======================================================
+class PackedTakes:
+    """
+    Every raw take of a dataset as one int16 array (total_frames, 22) plus offsets, a quarter of
+    the float64 frames. take(i) / resampled() decode to float only what is asked for.
+    """
+    def __init__(self, data, offsets, labels, files):
+        self.data, self.offsets, self.labels, self.files = data, offsets, labels, files
+
+    @classmethod
+    def load(cls, labels_map, data_dir=DATA_DIR, workers=None):
+        inv_labels_map = {v: k for k, v in labels_map.items()}
+        jobs = []
+        for label_name in labels_map.values():
+            path = os.path.join(data_dir, label_name)
+            if os.path.isdir(path):
+                files = take_files(path)
+                jobs += [(label_name, stem, files[stem]) for stem in sorted(files)]
+
+        def load_one(job):
+            path = job[2]
+            try:
+                if path.endswith(PACK_EXT):
+                    with open(path, "rb") as f:
+                        return decode_packed_int16(f.read())
+                return np.rint(read_take(path) * PACK_SCALES).astype(np.int16)
+            except Exception as e:
+                print(f"      [ERROR] reading {os.path.basename(path)}: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            takes = list(pool.map(load_one, jobs, chunksize=256))
+        keep = [i for i, t in enumerate(takes) if t is not None]
+        lengths = np.array([len(takes[i]) for i in keep], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        data = np.empty((offsets[-1], NUM_FEATURES), dtype=np.int16)
+        for j, i in enumerate(keep):
+            data[offsets[j]:offsets[j + 1]] = takes[i]
+            takes[i] = None
+        labels = np.array([inv_labels_map[jobs[i][0]] for i in keep], dtype=np.int64)
+        files = [os.path.join(jobs[i][0], jobs[i][1] + ".csv") for i in keep]
+        return cls(data, offsets, labels, files)
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + self.offsets.nbytes + self.labels.nbytes
+
+    def take(self, i, dtype=np.float64):
+        values = self.data[self.offsets[i]:self.offsets[i + 1]] / PACK_SCALES
+        return values if dtype == np.float64 else values.astype(dtype)
+
+    def resampled(self, indices=None, target=EXPECTED_FRAMES, dtype=np.float32):
+        """(n, target, 22) like load_dataset() for the given takes (all by default); unusable takes come back as NaN."""
+        indices = range(len(self)) if indices is None else indices
+        out = np.empty((len(indices), target, NUM_FEATURES), dtype=dtype)
+        for j, i in enumerate(indices):
+            r = fast_resample(self.take(i), target)
+            out[j] = np.nan if r is None else r
+        return out
+
+# ======================================================
+# 3. Pack / Unpack / Verify
+# ======================================================
+def list_csv(data_dir):
+    files = []
+    for gesture in detect_labels(data_dir).values():
+        folder = os.path.join(data_dir, gesture)
+        files += [os.path.join(folder, f) for f in sorted(os.listdir(folder)) if parse_take_name(f, gesture)]
+    return files
+
+def packed_path(csv_path):
+    return os.path.splitext(csv_path)[0] + PACK_EXT
+
+def pack_file(csv_path, force=False):
+    """-> "packed" / "fresh" / "unpackable: <reason>". Writes the .gpk only after checking the round trip."""
+    dst = packed_path(csv_path)
+    if not force and os.path.exists(dst) and os.path.getmtime(dst) >= os.path.getmtime(csv_path):
+        return "fresh"
+    frames = read_take(csv_path)
+    try:
+        data = encode_packed(frames)
+    except ValueError as e:
+        return f"unpackable: {e}"
+    if not np.array_equal(decode_packed_int16(data) / PACK_SCALES, frames):
+        return "unpackable: round trip mismatch"
+    tmp = dst + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, dst)
+    return "packed"
+
+def unpack_file(gpk_path, force=False):
+    dst = os.path.splitext(gpk_path)[0] + ".csv"
+    if not force and os.path.exists(dst):
+        return "exists"
+    tmp = dst + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(encode_csv(read_packed(gpk_path)))
+    os.replace(tmp, dst)
+    return "unpacked"
+
+def verify_file(csv_path):
+    dst = packed_path(csv_path)
+    if not os.path.exists(dst):
+        return "missing"
+    return "ok" if np.array_equal(read_packed(dst), read_take(csv_path)) else "MISMATCH"
+
+def run_all(func, paths, workers=None, **kwargs):
+    counts = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for path, result in zip(paths, pool.map(lambda p: func(p, **kwargs), paths, chunksize=64)):
+            key = result.split(":")[0]
+            counts[key] = counts.get(key, 0) + 1
+            if key in ("unpackable", "MISMATCH"):
+                print(f"   [!] {path}: {result}")
+    return counts
+
+# ======================================================
+# 4. Report
+# ======================================================
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak
+
+def report(data_dir):
+    csv_files = list_csv(data_dir)
+    gpk_files = [p for p in map(packed_path, csv_files) if os.path.exists(p)]
+    csv_bytes = sum(os.path.getsize(p) for p in csv_files)
+    gpk_bytes = sum(os.path.getsize(p) for p in gpk_files)
+    print(f"\n=== Disk ({len(csv_files)} CSV, {len(gpk_files)} packed) ===")
+    print(f"   CSV  : {csv_bytes / 1e6:9.2f} MB")
+    if gpk_files:
+        covered = sum(os.path.getsize(os.path.splitext(p)[0] + ".csv") for p in gpk_files)
+        print(f"   .gpk : {gpk_bytes / 1e6:9.2f} MB  ({covered / max(gpk_bytes, 1):.1f}x smaller than the same CSVs)")
+
+    print("\n=== Read every take (raw frames) ===")
+    _, csv_s, _ = measure(lambda: [read_take(p) for p in csv_files])
+    print(f"   CSV  : {csv_s:.2f} s")
+    if gpk_files:
+        _, gpk_s, _ = measure(lambda: [read_packed(p) for p in gpk_files])
+        print(f"   .gpk : {gpk_s:.2f} s  ({csv_s * len(gpk_files) / len(csv_files) / max(gpk_s, 1e-9):.1f}x faster)")
+
+    labels_map = detect_labels(data_dir)
+    print("\n=== Training load (resampled float32 tensor) ===")
+    import contextlib
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        (X, _), load_s, load_peak = measure(lambda: load_dataset(labels_map, data_dir))
+        packed, packed_s, packed_peak = measure(lambda: PackedTakes.load(labels_map, data_dir))
+    raw_f64 = int((packed.offsets[-1]) * NUM_FEATURES * 8)
+    print(f"   load_dataset      : {load_s:.2f} s | peak {load_peak / 1e6:.1f} MB | tensor {X.nbytes / 1e6:.1f} MB")
+    print(f"   PackedTakes.load  : {packed_s:.2f} s | peak {packed_peak / 1e6:.1f} MB | raw int16 {packed.nbytes / 1e6:.1f} MB "
+          f"(float64 raw frames would be {raw_f64 / 1e6:.1f} MB)")
+
+# ======================================================
+# 5. CLI
+# ======================================================
+def main():
+    parser = argparse.ArgumentParser(description="Lossless int16 packed copies of the dataset's takes")
+    parser.add_argument("command", choices=COMMANDS)
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--force", action="store_true", help="rewrite files that are already up to date")
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.data_dir):
+        print(f"[!] ไม่พบโฟลเดอร์ {args.data_dir} ครับ")
+        return
+
+    start = time.perf_counter()
+    if args.command == "pack":
+        counts = run_all(pack_file, list_csv(args.data_dir), args.workers, force=args.force)
+    elif args.command == "verify":
+        counts = run_all(verify_file, list_csv(args.data_dir), args.workers)
+    elif args.command == "unpack":
+        gpk = [os.path.join(root, f) for root, _, files in os.walk(args.data_dir) for f in files if f.endswith(PACK_EXT)]
+        counts = run_all(unpack_file, gpk, args.workers, force=args.force)
+    else:
+        report(args.data_dir)
+        return
+    print(f"[DONE] {args.command}: " + ", ".join(f"{k} {v}" for k, v in sorted(counts.items()))
+          + f" ({time.perf_counter() - start:.2f} s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import os
+import io
+import time
+import queue
+import threading
+import numpy as np
+import pandas as pd
+
+from gesture_utils import COLUMNS, PACK_EXT, encode_packed
+
+# ======================================================
+# 1. Configuration
+# ======================================================
+FSYNC_BATCH = 8        # Commit (fsync + rename) ทุกๆ กี่ Take
+FSYNC_INTERVAL = 1.0   # หรือเมื่อ Take ที่รออยู่นานสุดเกินกี่วินาที
+TMP_SUFFIX = ".tmp"
+
+_FLUSH = object()
+
+# ======================================================
+# 2. Encoders (เลือกตามนามสกุลไฟล์)
+# ======================================================
+def encode_csv(frames):
+    buf = io.StringIO()
+    pd.DataFrame(frames, columns=COLUMNS).to_csv(buf, index=False)
+    return buf.getvalue().encode("utf-8")
+
+ENCODERS = {".csv": encode_csv, PACK_EXT: encode_packed}
+
+def fsync_dir(path):
+    # ให้ rename ลง Disk จริง (Windows เปิด Directory ไม่ได้ ข้ามไป)
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+# ======================================================
+# 3. Background Writer
+# ======================================================
+class TakeWriter:
+    """
+    Persists takes on a background thread so the serial loop never waits on the disk.
+    Each take is encoded into a hidden temp file next to its target; a batch of temp
+    files is fsynced and renamed into place together, then each touched directory is
+    fsynced once. A crash leaves either the complete file or an ignored temp file,
+    never a truncated take. `on_commit(paths)` is called after each batch lands.
+    """
+    def __init__(self, fsync_batch=FSYNC_BATCH, fsync_interval=FSYNC_INTERVAL, on_commit=None):
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self.on_commit = on_commit
+        self.written = 0
+        self.errors = 0
+        self._queue = queue.Queue()
+        self._pending = set()   # path ที่ส่งเข้าคิวแล้วแต่ยังไม่ถูก rename ลง Disk
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="take-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, path, frames):
+        ext = os.path.splitext(path)[1]
+        if ext not in ENCODERS:
+            raise ValueError(f"No encoder for '{ext}' files")
+        with self._lock:
+            self._pending.add(path)
+        self._queue.put((path, np.asarray(frames, dtype=np.float64)))
+
+    def pending(self, directory=None, prefix=""):
+        """Paths submitted but not yet committed (optionally only those in directory starting with prefix)."""
+        with self._lock:
+            paths = list(self._pending)
+        if directory is None:
+            return paths
+        return [p for p in paths if os.path.dirname(p) == directory and os.path.basename(p).startswith(prefix)]
+
+    def flush(self):
+        """Blocks until every submitted take is on disk."""
+        self._queue.put(_FLUSH)
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(None)
+        self._queue.join()
+        self._thread.join()
+
+    def _write_tmp(self, path, frames):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = os.path.join(os.path.dirname(path), "." + os.path.basename(path) + TMP_SUFFIX)
+        with open(tmp, "wb") as f:
+            f.write(ENCODERS[os.path.splitext(path)[1]](frames))
+        return tmp
+
+    def _commit(self, batch):
+        # ต้องล้าง pending + task_done เสมอ ไม่งั้น flush() / close() จะรอไม่จบ
+        try:
+            dirs, done = set(), []
+            for path, tmp in batch:
+                try:
+                    with open(tmp, "rb+") as f:
+                        os.fsync(f.fileno())
+                    os.replace(tmp, path)
+                    dirs.add(os.path.dirname(path) or ".")
+                    done.append(path)
+                    self.written += 1
+                except OSError as e:
+                    self.errors += 1
+                    print(f"\n [ERROR] Could not save {os.path.basename(path)}: {e}")
+            for d in dirs:
+                fsync_dir(d)
+            if self.on_commit is not None and done:
+                try:
+                    self.on_commit(done)
+                except Exception as e:
+                    # ไฟล์ลง Disk แล้ว แค่ Index / Catalog ไม่ได้อัปเดต (เช่น SQLite "database is locked")
+                    self.errors += 1
+                    print(f"\n [ERROR] on_commit failed for {len(done)} takes: {e}")
+        finally:
+            with self._lock:
+                self._pending.difference_update(path for path, _ in batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _run(self):
+        batch, oldest = [], None
+        while True:
+            timeout = None if not batch else max(0.0, self.fsync_interval - (time.monotonic() - oldest))
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = _FLUSH  # ครบเวลา FSYNC_INTERVAL แล้ว
+            else:
+                if item is None or item is _FLUSH:
+                    self._queue.task_done()
+
+            if item is not None and item is not _FLUSH:
+                path, frames = item
+                try:
+                    batch.append((path, self._write_tmp(path, frames)))
+                    oldest = oldest or time.monotonic()
+                except (OSError, ValueError) as e:
+                    self.errors += 1
+                    with self._lock:
+                        self._pending.discard(path)
+                    self._queue.task_done()
+                    print(f"\n [ERROR] Could not save {os.path.basename(path)}: {e}")
+
+            if batch and (item is None or item is _FLUSH or len(batch) >= self.fsync_batch):
+                self._commit(batch)
+                batch, oldest = [], None
+            if item is None:
+                return
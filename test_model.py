@@ -1,35 +1,21 @@
-import numpy as np
 import pandas as pd
 import os
 import json
 import random
 import xgboost as xgb
-from scipy.interpolate import interp1d
+
+from gesture_utils import EXPECTED_FRAMES, resample_gesture
 
 # ======================================================
 # 1. Configuration (ต้องตรงกับตอนเทรน)
 # ======================================================
+# สคริปต์นี้สุ่มทดสอบทีละไฟล์; ถ้าต้องการวัดผลทั้ง Dataset/ทั้ง Label ใช้ evaluate_batch.py
 DATA_DIR = "dataset_cf"
-EXPECTED_FRAMES = 70 
 MODEL_NAME = "gesture_model.json"
 LABELS_FILE = "labels_map.json"
 
 # ======================================================
-# 2. Resample Function (ใช้ฟังก์ชันเดิมเพื่อให้ข้อมูลหน้าตาเหมือนตอนเทรน)
-# ======================================================
-def resample_gesture(data, target=100):
-    data_np = np.array(data)
-    non_zero_data = data_np[~np.all(data_np == 0, axis=1)]
-    current_len = non_zero_data.shape[0]
-    if current_len < 2: 
-        return None
-    old_x = np.linspace(0, current_len - 1, num=current_len)
-    new_x = np.linspace(0, current_len - 1, num=target)
-    f = interp1d(old_x, non_zero_data, axis=0, kind='linear', fill_value="extrapolate")
-    return f(new_x)
-
-# ======================================================
-# 3. Load Labels & Prompt User
+# 2. Load Labels & Prompt User
 # ======================================================
 if not os.path.exists(LABELS_FILE):
     print(f"[!] ไม่พบไฟล์ {LABELS_FILE} กรุณารันโค้ดเทรนก่อนครับ")
@@ -59,7 +45,7 @@ if not os.path.exists(folder_path):
     exit()
 
 # ======================================================
-# 4. Randomly Select a File
+# 3. Randomly Select a File
 # ======================================================
 csv_files = [f for f in os.listdir(folder_path) if f.endswith('.csv')]
 
@@ -72,10 +58,11 @@ file_path = os.path.join(folder_path, random_file)
 print(f"\n-> สุ่มได้ไฟล์: {random_file} (คลาสที่แท้จริง: {target_class_name})")
 
 # ======================================================
-# 5. Load & Preprocess Data
+# 4. Load & Preprocess Data
 # ======================================================
 try:
     df = pd.read_csv(file_path)
+    # ใช้ Resample ตัวเดียวกับตอนเทรน (gesture_utils: ตัดช่วงนิ่งหัว/ท้าย แล้ว Resample)
     resampled_data = resample_gesture(df.values, target=EXPECTED_FRAMES)
     
     if resampled_data is None:
@@ -90,7 +77,7 @@ except Exception as e:
     exit()
 
 # ======================================================
-# 6. Load Model & Predict
+# 5. Load Model & Predict
 # ======================================================
 if not os.path.exists(MODEL_NAME):
     print(f"[!] ไม่พบโมเดล {MODEL_NAME} กรุณาเทรนก่อนครับ")
@@ -1,29 +1,26 @@
 import numpy as np
-import pandas as pd
-import os
 import json
 import torch
 import torch.nn as nn
 import torch.optim as optim
 from torch.utils.data import TensorDataset, DataLoader
-from scipy.interpolate import interp1d
 from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score, classification_report
+from sklearn.metrics import classification_report
+
+from gesture_utils import EXPECTED_FRAMES, detect_labels, load_dataset, zero_start
 
 # ======================================================
 # 1. Configuration
 # ======================================================
 DATA_DIR = "dataset_cf"
-EXPECTED_FRAMES = 70 
-NUM_FEATURES = 22 
 MODEL_NAME = "gesture_model_cnnlstm.pth" # PyTorch ใช้นามสกุล .pth
 LABELS_FILE = "labels_map.json"
 
 # ======================================================
 # 2. Dynamic Labels Mapping
 # ======================================================
-folder_names = [d for d in os.listdir(DATA_DIR) if os.path.isdir(os.path.join(DATA_DIR, d))]
-folder_names.sort()
+# ข้ามโฟลเดอร์ที่ไม่ใช่ท่าทาง (test, sim, _quarantine ฯลฯ) ดู gesture_utils.EXCLUDED_LABELS
+folder_names = list(detect_labels(DATA_DIR).values())
 
 LABELS_MAP = {i: name for i, name in enumerate(folder_names)}
 INV_LABELS_MAP = {v: k for k, v in LABELS_MAP.items()}
@@ -38,33 +35,9 @@ with open(LABELS_FILE, "w", encoding="utf-8") as f:
 # ======================================================
 # 3. Resample & Load Data (Zero-Starting)
 # ======================================================
-def resample_gesture(data, target=70):
-    data_np = np.array(data)
-    non_zero_data = data_np[~np.all(data_np == 0, axis=1)]
-    current_len = non_zero_data.shape[0]
-    if current_len < 2: return None
-    old_x = np.linspace(0, current_len - 1, num=current_len)
-    new_x = np.linspace(0, current_len - 1, num=target)
-    f = interp1d(old_x, non_zero_data, axis=0, kind='linear', fill_value="extrapolate")
-    return f(new_x)
-
-X, y = [], []
-for label_name in LABELS_MAP.values():
-    path = os.path.join(DATA_DIR, label_name)
-    files = [f for f in os.listdir(path) if f.endswith('.csv')]
-    for file in files:
-        try:
-            df = pd.read_csv(os.path.join(path, file))
-            resampled_data = resample_gesture(df.values, target=EXPECTED_FRAMES)
-            if resampled_data is not None:
-                normalized_data = resampled_data - resampled_data[0] # Zero-Starting
-                X.append(normalized_data)
-                y.append(INV_LABELS_MAP[label_name])
-        except:
-            pass
-
-X = np.array(X, dtype=np.float32)
-y = np.array(y, dtype=np.int64)
+# โหลด + ตัดช่วงนิ่งหัว/ท้าย + Resample ผ่าน gesture_utils (ตัวเดียวกับที่ Server ใช้ตอนทาย)
+X, y = load_dataset(LABELS_MAP, DATA_DIR, target=EXPECTED_FRAMES)
+X = zero_start(X).astype(np.float32) # Zero-Starting
 
 # แบ่งข้อมูล
 X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42, stratify=y)
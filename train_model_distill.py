@@ -0,0 +1,169 @@
+import numpy as np
+import os
+import json
+import time
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+import torch.optim as optim
+from torch.utils.data import TensorDataset, DataLoader
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import accuracy_score, classification_report
+
+from gesture_utils import DATA_DIR, EXPECTED_FRAMES, LABELS_FILE, detect_labels, load_labels_map, load_dataset, zero_start
+from gesture_backends import (GestureStudent, CNNLSTMBackend, XGBBackend, EnsembleBackend, StudentBackend, apply_temperature,
+                              PYTORCH_MODEL_PATH, XGB_MODEL_PATH, STUDENT_MODEL_PATH)
+
+# ======================================================
+# 1. Configuration
+# ======================================================
+METRICS_FILE = "gesture_model_student_metrics.json"
+STUDENT_WIDTH = 32
+TEMPERATURE = 3.0   # ทำให้ Soft Label ของ Teacher นุ่มขึ้น เห็นความคล้ายระหว่างคลาส
+ALPHA = 0.7         # น้ำหนัก Distillation Loss เทียบกับ Hard Label (Cross Entropy)
+EPOCHS = 100
+VAL_SIZE = 0.15     # ส่วนของ Train set ที่กันไว้เลือก Epoch (Test set ใช้รายงานผลครั้งเดียวตอนจบ)
+LATENCY_RUNS = 200
+
+# ======================================================
+# 2. Labels (ต้องเป็นชุดเดียวกับที่ Teacher ใช้เทรน)
+# ======================================================
+if not os.path.exists(DATA_DIR):
+    print(f"[!] ไม่พบโฟลเดอร์ {DATA_DIR} กรุณาสร้างและใส่ข้อมูลก่อนครับ")
+    exit()
+
+if not (os.path.exists(PYTORCH_MODEL_PATH) and os.path.exists(XGB_MODEL_PATH)):
+    print(f"[!] ไม่พบโมเดล Teacher กรุณารัน train_model_sv_xg_cl.py ก่อนครับ")
+    exit()
+
+LABELS_MAP = load_labels_map(LABELS_FILE)
+if LABELS_MAP != detect_labels(DATA_DIR):
+    print(f"[!] {LABELS_FILE} ไม่ตรงกับโฟลเดอร์ใน {DATA_DIR} กรุณาเทรน Teacher ใหม่ก่อนครับ")
+    exit()
+
+# ======================================================
+# 3. Load Data (Split เดียวกับ train_model_sv_xg_cl.py)
+# ======================================================
+print(f"--- Loading raw data and Resampling to {EXPECTED_FRAMES} frames ---")
+X_raw, y = load_dataset(LABELS_MAP)
+
+if len(X_raw) == 0:
+    print("\n[!] Error: ไม่พบข้อมูลสำหรับการเทรนเลยครับ")
+    exit()
+
+# random_state/test_size เดียวกับตอนเทรน Teacher -> Test set เป็นข้อมูลที่ Teacher ไม่เคยเห็น
+X_train_raw, X_test_raw, y_train, y_test = train_test_split(X_raw, y, test_size=0.3, random_state=42, stratify=y)
+# เลือก Epoch ที่ดีที่สุดจาก Validation ที่แบ่งจาก Train set ถ้าเลือกจาก Test set ตรงๆ Accuracy ของ Student จะดูดีเกินจริง
+X_fit_raw, X_val_raw, y_fit, y_val = train_test_split(X_train_raw, y_train, test_size=VAL_SIZE, random_state=42, stratify=y_train)
+
+# ======================================================
+# 4. Teacher Soft Labels (Ensemble CNN-LSTM + XGBoost)
+# ======================================================
+cnn_teacher = CNNLSTMBackend(num_classes=len(LABELS_MAP))
+xgb_teacher = XGBBackend()
+teacher = EnsembleBackend([cnn_teacher, xgb_teacher])
+
+teacher_train_probs = teacher.predict_proba(X_fit_raw)
+teacher_test_probs = teacher.predict_proba(X_test_raw)
+
+soft_targets = apply_temperature(teacher_train_probs, TEMPERATURE).astype(np.float32)
+
+train_dataset = TensorDataset(torch.tensor(zero_start(X_fit_raw)), torch.tensor(y_fit), torch.tensor(soft_targets))
+val_dataset = TensorDataset(torch.tensor(zero_start(X_val_raw)), torch.tensor(y_val))
+
+train_loader = DataLoader(train_dataset, batch_size=32, shuffle=True)
+val_loader = DataLoader(val_dataset, batch_size=32, shuffle=False)
+
+# ======================================================
+# 5. Train Student (Knowledge Distillation)
+# ======================================================
+student = GestureStudent(num_classes=len(LABELS_MAP), width=STUDENT_WIDTH)
+optimizer = optim.Adam(student.parameters(), lr=0.001)
+hard_criterion = nn.CrossEntropyLoss()
+
+def distillation_loss(logits, labels, teacher_soft):
+    student_log_soft = F.log_softmax(logits / TEMPERATURE, dim=1)
+    # คูณ T^2 เพื่อให้ขนาด Gradient ไม่หดตาม Temperature (Hinton et al.)
+    kd = F.kl_div(student_log_soft, teacher_soft, reduction='batchmean') * (TEMPERATURE ** 2)
+    return ALPHA * kd + (1 - ALPHA) * hard_criterion(logits, labels)
+
+best_acc = 0.0
+print(f"\n--- เริ่มเทรน Student ({sum(p.numel() for p in student.parameters())} params) ---")
+for epoch in range(EPOCHS):
+    student.train()
+    total_loss = 0
+    for inputs, labels, teacher_soft in train_loader:
+        optimizer.zero_grad()
+        loss = distillation_loss(student(inputs), labels, teacher_soft)
+        loss.backward()
+        optimizer.step()
+        total_loss += loss.item()
+
+    student.eval()
+    correct, total = 0, 0
+    with torch.no_grad():
+        for inputs, labels in val_loader:
+            _, predicted = torch.max(student(inputs), 1)
+            total += labels.size(0)
+            correct += (predicted == labels).sum().item()
+
+    val_acc = correct / total
+    if (epoch+1) % 10 == 0:
+        print(f"Epoch {epoch+1}/{EPOCHS} | Loss: {total_loss/len(train_loader):.4f} | Val Accuracy: {val_acc*100:.2f}%")
+
+    if val_acc > best_acc:
+        best_acc = val_acc
+        torch.save(student.state_dict(), STUDENT_MODEL_PATH)
+
+print(f"[DONE] Student Best Val Accuracy: {best_acc*100:.2f}%")
+
+# ======================================================
+# 6. Accuracy Gap, Latency & Memory Report
+# ======================================================
+student_backend = StudentBackend(STUDENT_MODEL_PATH)
+
+preds_teacher = np.argmax(teacher_test_probs, axis=1)
+preds_student = np.argmax(student_backend.predict_proba(X_test_raw), axis=1)
+acc_teacher = accuracy_score(y_test, preds_teacher)
+acc_student = accuracy_score(y_test, preds_student)
+
+def time_single_gesture(backend):
+    # วัดแบบเดียวกับ Inference Server: ทีละ 1 ท่า (Batch = 1)
+    sample = X_test_raw[:1]
+    backend.predict_proba(sample) # warm-up
+    start = time.perf_counter()
+    for _ in range(LATENCY_RUNS):
+        backend.predict_proba(sample)
+    return (time.perf_counter() - start) / LATENCY_RUNS * 1000
+
+def torch_model_bytes(model):
+    return sum(t.numel() * t.element_size() for t in model.state_dict().values())
+
+latency_teacher = time_single_gesture(teacher)
+latency_student = time_single_gesture(student_backend)
+memory_teacher = torch_model_bytes(cnn_teacher.model) + len(xgb_teacher.model.get_booster().save_raw())
+memory_student = torch_model_bytes(student_backend.model)
+
+print("\n" + "="*50)
+print("สรุป Teacher (Ensemble) vs Student")
+print("="*50)
+print(f" Accuracy : Teacher {acc_teacher*100:.2f}% | Student {acc_student*100:.2f}% | Gap {(acc_teacher-acc_student)*100:+.2f}%")
+print(f" Latency  : Teacher {latency_teacher:.2f} ms | Student {latency_student:.2f} ms | {latency_teacher/latency_student:.1f}x faster")
+print(f" Memory   : Teacher {memory_teacher/1024:.0f} KB | Student {memory_student/1024:.0f} KB | {memory_teacher/memory_student:.1f}x smaller")
+print("="*50)
+
+print("\n--- Classification Report ของ Student ---")
+print(classification_report(y_test, preds_student, labels=list(LABELS_MAP.keys()),
+                            target_names=list(LABELS_MAP.values()), zero_division=0))
+
+metrics = {
+    "teacher_accuracy": acc_teacher, "student_accuracy": acc_student,
+    "teacher_latency_ms": latency_teacher, "student_latency_ms": latency_student,
+    "teacher_bytes": memory_teacher, "student_bytes": memory_student,
+    "temperature": TEMPERATURE, "alpha": ALPHA,
+    "test_samples": int(len(y_test)), "val_samples": int(len(y_val)),
+    "labels": LABELS_MAP,  # model_bundle.py เทียบกับ Label Map ของ Bundle
+}
+with open(METRICS_FILE, "w", encoding="utf-8") as f:
+    json.dump(metrics, f, ensure_ascii=False, indent=4)
+print(f"[DONE] Student saved as '{STUDENT_MODEL_PATH}', metrics in '{METRICS_FILE}'")
@@ -1,18 +1,16 @@
-import numpy as np
-import pandas as pd
 import os
 import json
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split, StratifiedKFold, cross_val_score
 from sklearn.metrics import accuracy_score, classification_report
 import joblib
-from scipy.interpolate import interp1d
+
+from gesture_utils import EXPECTED_FRAMES, detect_labels, load_dataset, extract_advanced_features
 
 # ======================================================
 # 1. Configuration
 # ======================================================
 DATA_DIR = "dataset_cf" # เปลี่ยนให้ตรงกับชื่อโฟลเดอร์ที่ใช้
-EXPECTED_FRAMES = 70 
 MODEL_NAME = "gesture_model_rf.pkl"
 LABELS_FILE = "labels_map.json"
 
@@ -23,8 +21,8 @@ if not os.path.exists(DATA_DIR):
     print(f"[!] ไม่พบโฟลเดอร์ {DATA_DIR} กรุณาสร้างและใส่ข้อมูลก่อนครับ")
     exit()
 
-folder_names = [d for d in os.listdir(DATA_DIR) if os.path.isdir(os.path.join(DATA_DIR, d))]
-folder_names.sort()
+# ข้ามโฟลเดอร์ที่ไม่ใช่ท่าทาง (test, sim, _quarantine ฯลฯ) ดู gesture_utils.EXCLUDED_LABELS
+folder_names = list(detect_labels(DATA_DIR).values())
 
 if len(folder_names) == 0:
     print(f"[!] ไม่พบโฟลเดอร์ย่อยใน {DATA_DIR} เลยครับ")
@@ -44,80 +42,19 @@ print(f"-> Saved labels to '{LABELS_FILE}'")
 print("-----------------------\n")
 
 # ======================================================
-# 3. Resample Function
-# ======================================================
-def resample_gesture(data, target=70):
-    data_np = np.array(data)
-    non_zero_data = data_np[~np.all(data_np == 0, axis=1)]
-    current_len = non_zero_data.shape[0]
-    if current_len < 2: 
-        return None
-    old_x = np.linspace(0, current_len - 1, num=current_len)
-    new_x = np.linspace(0, current_len - 1, num=target)
-    f = interp1d(old_x, non_zero_data, axis=0, kind='linear', fill_value="extrapolate")
-    return f(new_x)
-
-# ======================================================
-# 4. Feature Extraction
-# ======================================================
-def extract_advanced_features(raw_data):
-    # ไม่เอา raw_data.flatten() แล้ว เพื่อกันโมเดลจำ
-    
-    velocity = np.diff(raw_data, axis=0) 
-    feat_vel_mean = np.mean(velocity, axis=0) 
-    feat_vel_std = np.std(velocity, axis=0)   
-    
-    feat_mean = np.mean(raw_data, axis=0)
-    feat_std = np.std(raw_data, axis=0)   
-    feat_range = np.ptp(raw_data, axis=0) 
-    
-    # รวม Feature เหลือแค่ 22 * 5 = 110 Features (เบาลงเยอะและฉลาดขึ้น)
-    features = np.concatenate([
-        feat_vel_mean, 
-        feat_vel_std, 
-        feat_mean, 
-        feat_std, 
-        feat_range
-    ])
-    
-    return features
-
-# ======================================================
-# 5. Load & Process Data
+# 3. Load & Process Data
 # ======================================================
-def load_dataset():
-    X, y = [], []
+# โหลด + ตัดช่วงนิ่งหัว/ท้าย + Resample ผ่าน gesture_utils (ตัวเดียวกับที่ Server ใช้ตอนทาย)
+# แล้วสกัด Feature 22 * 5 = 110 ตัว (ไม่เอา raw_data.flatten() เพื่อกันโมเดลจำ)
+def load_features():
     print(f"--- Loading raw data and Resampling to {EXPECTED_FRAMES} frames ---")
-    for label_name in LABELS_MAP.values():
-        path = os.path.join(DATA_DIR, label_name)
-        if not os.path.exists(path): continue
-        files = [f for f in os.listdir(path) if f.endswith('.csv')]
-        print(f"   {label_name}: {len(files)} files")
-        
-        for file in files:
-            try:
-                df = pd.read_csv(os.path.join(path, file))
-                
-                # นำข้อมูลดิบมารีแซมเปิลให้ได้ 70 Frames ก่อน
-                resampled_data = resample_gesture(df.values, target=EXPECTED_FRAMES)
-                
-                if resampled_data is not None:
-                    # นำข้อมูลที่รีแซมเปิลแล้ว ไปสกัดฟีเจอร์ 1,650 ตัว
-                    features = extract_advanced_features(resampled_data)
-                    X.append(features)
-                    y.append(INV_LABELS_MAP[label_name])
-                else:
-                    print(f"      [SKIP] {file}: Data too short or empty after removing zeros.")
-                    
-            except Exception as e:
-                print(f"      [ERROR] reading {file}: {e}")
-                
-    return np.array(X), np.array(y)
+    X_raw, y = load_dataset(LABELS_MAP, DATA_DIR, target=EXPECTED_FRAMES)
+    return extract_advanced_features(X_raw), y
 
 # ======================================================
-# 6. Training Process (Random Forest)
+# 4. Training Process (Random Forest)
 # ======================================================
-X, y = load_dataset()
+X, y = load_features()
 
 if len(X) == 0:
     print("\n[!] Error: ไม่พบข้อมูลสำหรับการเทรนเลยครับ")
@@ -126,7 +63,7 @@ if len(X) == 0:
 # แบ่งข้อมูล 85/15 ให้เหมือน xgboost
 X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.15, random_state=42, stratify=y)
 
-print(f"\nFeature Count: {X.shape[1]} (Expected 1650 based on 70 frames)")
+print(f"\nFeature Count: {X.shape[1]} (Expected 110)")
 print(f"Training on {len(X_train)} samples...")
 
 model = RandomForestClassifier(
@@ -1,18 +1,18 @@
 import numpy as np
-import pandas as pd
 import os
 import json
 import torch
 import torch.nn as nn
 import torch.optim as optim
 from torch.utils.data import TensorDataset, DataLoader
-from scipy.interpolate import interp1d
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
 import xgboost as xgb
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from gesture_utils import detect_labels, load_dataset, zero_start
+
 # ======================================================
 # 1. Configuration
 # ======================================================
@@ -22,6 +22,7 @@ NUM_FEATURES = 22
 PYTORCH_MODEL_NAME = "gesture_model_best_cnnlstm.pth"
 XGB_MODEL_NAME = "gesture_model_best_xgb.json"
 LABELS_FILE = "labels_map.json"
+METRICS_FILE = "gesture_model_ensemble_metrics.json"
 
 # ======================================================
 # 2. Dynamic Labels Mapping
@@ -30,15 +31,14 @@ if not os.path.exists(DATA_DIR):
     print(f"[!] ไม่พบโฟลเดอร์ {DATA_DIR} กรุณาสร้างและใส่ข้อมูลก่อนครับ")
     exit()
 
-folder_names = [d for d in os.listdir(DATA_DIR) if os.path.isdir(os.path.join(DATA_DIR, d))]
-folder_names.sort()
+# ข้ามโฟลเดอร์ที่ไม่ใช่ท่าทาง (test, sim, _quarantine ฯลฯ) ดู gesture_utils.EXCLUDED_LABELS
+folder_names = list(detect_labels(DATA_DIR).values())
 
 if len(folder_names) == 0:
     print(f"[!] ไม่พบโฟลเดอร์ย่อยใน {DATA_DIR} เลยครับ")
     exit()
 
 LABELS_MAP = {i: name for i, name in enumerate(folder_names)}
-INV_LABELS_MAP = {v: k for k, v in LABELS_MAP.items()}
 
 print("--- Detected Labels ---")
 for k, v in LABELS_MAP.items():
@@ -50,35 +50,10 @@ with open(LABELS_FILE, "w", encoding="utf-8") as f:
 # ======================================================
 # 3. Resample & Load Data (Zero-Starting)
 # ======================================================
-def resample_gesture(data, target=70):
-    data_np = np.array(data)
-    non_zero_data = data_np[~np.all(data_np == 0, axis=1)]
-    current_len = non_zero_data.shape[0]
-    if current_len < 2: return None
-    old_x = np.linspace(0, current_len - 1, num=current_len)
-    new_x = np.linspace(0, current_len - 1, num=target)
-    f = interp1d(old_x, non_zero_data, axis=0, kind='linear', fill_value="extrapolate")
-    return f(new_x)
-
-X, y = [], []
+# ใช้ load_dataset ตัวเดียวกับ Inference (ตัดช่วงนิ่งหัว/ท้าย + Resample) ไม่งั้นโมเดลจะเห็นข้อมูลคนละแบบ
 print(f"\n--- Loading raw data and Resampling to {EXPECTED_FRAMES} frames ---")
-for label_name in LABELS_MAP.values():
-    path = os.path.join(DATA_DIR, label_name)
-    files = [f for f in os.listdir(path) if f.endswith('.csv')]
-    print(f"   {label_name}: {len(files)} files")
-    for file in files:
-        try:
-            df = pd.read_csv(os.path.join(path, file))
-            resampled_data = resample_gesture(df.values, target=EXPECTED_FRAMES)
-            if resampled_data is not None:
-                normalized_data = resampled_data - resampled_data[0] # Zero-Starting
-                X.append(normalized_data)
-                y.append(INV_LABELS_MAP[label_name])
-        except Exception as e:
-            pass
-
-X_3d = np.array(X, dtype=np.float32)
-y = np.array(y, dtype=np.int64)
+X, y = load_dataset(LABELS_MAP, DATA_DIR, target=EXPECTED_FRAMES)
+X_3d = zero_start(X)
 
 if len(X_3d) == 0:
     print("\n[!] Error: ไม่พบข้อมูลสำหรับการเทรนเลยครับ")
@@ -237,6 +212,16 @@ print(f"2. XGBoost Accuracy:            {accuracy_score(y_test, preds_xgboost)*1
 print(f"3. Ensemble (Soft Voting):      {accuracy_score(y_test, preds_ensemble)*100:.2f}%")
 print("="*50)
 
+# เก็บผลไว้ใส่ใน Model Bundle (model_bundle.py build)
+with open(METRICS_FILE, "w", encoding="utf-8") as f:
+    json.dump({
+        "cnnlstm_accuracy": accuracy_score(y_test, preds_cnn_lstm),
+        "xgb_accuracy": accuracy_score(y_test, preds_xgboost),
+        "ensemble_accuracy": accuracy_score(y_test, preds_ensemble),
+        "test_samples": int(len(y_test)),
+        "labels": LABELS_MAP,  # model_bundle.py เทียบกับ Label Map ของ Bundle
+    }, f, ensure_ascii=False, indent=4)
+
 print("\n--- Classification Report ของ Ensemble ---")
 print(classification_report(y_test, preds_ensemble, target_names=list(LABELS_MAP.values())))
 
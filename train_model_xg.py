@@ -1,18 +1,15 @@
-import numpy as np
-import pandas as pd
 import os
 import xgboost as xgb
 from sklearn.model_selection import train_test_split, StratifiedKFold, cross_val_score
 from sklearn.metrics import accuracy_score, classification_report
-from scipy.interpolate import interp1d
-import joblib
 import json
 
+from gesture_utils import EXPECTED_FRAMES, detect_labels, load_dataset
+
 # ======================================================
 # 1. Configuration
 # ======================================================
 DATA_DIR = "dataset_cf" #
-EXPECTED_FRAMES = 70 
 MODEL_NAME = "gesture_model.json"
 LABELS_FILE = "labels_map.json"
 
@@ -23,8 +20,8 @@ if not os.path.exists(DATA_DIR):
     print(f"[!] ไม่พบโฟลเดอร์ {DATA_DIR} กรุณาสร้างและใส่ข้อมูลก่อนครับ")
     exit()
 
-folder_names = [d for d in os.listdir(DATA_DIR) if os.path.isdir(os.path.join(DATA_DIR, d))]
-folder_names.sort()
+# ข้ามโฟลเดอร์ที่ไม่ใช่ท่าทาง (test, sim, _quarantine ฯลฯ) ดู gesture_utils.EXCLUDED_LABELS
+folder_names = list(detect_labels(DATA_DIR).values())
 
 if len(folder_names) == 0:
     print(f"[!] ไม่พบโฟลเดอร์ย่อยใน {DATA_DIR} เลยครับ")
@@ -44,50 +41,18 @@ print(f"-> Saved labels to '{LABELS_FILE}'")
 print("-----------------------\n")
 
 # ======================================================
-# 3. Resample Function
-# ======================================================
-def resample_gesture(data, target=100):
-    data_np = np.array(data)
-    non_zero_data = data_np[~np.all(data_np == 0, axis=1)]
-    current_len = non_zero_data.shape[0]
-    if current_len < 2: 
-        return None
-    old_x = np.linspace(0, current_len - 1, num=current_len)
-    new_x = np.linspace(0, current_len - 1, num=target)
-    f = interp1d(old_x, non_zero_data, axis=0, kind='linear', fill_value="extrapolate")
-    return f(new_x)
-
-# ======================================================
-# 4. Load & Flatten Data 
+# 3. Load & Flatten Data
 # ======================================================
-def load_dataset():
-    X, y = [], []
+# โหลด + ตัดช่วงนิ่งหัว/ท้าย + Resample ผ่าน gesture_utils (ตัวเดียวกับที่ Server / test_model.py ใช้ตอนทาย)
+def load_flat():
     print(f"--- Loading raw data and Resampling to {EXPECTED_FRAMES} frames ---")
-    for label_name in LABELS_MAP.values():
-        path = os.path.join(DATA_DIR, label_name)
-        files = [f for f in os.listdir(path) if f.endswith('.csv')]
-        print(f"   {label_name}: {len(files)} files")
-        
-        for file in files:
-            try:
-                df = pd.read_csv(os.path.join(path, file))
-                resampled_data = resample_gesture(df.values, target=EXPECTED_FRAMES)
-                
-                if resampled_data is not None:
-                    X.append(resampled_data.flatten())
-                    y.append(INV_LABELS_MAP[label_name])
-                else:
-                    print(f"      [SKIP] {file}: Data too short or empty after removing zeros.")
-                    
-            except Exception as e:
-                print(f"      [ERROR] reading {file}: {e}")
-                
-    return np.array(X), np.array(y)
+    X_raw, y = load_dataset(LABELS_MAP, DATA_DIR, target=EXPECTED_FRAMES)
+    return X_raw.reshape(len(X_raw), -1), y
 
 # ======================================================
-# 5. Training Process
+# 4. Training Process
 # ======================================================
-X, y = load_dataset()
+X, y = load_flat()
 
 if len(X) == 0:
     print("\n[!] Error: ไม่พบข้อมูลสำหรับการเทรนเลยครับ")